@@ -1,11 +1,23 @@
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Response, g, request, jsonify, send_from_directory
 import os
+import time
+import shutil
 import logging
-from process_surveys import process_surveys  # Assuming this handles Excel and other data extraction logic
+from job_queue import JobQueue, DONE, FAILED
+from batch_store import BatchStore, COMMITTED
+from workspaces import (WorkspaceManager, DEFAULT_WORKSPACE, DEFAULT_RETENTION_DAYS, DEFAULT_MAX_CACHED_WORKSPACES,
+                        DEFAULT_SERVICE_IDLE_SECONDS, OUTPUT_FILENAME)
+from extractors import accepted_extensions, detect
 from werkzeug.utils import secure_filename
-from PyPDF2 import PdfReader  # For PDF processing (install via pip if needed)
+from werkzeug.exceptions import RequestEntityTooLarge
+from instrumentation import metrics, stage, track_job
 import mimetypes
 
+# The pipeline modules (pandas, openpyxl, pdfplumber, OpenCV) are imported on
+# first use rather than here, so workers start fast and routes such as / and
+# /download never load them. They are not preloaded in a forking parent
+# because the job queue starts its worker threads at import time.
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -15,13 +27,54 @@ logging.basicConfig(
 
 # Flask app instance
 app = Flask(__name__)
+# Requests larger than this are rejected with 413 while the body is being read
+app.config["MAX_CONTENT_LENGTH"] = int(os.environ.get("CRE_MAX_UPLOAD_MB", "100")) * 1024 * 1024
+
+# Every client works in its own workspace (uploads, caches, stores and outputs),
+# chosen with the X-Workspace header or the "workspace" query parameter.
+# Workspaces unused for CRE_WORKSPACE_RETENTION_DAYS are deleted (0 keeps them forever).
+# Each process keeps the caches and property index of at most CRE_CACHED_WORKSPACES
+# workspaces in memory, releasing those unused for CRE_WORKSPACE_IDLE_SECONDS.
+workspaces = WorkspaceManager(os.environ.get("CRE_WORKSPACES_DIR", "workspaces"),
+                              retention_days=float(os.environ.get("CRE_WORKSPACE_RETENTION_DAYS",
+                                                                  str(DEFAULT_RETENTION_DAYS))),
+                              max_cached=int(os.environ.get("CRE_CACHED_WORKSPACES",
+                                                            str(DEFAULT_MAX_CACHED_WORKSPACES))),
+                              service_idle_seconds=float(os.environ.get("CRE_WORKSPACE_IDLE_SECONDS",
+                                                                        str(DEFAULT_SERVICE_IDLE_SECONDS))))
+# Rows converted at a time while reading workbooks (0 uses the reader default)
+chunk_size = int(os.environ.get("CRE_CHUNK_SIZE", "5000")) or None
+# Workbooks, CSV and Word files are parsed on CRE_PARSE_WORKERS processes (1 parses in the job's
+# thread); PDFs, images and very large files on a separate pool of CRE_EXPENSIVE_WORKERS
+parse_workers = int(os.environ.get("CRE_PARSE_WORKERS", "1"))
+expensive_workers = int(os.environ.get("CRE_EXPENSIVE_WORKERS", os.environ.get("CRE_OCR_WORKERS", "2")))
+# Merge listings of the same building across surveys (off by default)
+dedupe = os.environ.get("CRE_DEDUPE", "0").lower() in ("1", "true", "yes")
+# Bulk submissions collect files across several requests and are consolidated once per batch
+batch_store = BatchStore(os.environ.get("CRE_BATCHES_DB", os.path.join("jobs", "batches.db")))
+# Set CRE_PROFILE to "cprofile" or "tracemalloc" to save profiles of jobs slower than CRE_PROFILE_SLOW_SECONDS
+profile_mode = os.environ.get("CRE_PROFILE") or None
+profile_slow_seconds = float(os.environ.get("CRE_PROFILE_SLOW_SECONDS", "30"))
+profile_dir = os.environ.get("CRE_PROFILE_DIR", "profiles")
+# Every server process (e.g. each gunicorn worker) writes its metrics to CRE_METRICS_DIR and
+# /metrics sums them, so any worker can answer a scrape. Keep the directory across restarts.
+metrics.share(os.environ.get("CRE_METRICS_DIR", "metrics"))
+
+def current_workspace():
+    """
+    Returns the workspace named by the request (default: "default").
+    Raises ValueError for an invalid name.
+    """
+    name = request.headers.get("X-Workspace") or request.args.get("workspace") or DEFAULT_WORKSPACE
+    return workspaces.get(name)
 
-# Ensure output directory exists
-output_dir = "output"
-os.makedirs(output_dir, exist_ok=True)
+def _download_url(workspace, filename=OUTPUT_FILENAME):
+    if workspace.name == DEFAULT_WORKSPACE:
+        return f"/download/{filename}"
+    return f"/download/{filename}?workspace={workspace.name}"
 
-# Allowed file extensions
-ALLOWED_EXTENSIONS = {'jpeg', 'jpg', 'png', 'pdf', 'doc', 'docx', 'xls', 'xlsx'}
+# Extensions of the formats the extractor registry reads
+ALLOWED_EXTENSIONS = accepted_extensions()
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
@@ -31,15 +84,123 @@ def home():
     """Default route to confirm the app is running."""
     return jsonify({"message": "CRE Pipeline API is running"}), 200
 
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    """
+    Counts and times every request by route (not raw path, to bound the number of series).
+    """
+    endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+    labels = {"method": request.method, "endpoint": endpoint, "status": response.status_code}
+    metrics.inc("http_requests", 1, labels)
+    if "request_started" in g:
+        metrics.observe("http_request_seconds", time.perf_counter() - g.request_started,
+                        {"method": request.method, "endpoint": endpoint})
+    return response
+
+def run_process_job(payload):
+    """
+    Job handler for /process: extracts content from the uploaded files and
+    consolidates the Excel surveys of the job's workspace. Runs on a job
+    queue worker. Per-stage timings and counters are returned under "metrics".
+    """
+    workspace = workspaces.get(payload.get("workspace", DEFAULT_WORKSPACE))
+    with track_job("process", profile=profile_mode, slow_seconds=profile_slow_seconds,
+                   profile_dir=profile_dir) as job_metrics:
+        # One consolidation per workspace at a time; other workspaces run in parallel
+        with workspace.lock:
+            processed_files = process_uploads(workspace, payload["files"])
+            # Build the query indexes now so the first /properties call does not wait for them
+            try:
+                with stage("index"):
+                    workspace.property_index().get()
+            except Exception as e:
+                logging.error(f"Failed to build property index: {e}", exc_info=True)
+    workspaces.cleanup()
+
+    return {
+        "status": "success",
+        "message": f"Processed {len(processed_files)} files.",
+        "workspace": workspace.name,
+        "output_file": _download_url(workspace),
+        "processed_files": processed_files,
+        "metrics": job_metrics.as_dict()
+    }
+
+def process_uploads(workspace, filenames):
+    """
+    Consolidates every survey uploaded to the workspace, whatever its
+    format, and reports on the job's files. Each file is read by the
+    extractor its content matches. Outputs are written to the workspace's
+    output directory, never to its uploads, so they are not read back in.
+    Returns a list of per-file status messages.
+    """
+    from process_surveys import process_surveys
+    data = process_surveys(workspace.survey_files(), workspace.output_excel, workers=parse_workers,
+                           expensive_workers=expensive_workers, cache=workspace.survey_cache(),
+                           store=workspace.consolidation_store(), chunk_size=chunk_size,
+                           property_store=workspace.property_store(), dedupe=dedupe)
+    rows = data["source_file"].value_counts() if data is not None and "source_file" in data.columns else {}
+
+    processed_files = []
+    for filename in filenames:
+        try:
+            extractor = detect(os.path.join(workspace.upload_dir, filename))
+        except OSError as e:
+            logging.error(f"Error reading {filename}: {e}")
+            extractor = None
+        if extractor is None:
+            processed_files.append(f"Unsupported file skipped: {filename}")
+        else:
+            processed_files.append(f"{extractor.label} file processed: {filename}, "
+                                   f"{rows.get(filename, 0)} rows consolidated")
+    return processed_files
+
+# Uploads are processed in the background so /process returns immediately
+job_queue = JobQueue(run_process_job,
+                     db_path=os.environ.get("CRE_JOBS_DB", os.path.join("jobs", "jobs.db")),
+                     workers=int(os.environ.get("CRE_JOB_WORKERS", "1")))
+job_queue.start()
+
+def _check_files(files):
+    # Check every file before storing anything: the name needs a supported extension and the
+    # content must be a format an extractor reads, whatever the name says. Returns an error response or None
+    for file in files:
+        if not allowed_file(file.filename):
+            logging.warning(f"File not allowed: {file.filename}")
+            return jsonify({"status": "error", "message": f"Unsupported file type: {file.filename}"}), 400
+        extractor = detect(file.stream)
+        if extractor is None:
+            logging.warning(f"Unrecognized content: {file.filename}")
+            return jsonify({"status": "error", "message": f"Unsupported file content: {file.filename}"}), 400
+        if file.filename.rsplit('.', 1)[1].lower() not in extractor.extensions:
+            logging.info(f"{file.filename} contains {extractor.label} ({extractor.name}) data and is read as such")
+    return None
+
+def _save_files(workspace, files):
+    # Streams uploads into the workspace; returns (filename, content hash, stored name or None if already ingested)
+    upload_store = workspace.upload_store()
+    saved = []
+    for file in files:
+        filename = secure_filename(file.filename)
+        content_hash, stored = upload_store.save(file.stream, filename)
+        saved.append((filename, content_hash, stored))
+    return saved
+
 @app.route("/process", methods=["POST"])
 def process():
     """
     Endpoint to process uploaded files.
-    Accepts files via POST request and returns an output file link.
+    Accepts files via POST request, queues them for processing in the
+    request's workspace and returns a job id.
     """
     try:
-        # Log request headers
-        logging.info(f"Request Headers: {request.headers}")
+        workspace = current_workspace()
+        # Headers may carry credentials, so only the upload size is logged
+        logging.info(f"Upload request: {request.content_length} bytes, workspace {workspace.name}")
 
         # Retrieve uploaded files
         files = request.files.getlist("files")
@@ -50,57 +211,320 @@ def process():
         # Log received files
         logging.info(f"Received Files: {[file.filename for file in files]}")
 
-        processed_files = []
+        error = _check_files(files)
+        if error:
+            return error
 
-        for file in files:
-            if allowed_file(file.filename):
-                filename = secure_filename(file.filename)
-                file_path = os.path.join(output_dir, filename)
-                file.save(file_path)
-                logging.info(f"Saved file: {filename}")
-
-                # Handle file-specific processing
-                ext = filename.rsplit('.', 1)[1].lower()
-                if ext in {'xls', 'xlsx'}:
-                    processed_files.append(f"Excel file processed: {filename}")
-                elif ext in {'pdf'}:
-                    pdf_reader = PdfReader(file_path)
-                    pdf_text = " ".join([page.extract_text() for page in pdf_reader.pages])
-                    processed_files.append(f"PDF file processed: {filename}, content extracted")
-                elif ext in {'jpeg', 'jpg', 'png'}:
-                    processed_files.append(f"Image file saved: {filename}")
-                elif ext in {'doc', 'docx'}:
-                    # Add Word file processing logic here if needed
-                    processed_files.append(f"Word document saved: {filename}")
-                else:
-                    logging.warning(f"Unsupported file type: {filename}")
+        saved_files = []
+        skipped_files = []
+
+        for filename, _, stored in _save_files(workspace, files):
+            if stored:
+                saved_files.append(stored)
             else:
-                logging.warning(f"File not allowed: {file.filename}")
-                return jsonify({"status": "error", "message": f"Unsupported file type: {file.filename}"}), 400
+                skipped_files.append(filename)
 
-        # Example consolidation logic for output
-        output_excel = os.path.join(output_dir, "consolidated_properties.xlsx")
-        process_surveys([os.path.join(output_dir, f) for f in os.listdir(output_dir) if f.endswith('.xlsx')], output_excel)
+        if not saved_files:
+            return jsonify({
+                "status": "success",
+                "message": "All files were already processed.",
+                "output_file": _download_url(workspace),
+                "skipped_files": skipped_files
+            }), 200
 
-        # Return success response with download link
+        job_id = job_queue.enqueue({"files": saved_files, "workspace": workspace.name})
+
+        # Return the job id and where to poll for the result
+        return jsonify({
+            "status": "queued",
+            "message": f"Queued {len(saved_files)} files for processing.",
+            "job_id": job_id,
+            "status_url": f"/jobs/{job_id}",
+            "result_url": f"/jobs/{job_id}/result",
+            "skipped_files": skipped_files
+        }), 202
+
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    except RequestEntityTooLarge:
+        raise
+    except Exception as e:
+        logging.error(f"Error in /process: {e}", exc_info=True)
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+@app.errorhandler(413)
+def request_too_large(e):
+    """
+    Return a JSON error when an upload exceeds MAX_CONTENT_LENGTH.
+    """
+    logging.warning(f"Rejected upload larger than {app.config['MAX_CONTENT_LENGTH']} bytes")
+    return jsonify({"status": "error", "message": "Upload too large."}), 413
+
+@app.route("/batches", methods=["POST"])
+def create_batch():
+    """
+    Endpoint to open a bulk submission in the request's workspace. Files are
+    then uploaded to the batch in any number of requests, and committing the
+    batch consolidates them all in one job.
+    """
+    try:
+        workspace = current_workspace()
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    batch_id = batch_store.create(workspace.name)
+    return jsonify({
+        "status": "open",
+        "batch_id": batch_id,
+        "workspace": workspace.name,
+        "upload_url": f"/batches/{batch_id}/files",
+        "commit_url": f"/batches/{batch_id}/commit"
+    }), 201
+
+@app.route("/batches/<batch_id>", methods=["GET"])
+def batch_status(batch_id):
+    """
+    Endpoint to check a batch: its status, the files received so far
+    (with content hashes, so a client can resume an interrupted upload)
+    and the job consolidating it once committed.
+    """
+    batch = batch_store.get(batch_id)
+    if batch is None:
+        return jsonify({"status": "error", "message": f"Unknown batch: {batch_id}"}), 404
+    return jsonify({
+        "batch_id": batch_id,
+        "status": batch["status"],
+        "workspace": batch["workspace"],
+        "job_id": batch["job_id"],
+        "files": batch["files"]
+    }), 200
+
+@app.route("/batches/<batch_id>/files", methods=["POST"])
+def upload_batch_files(batch_id):
+    """
+    Endpoint to add files to an open batch. Files are stored but not
+    processed until the batch is committed. Uploading identical content
+    again is harmless, so failed requests can be retried.
+    """
+    try:
+        batch = batch_store.get(batch_id)
+        if batch is None:
+            return jsonify({"status": "error", "message": f"Unknown batch: {batch_id}"}), 404
+        if batch["status"] == COMMITTED:
+            return jsonify({"status": "error", "message": f"Batch {batch_id} is already committed."}), 409
+
+        files = request.files.getlist("files")
+        if not files:
+            return jsonify({"status": "error", "message": "No files uploaded."}), 400
+        error = _check_files(files)
+        if error:
+            return error
+
+        # Staged outside uploads/ so jobs of the workspace don't consolidate them before the commit
+        workspace = workspaces.get(batch["workspace"])
+        upload_store = workspace.upload_store()
+        received = []
+        for file in files:
+            filename = secure_filename(file.filename)
+            content_hash, new = upload_store.stage(file.stream, workspace.batch_dir(batch_id))
+            stored = filename if new else None
+            batch_store.add_file(batch_id, filename, content_hash, stored)
+            received.append({"filename": filename, "hash": content_hash, "stored": stored})
+        logging.info(f"Batch {batch_id} received {len(received)} files")
+        return jsonify({"status": "open", "batch_id": batch_id, "files": received}), 200
+
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 409
+    except RequestEntityTooLarge:
+        raise
+    except Exception as e:
+        logging.error(f"Error in /batches/{batch_id}/files: {e}", exc_info=True)
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+@app.route("/batches/<batch_id>/commit", methods=["POST"])
+def commit_batch(batch_id):
+    """
+    Endpoint to close a batch and queue one processing job for all of its
+    new files. Committing again returns the same job.
+    """
+    batch = batch_store.get(batch_id)
+    if batch is None:
+        return jsonify({"status": "error", "message": f"Unknown batch: {batch_id}"}), 404
+    workspace = workspaces.get(batch["workspace"])
+    upload_store = workspace.upload_store()
+    batch_dir = workspace.batch_dir(batch_id)
+    try:
+        job_id, _ = batch_store.commit(
+            batch_id,
+            lambda stored: job_queue.enqueue({"files": stored, "workspace": workspace.name}),
+            ingest=lambda stored, content_hash: upload_store.ingest(batch_dir, content_hash, stored))
+    except Exception as e:
+        logging.error(f"Error in /batches/{batch_id}/commit: {e}", exc_info=True)
+        return jsonify({"status": "error", "message": str(e)}), 500
+    # Staged files that were not ingested (replaced or duplicate content) are no longer needed
+    shutil.rmtree(batch_dir, ignore_errors=True)
+
+    if job_id is None:
         return jsonify({
             "status": "success",
-            "message": f"Processed {len(processed_files)} files.",
-            "output_file": f"/download/consolidated_properties.xlsx",
-            "processed_files": processed_files
+            "message": "All files were already processed.",
+            "batch_id": batch_id,
+            "output_file": _download_url(workspace)
         }), 200
+    return jsonify({
+        "status": "queued",
+        "batch_id": batch_id,
+        "job_id": job_id,
+        "status_url": f"/jobs/{job_id}",
+        "result_url": f"/jobs/{job_id}/result"
+    }), 202
+
+@app.route("/jobs/<job_id>", methods=["GET"])
+def job_status(job_id):
+    """
+    Endpoint to check the status of a processing job.
+    """
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"status": "error", "message": f"Unknown job: {job_id}"}), 404
+    return jsonify({
+        "job_id": job_id,
+        "status": job["status"],
+        "created_at": job["created_at"],
+        "started_at": job["started_at"],
+        "finished_at": job["finished_at"],
+        "error": job["error"]
+    }), 200
+
+@app.route("/jobs/<job_id>/result", methods=["GET"])
+def job_result(job_id):
+    """
+    Endpoint to fetch the result of a finished processing job.
+    Returns 202 while the job is still queued or running.
+    """
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"status": "error", "message": f"Unknown job: {job_id}"}), 404
+    if job["status"] == DONE:
+        return jsonify(job["result"]), 200
+    if job["status"] == FAILED:
+        return jsonify({"status": "error", "message": job["error"]}), 500
+    return jsonify({"status": job["status"], "job_id": job_id}), 202
+
+def _float_arg(name):
+    value = request.args.get(name)
+    if value in (None, ""):
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        raise ValueError(f"'{name}' must be a number")
 
+@app.route("/properties", methods=["GET"])
+def query_properties():
+    """
+    Endpoint to query the consolidated properties.
+    Filters: city, zip, building_class (repeatable or comma-separated),
+    min_sf/max_sf (SF available) and min_rent/max_rent (monthly asking rent $/SF).
+    Sorting: sort=<field>, order=asc|desc. Pagination: page, per_page.
+    Queries the request's workspace.
+    """
+    from property_index import HASH_INDEX_FIELDS, RANGE_INDEX_FIELDS, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, to_records
+    try:
+        index = current_workspace().property_index().get()
+        if index is None:
+            return jsonify({"status": "error", "message": "No consolidated properties yet."}), 404
+
+        filters = {}
+        for param, field in HASH_INDEX_FIELDS.items():
+            values = [value.strip() for arg in request.args.getlist(param) for value in arg.split(",") if value.strip()]
+            if values:
+                filters[field] = values
+        ranges = {field: (_float_arg(f"min_{param}"), _float_arg(f"max_{param}"))
+                  for param, field in RANGE_INDEX_FIELDS.items()}
+        order = request.args.get("order", "asc").lower()
+        if order not in ("asc", "desc"):
+            raise ValueError("'order' must be 'asc' or 'desc'")
+        try:
+            page = int(request.args.get("page", 1))
+            per_page = int(request.args.get("per_page", DEFAULT_PAGE_SIZE))
+        except ValueError:
+            raise ValueError("'page' and 'per_page' must be integers")
+        page = max(1, page)
+        per_page = max(1, min(per_page, MAX_PAGE_SIZE))
+
+        with stage("query"):
+            total, results = index.query(filters, ranges, sort=request.args.get("sort") or None,
+                                         descending=order == "desc", page=page, per_page=per_page)
+        return jsonify({
+            "total": total,
+            "page": page,
+            "per_page": per_page,
+            "pages": -(-total // per_page),
+            "properties": to_records(results)
+        }), 200
+
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
     except Exception as e:
-        logging.error(f"Error in /process: {e}", exc_info=True)
+        logging.error(f"Error in /properties: {e}", exc_info=True)
         return jsonify({"status": "error", "message": str(e)}), 500
 
+@app.route("/changes", methods=["GET"])
+def property_changes():
+    """
+    Endpoint returning what the last consolidation changed compared to the
+    one before it: the summary plus the added, removed and changed
+    properties (only the changed fields, with previous and current values).
+    type limits the lists returned (repeatable or comma-separated) and
+    limit caps the entries per list. Reads the request's workspace.
+    """
+    from change_report import CHANGE_TYPES, load_report
+    try:
+        workspace = current_workspace()
+        report = load_report(workspace.property_store().changes_path)
+        if report is None:
+            return jsonify({"status": "error", "message": "No change report yet; it is created from the "
+                                                          "second consolidation on."}), 404
+
+        types = [value.strip() for arg in request.args.getlist("type") for value in arg.split(",") if value.strip()]
+        unknown = set(types) - set(CHANGE_TYPES)
+        if unknown:
+            raise ValueError(f"'type' must be one of {', '.join(CHANGE_TYPES)}")
+        try:
+            limit = int(request.args["limit"]) if request.args.get("limit") else None
+        except ValueError:
+            raise ValueError("'limit' must be an integer")
+        if limit is not None and limit < 0:
+            raise ValueError("'limit' must not be negative")
+
+        result = {"generated_at": report["generated_at"], "summary": report["summary"]}
+        for change_type in types or CHANGE_TYPES:
+            result[change_type] = report[change_type][:limit]
+        return jsonify(result), 200
+
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    except Exception as e:
+        logging.error(f"Error in /changes: {e}", exc_info=True)
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+@app.route("/metrics", methods=["GET"])
+def prometheus_metrics():
+    """
+    Endpoint exposing pipeline and request metrics in the Prometheus text format.
+    Values are summed over all server processes sharing CRE_METRICS_DIR.
+    """
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
 @app.route("/download/<filename>", methods=["GET"])
 def download(filename):
     """
-    Endpoint to download a file from the output directory.
+    Endpoint to download a file from the output directory of the request's workspace.
     """
     try:
-        return send_from_directory(output_dir, filename, as_attachment=True)
+        return send_from_directory(current_workspace().output_dir, filename, as_attachment=True)
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
     except Exception as e:
         logging.error(f"Error in /download: {e}", exc_info=True)
         return jsonify({"status": "error", "message": str(e)}), 500
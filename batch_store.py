@@ -0,0 +1,149 @@
+import os
+import time
+import uuid
+import sqlite3
+import logging
+from contextlib import closing
+
+DEFAULT_DB_PATH = os.path.join("jobs", "batches.db")
+
+OPEN = "open"
+COMMITTED = "committed"
+
+
+class BatchStore:
+    """
+    Tracks bulk submissions: a batch collects the files of several upload
+    requests and is committed once, so the whole batch is consolidated by a
+    single job instead of one job per request.
+    Backed by SQLite so every server process sees the same batches.
+    """
+
+    def __init__(self, db_path=DEFAULT_DB_PATH):
+        self.db_path = db_path
+        if os.path.dirname(db_path):
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS batches (
+                    id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    workspace TEXT NOT NULL DEFAULT 'default',
+                    job_id TEXT,
+                    created_at REAL NOT NULL,
+                    committed_at REAL
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS batch_files (
+                    batch_id TEXT NOT NULL,
+                    filename TEXT NOT NULL,
+                    hash TEXT NOT NULL,
+                    stored TEXT,
+                    created_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS batch_files_batch ON batch_files (batch_id)")
+            # Databases created before batches belonged to a workspace
+            if "workspace" not in [row["name"] for row in conn.execute("PRAGMA table_info(batches)")]:
+                conn.execute("ALTER TABLE batches ADD COLUMN workspace TEXT NOT NULL DEFAULT 'default'")
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def create(self, workspace="default"):
+        """
+        Opens a new batch for files of the given workspace and returns its id.
+        """
+        batch_id = uuid.uuid4().hex
+        with closing(self._connect()) as conn:
+            conn.execute("INSERT INTO batches (id, status, workspace, created_at) VALUES (?, ?, ?, ?)",
+                         (batch_id, OPEN, workspace, time.time()))
+        logging.info(f"Opened batch {batch_id} in workspace {workspace}")
+        return batch_id
+
+    def get(self, batch_id):
+        """
+        Returns the batch as a dict with its files, or None if it does not exist.
+        Each file lists the uploaded name, its content hash and the stored
+        name (None when identical content had already been ingested).
+        """
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT * FROM batches WHERE id = ?", (batch_id,)).fetchone()
+            if row is None:
+                return None
+            files = conn.execute("SELECT filename, hash, stored FROM batch_files WHERE batch_id = ? "
+                                 "ORDER BY created_at, rowid", (batch_id,)).fetchall()
+        batch = dict(row)
+        batch["files"] = [dict(file) for file in files]
+        return batch
+
+    def add_file(self, batch_id, filename, content_hash, stored):
+        """
+        Records a file received for an open batch.
+
+        :raise KeyError: If the batch does not exist.
+        :raise ValueError: If the batch was already committed.
+        """
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute("SELECT status FROM batches WHERE id = ?", (batch_id,)).fetchone()
+                if row is None:
+                    raise KeyError(batch_id)
+                if row["status"] != OPEN:
+                    raise ValueError(f"Batch {batch_id} is already committed")
+                conn.execute("INSERT INTO batch_files (batch_id, filename, hash, stored, created_at) "
+                             "VALUES (?, ?, ?, ?, ?)", (batch_id, filename, content_hash, stored, time.time()))
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+    def commit(self, batch_id, enqueue, ingest=None):
+        """
+        Commits a batch exactly once: enqueue(stored filenames) is called with
+        the files stored for the batch and must return a job id, or None when
+        there is nothing new to process. Committing again returns the first
+        commit's job id, so a client may safely retry.
+
+        If given, ingest(stored filename, content hash) is called first for
+        each file, inside the commit, to move staged files where the job
+        reads them; it returns the stored filename, or None to leave the
+        file out of the job.
+
+        :return: (job id or None, True if this call committed the batch)
+        :raise KeyError: If the batch does not exist.
+        """
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute("SELECT status, job_id FROM batches WHERE id = ?", (batch_id,)).fetchone()
+                if row is None:
+                    raise KeyError(batch_id)
+                if row["status"] == COMMITTED:
+                    conn.execute("COMMIT")
+                    return row["job_id"], False
+
+                # A name uploaded twice holds the later content, so it is processed once
+                latest = {}
+                for file in conn.execute("SELECT stored, hash FROM batch_files WHERE batch_id = ? "
+                                         "AND stored IS NOT NULL ORDER BY created_at, rowid", (batch_id,)):
+                    latest[file["stored"]] = file["hash"]
+                if ingest is not None:
+                    stored = [name for name in (ingest(name, content_hash) for name, content_hash in latest.items())
+                              if name]
+                else:
+                    stored = list(latest)
+                job_id = enqueue(stored) if stored else None
+                conn.execute("UPDATE batches SET status = ?, job_id = ?, committed_at = ? WHERE id = ?",
+                             (COMMITTED, job_id, time.time(), batch_id))
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        logging.info(f"Committed batch {batch_id}: {len(stored)} new files, job {job_id}")
+        return job_id, True
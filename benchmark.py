@@ -0,0 +1,301 @@
+import os
+import gc
+import sys
+import json
+import time
+import shutil
+import logging
+import platform
+import argparse
+import resource
+import tempfile
+import subprocess
+import tracemalloc
+from datetime import datetime
+import pandas as pd
+import pytesseract
+from process_surveys import read_surveys, standardize_columns, tag_table
+from excel_stream import DEFAULT_CHUNK_SIZE, read_workbook_tables
+from survey_fields import apply_schema
+from deduplication import deduplicate_properties
+from excel_export import export_excel
+from pdf_extraction import extract_pdf
+from synthetic_surveys import generate_corpus
+
+DEFAULT_RESULTS_DIR = "benchmarks"
+# A stage counts as a regression when it is this much slower than the baseline
+DEFAULT_REGRESSION_TOLERANCE = 0.2
+# Modules that should only be loaded by the API once a job or query needs them
+HEAVY_MODULES = ("pandas", "numpy", "pyarrow", "openpyxl", "pdfplumber", "cv2", "pytesseract")
+
+# Runs in a fresh interpreter: imports the API like a new server worker, serves
+# one request to "/" and reports timings, max RSS and the heavy modules loaded
+STARTUP_SCRIPT = """
+import sys, json, time, resource
+started = time.perf_counter()
+import api_wrapper
+imported = time.perf_counter()
+api_wrapper.app.test_client().get("/")
+served = time.perf_counter()
+try:
+    # Peak RSS of this process image; ru_maxrss on Linux keeps the forking parent's peak across exec
+    with open("/proc/self/status") as f:
+        rss_mb = next(int(line.split()[1]) for line in f if line.startswith("VmHWM:")) / 2 ** 10
+except OSError:
+    rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2 ** 20
+print(json.dumps({
+    "import_seconds": imported - started,
+    "first_request_seconds": served - imported,
+    "rss_mb": rss_mb,
+    "heavy_modules": [name for name in %r if name in sys.modules],
+}))
+""" % (HEAVY_MODULES,)
+
+
+def measure(func, *args, repeat=1, trace_memory=True):
+    """
+    Runs func(*args) and returns (result, metrics).
+
+    Timing runs are not traced, because tracemalloc slows allocation-heavy
+    code down; the fastest of `repeat` runs is reported. Peak memory comes
+    from one extra run under tracemalloc, which counts the Python and NumPy
+    allocations made by that run.
+    """
+    timings = []
+    for _ in range(max(1, repeat)):
+        gc.collect()
+        started = time.perf_counter()
+        result = func(*args)
+        timings.append(time.perf_counter() - started)
+    metrics = {"seconds": round(min(timings), 4)}
+    if repeat > 1:
+        metrics["runs"] = [round(seconds, 4) for seconds in timings]
+
+    if trace_memory:
+        del result
+        gc.collect()
+        tracemalloc.start()
+        try:
+            result = func(*args)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        metrics["peak_memory_mb"] = round(peak / 2 ** 20, 2)
+    return result, metrics
+
+
+def _read_raw(file_paths, chunk_size):
+    # Same reading path as process_surveys.read_survey, without standardizing
+    return [(file_path, table, data) for file_path in file_paths
+            for table, data in read_workbook_tables(file_path, chunk_size=chunk_size or DEFAULT_CHUNK_SIZE)]
+
+
+def _standardize(tables):
+    typed = [apply_schema(standardize_columns(tag_table(data.copy(), file_path, table)))
+             for file_path, table, data in tables]
+    return apply_schema(pd.concat(typed, ignore_index=True))
+
+
+def _extract_pdfs(file_paths, workers):
+    return [extract_pdf(file_path, workers)[0] for file_path in file_paths]
+
+
+def _ocr_images(file_paths, workers):
+    # The registry path the pipeline uses: one OCR'd row per image, on the expensive pool
+    return [data for data in read_surveys(file_paths, expensive_workers=workers) if data is not None]
+
+
+def _max_rss_mb():
+    # ru_maxrss is kilobytes on Linux and bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (2 ** 20 if sys.platform == "darwin" else 2 ** 10), 2)
+
+
+def measure_startup(work_dir, repeat=1):
+    """
+    Measures API cold start: each run launches a new interpreter that imports
+    api_wrapper and serves "/", as a freshly started server worker would.
+    The run's data directories are created under work_dir.
+
+    :return: metrics of the fastest run: wall seconds (interpreter start
+             included), import and first request seconds, max RSS and the
+             heavy modules loaded.
+    """
+    app_dir = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [app_dir, os.environ.get("PYTHONPATH")])))
+    startup_dir = os.path.join(work_dir, "startup")
+    os.makedirs(startup_dir, exist_ok=True)
+
+    runs = []
+    for _ in range(max(1, repeat)):
+        started = time.perf_counter()
+        completed = subprocess.run([sys.executable, "-c", STARTUP_SCRIPT], cwd=startup_dir, env=env,
+                                   capture_output=True, text=True, check=True)
+        seconds = time.perf_counter() - started
+        runs.append((seconds, json.loads(completed.stdout.strip().splitlines()[-1])))
+
+    seconds, child = min(runs, key=lambda run: run[0])
+    metrics = {
+        "seconds": round(seconds, 4),
+        "import_seconds": round(child["import_seconds"], 4),
+        "first_request_seconds": round(child["first_request_seconds"], 4),
+        "rss_mb": round(child["rss_mb"], 2),
+        "heavy_modules": child["heavy_modules"],
+    }
+    if repeat > 1:
+        metrics["runs"] = [round(run[0], 4) for run in runs]
+    return metrics
+
+
+def run_benchmark(corpus, work_dir, chunk_size=None, workers=None, repeat=1, trace_memory=True):
+    """
+    Times each pipeline stage over a generated corpus.
+
+    Stages: startup (API cold start, see measure_startup), read (workbooks
+    to raw frames), standardize (canonical columns and typed schema, then
+    concatenation), dedup, export (Excel), and pdf and ocr extraction. OCR
+    is skipped when Tesseract is not installed.
+
+    :return: dict of stage name -> metrics.
+    """
+    stages = {"startup": measure_startup(work_dir, repeat)}
+    options = {"repeat": repeat, "trace_memory": trace_memory}
+
+    frames, stages["read"] = measure(_read_raw, corpus["xlsx"], chunk_size, **options)
+    stages["read"]["files"] = len(corpus["xlsx"])
+    stages["read"]["bytes"] = sum(os.path.getsize(file_path) for file_path in corpus["xlsx"])
+
+    data, stages["standardize"] = measure(_standardize, frames, **options)
+    stages["standardize"]["rows"] = len(data)
+    del frames
+
+    deduplicated, stages["dedup"] = measure(deduplicate_properties, data, **options)
+    stages["dedup"]["rows_in"] = len(data)
+    stages["dedup"]["rows_out"] = len(deduplicated)
+
+    output_excel = os.path.join(work_dir, "benchmark_export.xlsx")
+    _, stages["export"] = measure(export_excel, deduplicated, output_excel, **options)
+    stages["export"]["rows"] = len(deduplicated)
+    stages["export"]["bytes"] = os.path.getsize(output_excel)
+
+    if corpus["pdf"]:
+        pdf_frames, stages["pdf"] = measure(_extract_pdfs, corpus["pdf"], workers, **options)
+        pages = sum(len(frame) for frame in pdf_frames)
+        stages["pdf"]["pages"] = pages
+        stages["pdf"]["pages_per_second"] = round(pages / stages["pdf"]["seconds"], 2)
+
+    if corpus["image"]:
+        if shutil.which(pytesseract.pytesseract.tesseract_cmd):
+            # No survey cache, so every run recognizes every image
+            images, stages["ocr"] = measure(_ocr_images, corpus["image"], workers or 2, **options)
+            stages["ocr"]["images"] = len(corpus["image"])
+            stages["ocr"]["rows"] = sum(len(data) for data in images)
+        else:
+            stages["ocr"] = {"skipped": "tesseract not found"}
+
+    return stages
+
+
+def compare_results(results, baseline, tolerance=DEFAULT_REGRESSION_TOLERANCE):
+    """
+    Compares stage timings with a baseline result.
+
+    :return: list of (stage, baseline seconds, current seconds, ratio, regressed) tuples.
+    """
+    comparison = []
+    for stage, metrics in results["stages"].items():
+        before = baseline.get("stages", {}).get(stage, {}).get("seconds")
+        after = metrics.get("seconds")
+        if not before or after is None:
+            continue
+        ratio = after / before
+        comparison.append((stage, before, after, round(ratio, 3), ratio > 1 + tolerance))
+    return comparison
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the survey pipeline on synthetic surveys.")
+    parser.add_argument("--workbooks", type=int, default=3, help="Number of xlsx surveys to generate")
+    parser.add_argument("--rows", type=int, default=5000, help="Listings per xlsx survey")
+    parser.add_argument("--header-offset", type=int, default=2, help="Rows above the header in each xlsx")
+    parser.add_argument("--duplicates", type=float, default=0.1, help="Share of listings repeating a building")
+    parser.add_argument("--pdfs", type=int, default=1, help="Number of PDF surveys to generate")
+    parser.add_argument("--pages", type=int, default=40, help="Pages (listings) per PDF")
+    parser.add_argument("--images", type=int, default=2, help="Number of flyer images to generate")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed for the generated data")
+    parser.add_argument("--chunk-size", type=int, default=None,
+                        help=f"Rows converted at a time while reading workbooks (default: {DEFAULT_CHUNK_SIZE})")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="Worker processes for PDF and OCR")
+    parser.add_argument("--repeat", type=int, default=1, help="Timed runs per stage; the fastest is reported")
+    parser.add_argument("--no-memory", action="store_true", help="Skip the traced run that measures peak memory")
+    parser.add_argument("--work-dir", default=None,
+                        help="Directory for generated surveys and output, kept after the run (default: temporary)")
+    parser.add_argument("-o", "--output", default=None,
+                        help=f"Results JSON path (default: {DEFAULT_RESULTS_DIR}/benchmark_<timestamp>.json)")
+    parser.add_argument("--baseline", default=None, help="Results JSON of an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_REGRESSION_TOLERANCE,
+                        help="Slowdown vs. the baseline reported as a regression (default: %(default)s)")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Keep pipeline INFO logging")
+    args = parser.parse_args(argv)
+
+    if not args.verbose:
+        # Per-file INFO logging would be timed along with the stages
+        logging.getLogger().setLevel(logging.WARNING)
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="cre_benchmark_")
+    try:
+        started = time.perf_counter()
+        corpus = generate_corpus(work_dir, workbooks=args.workbooks, rows_per_workbook=args.rows, pdfs=args.pdfs,
+                                 pages_per_pdf=args.pages, images=args.images, header_offset=args.header_offset,
+                                 duplicate_ratio=args.duplicates, seed=args.seed)
+        generate_seconds = round(time.perf_counter() - started, 4)
+        stages = run_benchmark(corpus, work_dir, chunk_size=args.chunk_size, workers=args.workers,
+                               repeat=args.repeat, trace_memory=not args.no_memory)
+    finally:
+        if not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    results = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "environment": {
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+        "config": {key: value for key, value in vars(args).items()
+                   if key not in ("output", "baseline", "tolerance", "verbose", "work_dir", "repeat", "no_memory")},
+        "generate_seconds": generate_seconds,
+        "stages": stages,
+        "max_rss_mb": _max_rss_mb(),
+    }
+
+    output = args.output or os.path.join(DEFAULT_RESULTS_DIR,
+                                         f"benchmark_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+
+    print(f"{'stage':<12}{'seconds':>10}{'peak MB':>10}")
+    for stage, metrics in stages.items():
+        print(f"{stage:<12}{metrics.get('seconds', '-')!s:>10}{metrics.get('peak_memory_mb', '-')!s:>10}"
+              f"{'  ' + metrics['skipped'] if 'skipped' in metrics else ''}")
+    startup = stages["startup"]
+    print(f"API startup: {startup['rss_mb']} MB RSS, "
+          f"heavy modules loaded: {', '.join(startup['heavy_modules']) or 'none'}")
+    print(f"max RSS: {results['max_rss_mb']} MB, results saved to {output}")
+
+    regressed = False
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("config") != results["config"]:
+            print("Warning: baseline was run with a different configuration")
+        for stage, before, after, ratio, slower in compare_results(results, baseline, args.tolerance):
+            regressed = regressed or slower
+            print(f"{stage:<12}{before:>10}{after:>10}  x{ratio}{'  REGRESSION' if slower else ''}")
+    return 1 if regressed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,336 @@
+import os
+import sys
+import json
+import time
+import random
+import hashlib
+import logging
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from werkzeug.utils import secure_filename
+from extractors import accepted_extensions
+
+DEFAULT_URL = "http://localhost:5000"
+DEFAULT_CONCURRENCY = 4
+DEFAULT_BATCH_FILES = 20
+DEFAULT_BATCH_MB = 50
+DEFAULT_RETRIES = 5
+DEFAULT_BACKOFF = 0.5
+MAX_BACKOFF = 30
+DEFAULT_TIMEOUT = 300
+STATE_FILENAME = ".cre_bulk_state.json"
+# Same extensions the server accepts
+ALLOWED_EXTENSIONS = accepted_extensions()
+# Responses worth retrying: throttling and gateway or overload errors
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+def file_sha256(file_path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def find_surveys(directory):
+    """
+    Returns the paths of the files under directory the server accepts, sorted.
+    """
+    paths = []
+    for root, _, filenames in os.walk(directory):
+        for filename in filenames:
+            if '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS:
+                paths.append(os.path.join(root, filename))
+    return sorted(paths)
+
+
+def upload_names(keys):
+    """
+    Returns the name each file is uploaded under: its key (path relative to
+    the submitted directory) sanitized the way the server stores it, so
+    "2024/survey.csv" and "2025/survey.csv" stay two files.
+
+    :param keys: dict of file path -> key.
+    :return: dict of file path -> upload name.
+    :raise ValueError: If two files would be stored under the same name.
+    """
+    names = {}
+    owners = {}
+    collisions = []
+    for file_path, key in keys.items():
+        name = secure_filename(key.replace(os.sep, "/"))
+        if name in owners:
+            collisions.append(f"{keys[owners[name]]} and {key} -> {name}")
+        owners.setdefault(name, file_path)
+        names[file_path] = name
+    if collisions:
+        raise ValueError("Files would overwrite each other on the server: " + "; ".join(collisions))
+    return names
+
+
+def make_batches(file_paths, max_files=DEFAULT_BATCH_FILES, max_bytes=DEFAULT_BATCH_MB * 2 ** 20):
+    """
+    Groups files into upload batches of at most max_files files and
+    max_bytes bytes; a single larger file gets a batch of its own.
+    """
+    batches, current, size = [], [], 0
+    for file_path in file_paths:
+        file_size = os.path.getsize(file_path)
+        if current and (len(current) >= max_files or size + file_size > max_bytes):
+            batches.append(current)
+            current, size = [], 0
+        current.append(file_path)
+        size += file_size
+    if current:
+        batches.append(current)
+    return batches
+
+
+class UploadState:
+    """
+    Progress of one bulk submission, saved after every uploaded batch so an
+    interrupted run resumes where it stopped: the open batch id and the
+    content hash of every file the server has received.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self.batch_id = None
+        self.uploaded = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+            self.batch_id = state.get("batch_id")
+            self.uploaded = state.get("uploaded", {})
+
+    def is_uploaded(self, key, content_hash):
+        return self.uploaded.get(key) == content_hash
+
+    def mark_uploaded(self, entries):
+        with self._lock:
+            self.uploaded.update(entries)
+            self.save()
+
+    def start(self, batch_id):
+        with self._lock:
+            self.batch_id = batch_id
+            self.uploaded = {}
+            self.save()
+
+    def save(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"batch_id": self.batch_id, "uploaded": self.uploaded}, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def clear(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class BulkClient:
+    """
+    Submits many surveys to the API as one batch: files are uploaded in
+    multipart requests of several files each, a few requests at a time over
+    one pooled session, and the batch is committed once so the server
+    consolidates everything in a single job.
+
+    Failed requests are retried with exponential backoff. Every upload is
+    idempotent on the server (identical content is stored once) and so is
+    the commit, so retries never duplicate work.
+    """
+
+    def __init__(self, base_url=DEFAULT_URL, concurrency=DEFAULT_CONCURRENCY, retries=DEFAULT_RETRIES,
+                 backoff=DEFAULT_BACKOFF, timeout=DEFAULT_TIMEOUT, workspace=None):
+        """
+        :param base_url: API root, e.g. "http://localhost:5000".
+        :param concurrency: Upload requests in flight at once (and pooled connections).
+        :param retries: Attempts after the first before a request fails.
+        :param backoff: First retry delay in seconds; doubled on every attempt, with jitter.
+        :param timeout: Seconds to wait for each response.
+        :param workspace: Server workspace to submit to (default: the server's default workspace).
+        """
+        self.base_url = base_url.rstrip("/")
+        self.concurrency = max(1, concurrency)
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.workspace = workspace or "default"
+        self.session = requests.Session()
+        self.session.headers["X-Workspace"] = self.workspace
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=self.concurrency)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _delay(self, attempt, response=None):
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after and retry_after.isdigit():
+            return min(int(retry_after), MAX_BACKOFF)
+        return min(self.backoff * 2 ** attempt, MAX_BACKOFF) * random.uniform(0.5, 1.0)
+
+    def request(self, method, path, files=None):
+        """
+        Sends a request, retrying connection errors, timeouts and 429/5xx
+        responses with exponential backoff. Other error responses raise
+        requests.HTTPError immediately.
+
+        :param files: Optional list of (upload name, file path) pairs sent as the
+                      multipart "files" field; they are reopened on every attempt.
+        :return: Decoded JSON response.
+        """
+        url = f"{self.base_url}{path}"
+        for attempt in range(self.retries + 1):
+            handles = [(name, open(file_path, "rb")) for name, file_path in files or []]
+            try:
+                multipart = [("files", (name, f)) for name, f in handles] or None
+                response = self.session.request(method, url, files=multipart, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt == self.retries:
+                    raise
+                delay = self._delay(attempt)
+                logging.warning(f"{method} {path} failed ({e}), retrying in {delay:.1f}s")
+            else:
+                if response.status_code not in RETRY_STATUSES or attempt == self.retries:
+                    response.raise_for_status()
+                    return response.json()
+                delay = self._delay(attempt, response)
+                logging.warning(f"{method} {path} returned {response.status_code}, retrying in {delay:.1f}s")
+            finally:
+                for _, f in handles:
+                    f.close()
+            time.sleep(delay)
+
+    def _open_batch(self, state):
+        # Reuse the batch of an interrupted run if the server still has it open
+        if state.batch_id:
+            try:
+                batch = self.request("GET", f"/batches/{state.batch_id}")
+                if batch["status"] == "open" and batch.get("workspace", "default") == self.workspace:
+                    logging.info(f"Resuming batch {state.batch_id} ({len(state.uploaded)} files already uploaded)")
+                    return state.batch_id
+            except requests.HTTPError as e:
+                if e.response is None or e.response.status_code != 404:
+                    raise
+        state.start(self.request("POST", "/batches")["batch_id"])
+        logging.info(f"Opened batch {state.batch_id}")
+        return state.batch_id
+
+    def submit(self, file_paths, state_path, root=None, max_files=DEFAULT_BATCH_FILES,
+               max_bytes=DEFAULT_BATCH_MB * 2 ** 20, wait=False, poll_interval=2):
+        """
+        Uploads files into one batch and commits it.
+
+        :param file_paths: Files to submit. Each is uploaded under its path relative to
+                           root, with separators replaced, e.g. "2024_survey.csv".
+        :param state_path: Where progress is saved for resuming; removed once the batch is committed.
+        :param root: Directory file keys in the state file are relative to (default: the cwd).
+        :param max_files: Files per upload request.
+        :param max_bytes: Bytes per upload request.
+        :param wait: Poll the job until it finishes and return its result.
+        :return: The commit response, or the job result when wait is set.
+        :raise ValueError: If two files would be stored under the same name.
+        """
+        keys = {file_path: os.path.relpath(file_path, root or os.getcwd()) for file_path in file_paths}
+        # Checked before anything is uploaded, so a collision never leaves a half-sent batch
+        names = upload_names(keys)
+        state = UploadState(state_path)
+        batch_id = self._open_batch(state)
+
+        pending = []
+        for file_path, key in keys.items():
+            content_hash = file_sha256(file_path)
+            if not state.is_uploaded(key, content_hash):
+                pending.append((file_path, key, content_hash))
+        logging.info(f"{len(pending)} of {len(file_paths)} files to upload")
+
+        hashes = {file_path: (key, content_hash) for file_path, key, content_hash in pending}
+        batches = make_batches([file_path for file_path, _, _ in pending], max_files, max_bytes)
+
+        def upload(batch):
+            self.request("POST", f"/batches/{batch_id}/files",
+                         files=[(names[file_path], file_path) for file_path in batch])
+            state.mark_uploaded(dict(hashes[file_path] for file_path in batch))
+            logging.info(f"Uploaded {len(batch)} files")
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            # list() re-raises the first failed upload; finished batches stay recorded for a resume
+            list(executor.map(upload, batches))
+
+        result = self.request("POST", f"/batches/{batch_id}/commit")
+        state.clear()
+        logging.info(f"Committed batch {batch_id}: {result.get('job_id') or result.get('message')}")
+
+        if wait and result.get("result_url"):
+            return self.wait(result["job_id"], poll_interval)
+        return result
+
+    def submit_directory(self, directory, state_path=None, **kwargs):
+        """
+        Submits every accepted file under directory (see submit). Progress is
+        kept in directory/.cre_bulk_state.json by default, so running the same
+        command again after an interruption resumes the upload.
+        """
+        state_path = state_path or os.path.join(directory, STATE_FILENAME)
+        return self.submit(find_surveys(directory), state_path, root=directory, **kwargs)
+
+    def wait(self, job_id, poll_interval=2):
+        """
+        Polls a job until it finishes and returns its result.
+        """
+        while True:
+            response = self.session.get(f"{self.base_url}/jobs/{job_id}/result", timeout=self.timeout)
+            if response.status_code != 202:
+                return response.json()
+            time.sleep(poll_interval)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Submit a directory of surveys to the CRE API in batches.")
+    parser.add_argument("directory", help="Directory of surveys (searched recursively)")
+    parser.add_argument("--url", default=os.environ.get("CRE_API_URL", DEFAULT_URL),
+                        help="API root URL (default: $CRE_API_URL or %(default)s)")
+    parser.add_argument("-c", "--concurrency", type=int, default=DEFAULT_CONCURRENCY,
+                        help="Upload requests in flight at once")
+    parser.add_argument("--batch-files", type=int, default=DEFAULT_BATCH_FILES, help="Files per upload request")
+    parser.add_argument("--batch-mb", type=float, default=DEFAULT_BATCH_MB, help="Megabytes per upload request")
+    parser.add_argument("--retries", type=int, default=DEFAULT_RETRIES, help="Retries per request")
+    parser.add_argument("--backoff", type=float, default=DEFAULT_BACKOFF, help="First retry delay in seconds")
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT, help="Seconds to wait for a response")
+    parser.add_argument("--workspace", default=os.environ.get("CRE_WORKSPACE"),
+                        help="Server workspace to submit to (default: $CRE_WORKSPACE or the server default)")
+    parser.add_argument("--state", default=None,
+                        help=f"Progress file used to resume (default: <directory>/{STATE_FILENAME})")
+    parser.add_argument("--wait", action="store_true", help="Wait for the processing job and print its result")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    with BulkClient(args.url, concurrency=args.concurrency, retries=args.retries, backoff=args.backoff,
+                    timeout=args.timeout, workspace=args.workspace) as client:
+        try:
+            result = client.submit_directory(args.directory, state_path=args.state, max_files=args.batch_files,
+                                             max_bytes=int(args.batch_mb * 2 ** 20), wait=args.wait)
+        except requests.RequestException as e:
+            logging.error(f"Bulk submission stopped: {e}. Run the same command again to resume.")
+            return 1
+        except ValueError as e:
+            logging.error(f"Nothing submitted: {e}")
+            return 1
+    print(json.dumps(result, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
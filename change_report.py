@@ -0,0 +1,314 @@
+import os
+import json
+import uuid
+import logging
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from deduplication import normalize_addresses
+from survey_fields import CANONICAL_FIELDS, STRING_DTYPE
+
+# Fields listed for added and removed properties, to identify them
+IDENTITY_FIELDS = ["address", "city", "zip_code", "property_name"]
+# Relative tolerance below which two numbers are considered unchanged
+NUMERIC_TOLERANCE = 1e-9
+# Lists of a saved report
+CHANGE_TYPES = ("added", "removed", "changed")
+
+
+def _street_keys(data):
+    # ZIP (or city), normalized street and unit; NA without an address or name
+    empty = pd.Series(pd.NA, index=data.index, dtype=STRING_DTYPE)
+
+    area = empty
+    if "zip_code" in data.columns:
+        zip_code = data["zip_code"].astype(STRING_DTYPE)
+        area = zip_code.str.replace(r"^.*?(\d{5}).*$", r"\1", regex=True)
+        area = area.where(zip_code.str.contains(r"\d{5}", regex=True))
+    if "city" in data.columns:
+        area = area.fillna(data["city"].astype(STRING_DTYPE).str.strip().str.lower())
+    area = area.fillna("")
+
+    street, unit = empty, empty
+    if "address" in data.columns:
+        normalized = normalize_addresses(data["address"])
+        street, unit = normalized["street"].astype(STRING_DTYPE), normalized["unit"].astype(STRING_DTYPE)
+    if "property_name" in data.columns:
+        name = data["property_name"].astype(STRING_DTYPE).str.strip().str.lower().str.replace(r"\s+", " ",
+                                                                                                regex=True)
+        street = street.fillna("name:" + name.replace("", pd.NA))
+
+    return area + "|" + street + "|" + unit.fillna("")
+
+
+def _number_keys(keys):
+    occurrence = keys.groupby(keys, sort=False, dropna=False).cumcount()
+    return keys.where(occurrence == 0, keys + "#" + (occurrence + 1).astype(STRING_DTYPE))
+
+
+def property_keys(data):
+    """
+    Returns a stable key per row that identifies the same listing across
+    consolidation runs: ZIP (or city), normalized street address and unit,
+    e.g. "87110|123 main st|ste 200". Rows without an address fall back to
+    the property name. Listings sharing a key are numbered in order of
+    appearance ("...#2"), so every key is unique. Rows with neither an
+    address nor a name get NA.
+    """
+    return _number_keys(_street_keys(data))
+
+
+def _hash_keys(keys):
+    # 64-bit hashes of the keys, so the join compares integers instead of strings
+    return pd.util.hash_pandas_object(keys, index=False).to_numpy()
+
+
+def _pair(previous_hashes, previous_positions, current_hashes, current_positions):
+    # Hash join pairing the n-th previous row of a hash with the n-th current one;
+    # unpaired rows have NaN on the other side
+    left = pd.DataFrame({"_hash": previous_hashes, "_previous": previous_positions})
+    right = pd.DataFrame({"_hash": current_hashes, "_current": current_positions})
+    for frame in (left, right):
+        frame["_n"] = frame.groupby("_hash", sort=False).cumcount()
+    return left.merge(right, on=["_hash", "_n"], how="outer")
+
+
+def _differs(previous, current):
+    # Vectorized per-row inequality, treating two missing values as equal
+    if pd.api.types.is_numeric_dtype(previous.dtype) and pd.api.types.is_numeric_dtype(current.dtype) \
+            and not isinstance(previous.dtype, pd.CategoricalDtype) \
+            and not isinstance(current.dtype, pd.CategoricalDtype):
+        a = previous.to_numpy(dtype="float64", na_value=np.nan)
+        b = current.to_numpy(dtype="float64", na_value=np.nan)
+        same = np.isclose(a, b, rtol=NUMERIC_TOLERANCE, atol=0) | (np.isnan(a) & np.isnan(b))
+        return ~same, True
+    a, b = previous.astype("string"), current.astype("string")
+    return (a.ne(b).fillna(False) | (a.isna() ^ b.isna())).to_numpy(dtype=bool), False
+
+
+def _json_value(value):
+    if value is None or value is pd.NA or (isinstance(value, float) and np.isnan(value)):
+        return None
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (pd.Timestamp, datetime)):
+        return value.isoformat()
+    return value
+
+
+class ChangeReport:
+    """
+    Differences between two consolidated datasets: properties added,
+    removed, and changed, with the previous and current value of every
+    changed field (and the delta for numeric fields).
+    """
+
+    def __init__(self, added, removed, changes, previous_rows, current_rows, unkeyed=0):
+        """
+        :param added: DataFrame of the properties only in the current dataset, with a "key" column.
+        :param removed: DataFrame of the properties only in the previous dataset, with a "key" column.
+        :param changes: Long DataFrame of changed fields: key, field, previous, current, delta.
+        :param previous_rows: Rows in the previous dataset.
+        :param current_rows: Rows in the current dataset.
+        :param unkeyed: Rows that had no address or name and were not compared.
+        """
+        self.added = added
+        self.removed = removed
+        self.changes = changes
+        self.previous_rows = previous_rows
+        self.current_rows = current_rows
+        self.unkeyed = unkeyed
+        self.generated_at = datetime.now().isoformat(timespec="seconds")
+
+    def summary(self):
+        changed = self.changes["key"].nunique() if not self.changes.empty else 0
+        return {
+            "previous_rows": self.previous_rows,
+            "current_rows": self.current_rows,
+            "added": len(self.added),
+            "removed": len(self.removed),
+            "changed": changed,
+            "unchanged": self.current_rows - self.unkeyed - len(self.added) - changed,
+            "unkeyed": self.unkeyed,
+            "changed_fields": self.changes["field"].value_counts().to_dict() if not self.changes.empty else {},
+        }
+
+    def _changed_records(self):
+        records = {}
+        identity = [field for field in IDENTITY_FIELDS if field in self.changes.columns]
+        identities = self.changes.drop_duplicates("key").set_index("key")[identity].to_dict("index")
+        for key, field, previous, current, delta in self.changes[["key", "field", "previous", "current",
+                                                                  "delta"]].itertuples(index=False):
+            if key not in records:
+                records[key] = {"key": key, **{name: _json_value(value) for name, value in identities[key].items()},
+                                "changes": {}}
+            change = {"previous": _json_value(previous), "current": _json_value(current)}
+            if not pd.isna(delta):
+                change["delta"] = _json_value(delta)
+            records[key]["changes"][field] = change
+        return list(records.values())
+
+    @staticmethod
+    def _identity_records(data):
+        columns = ["key"] + [field for field in IDENTITY_FIELDS if field in data.columns]
+        values = data[columns].astype(object).to_numpy()
+        return [{column: _json_value(value) for column, value in zip(columns, row)} for row in values.tolist()]
+
+    def to_dict(self):
+        """
+        Returns the report as compact JSON-serializable data: the summary,
+        the identity fields of added and removed properties, and only the
+        changed fields of changed properties.
+        """
+        return {
+            "generated_at": self.generated_at,
+            "summary": self.summary(),
+            "added": self._identity_records(self.added),
+            "removed": self._identity_records(self.removed),
+            "changed": self._changed_records(),
+        }
+
+    def save(self, path):
+        """
+        Atomically writes the report as JSON.
+        """
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.to_dict(), f)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        logging.info(f"Change report saved to {path}")
+
+    def to_excel(self, path):
+        """
+        Writes the report as a workbook with Summary, Added, Removed and Changed sheets.
+        """
+        summary = self.summary()
+        summary_rows = [(name, value) for name, value in summary.items() if name != "changed_fields"]
+        summary_rows += [(f"changed: {field}", value) for field, value in summary["changed_fields"].items()]
+        # ExcelWriter picks the engine from the extension, so the temporary name keeps ".xlsx"
+        tmp_path = os.path.join(os.path.dirname(path), f".{uuid.uuid4().hex}.tmp.xlsx")
+        try:
+            with pd.ExcelWriter(tmp_path, engine="xlsxwriter") as writer:
+                pd.DataFrame(summary_rows, columns=["Statistic", "Value"]).to_excel(writer, sheet_name="Summary",
+                                                                                    index=False)
+                self.added.to_excel(writer, sheet_name="Added", index=False)
+                self.removed.to_excel(writer, sheet_name="Removed", index=False)
+                self.changes.to_excel(writer, sheet_name="Changed", index=False)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        logging.info(f"Change report saved to {path}")
+
+
+def load_report(path):
+    """
+    Loads a report saved with ChangeReport.save, or returns None if there is none.
+    """
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def diff_properties(previous, current, fields=None):
+    """
+    Compares two consolidated datasets.
+
+    Rows are matched with hash joins on their property keys, never by
+    position: identical listings are paired first, then the remaining ones
+    on the key alone, so listings sharing an address pair up correctly when
+    only some of them change. Each field is compared for all matched rows
+    at once, so the cost is a few vectorized passes over the data.
+
+    :param previous: The earlier consolidated DataFrame.
+    :param current: The new consolidated DataFrame.
+    :param fields: Fields to compare (default: the canonical fields present in both).
+    :return: ChangeReport
+    """
+    if fields is None:
+        fields = [field for field in CANONICAL_FIELDS if field in previous.columns and field in current.columns]
+    identity = [field for field in IDENTITY_FIELDS if field in current.columns or field in previous.columns]
+
+    previous = previous.reset_index(drop=True)
+    current = current.reset_index(drop=True)
+    # One pass over both datasets, so addresses they share are normalized once
+    key_fields = [field for field in ["address", "city", "zip_code", "property_name"]
+                  if field in previous.columns or field in current.columns]
+    # Key fields are text in both frames, so a field one side lacks is an
+    # all-NA text column rather than an object column of NaN
+    streets = _street_keys(pd.concat([data.reindex(columns=key_fields).astype(STRING_DTYPE)
+                                      for data in (previous, current)], ignore_index=True))
+    previous_streets = streets.iloc[:len(previous)].reset_index(drop=True)
+    current_streets = streets.iloc[len(previous):].reset_index(drop=True)
+    previous_keys, current_keys = _number_keys(previous_streets), _number_keys(current_streets)
+    previous_keyed = np.flatnonzero(previous_streets.notna().to_numpy())
+    current_keyed = np.flatnonzero(current_streets.notna().to_numpy())
+
+    # First pair listings identical in every compared field, then pair the
+    # rest on their key alone, so listings sharing an address are matched to
+    # the right counterpart whatever their order
+    def row_hashes(data, streets, positions):
+        rows = data.iloc[positions].reindex(columns=fields)
+        return _hash_keys(pd.DataFrame({"key": streets.iloc[positions].to_numpy(),
+                                        "row": pd.util.hash_pandas_object(rows, index=False).to_numpy()}))
+
+    identical = _pair(row_hashes(previous, previous_streets, previous_keyed), previous_keyed,
+                      row_hashes(current, current_streets, current_keyed), current_keyed)
+    previous_rest = np.sort(identical.loc[identical["_current"].isna(), "_previous"].to_numpy(dtype=np.intp))
+    current_rest = np.sort(identical.loc[identical["_previous"].isna(), "_current"].to_numpy(dtype=np.intp))
+    joined = _pair(_hash_keys(previous_streets.iloc[previous_rest]), previous_rest,
+                   _hash_keys(current_streets.iloc[current_rest]), current_rest)
+
+    def listing(data, keys, positions):
+        positions = np.sort(positions.astype(np.intp))
+        result = data.iloc[positions].reindex(columns=identity + [f for f in fields if f not in identity])
+        result.insert(0, "key", keys.iloc[positions].to_numpy())
+        return result.reset_index(drop=True)
+
+    added = listing(current, current_keys, joined.loc[joined["_previous"].isna(), "_current"].to_numpy())
+    removed = listing(previous, previous_keys, joined.loc[joined["_current"].isna(), "_previous"].to_numpy())
+
+    matched = joined.dropna().sort_values("_current")
+    previous_positions = matched["_previous"].to_numpy(dtype=np.intp)
+    current_positions = matched["_current"].to_numpy(dtype=np.intp)
+    keys = current_keys.iloc[current_positions].reset_index(drop=True)
+
+    frames = []
+    for field in fields:
+        before = previous[field].iloc[previous_positions].reset_index(drop=True)
+        after = current[field].iloc[current_positions].reset_index(drop=True)
+        differs, numeric = _differs(before, after)
+        if not differs.any():
+            continue
+        rows = np.flatnonzero(differs)
+        frame = pd.DataFrame({
+            "key": keys.iloc[rows].to_numpy(),
+            "field": field,
+            "previous": before.iloc[rows].astype(object).to_numpy(),
+            "current": after.iloc[rows].astype(object).to_numpy(),
+            "delta": (after.iloc[rows].to_numpy(dtype="float64", na_value=np.nan)
+                      - before.iloc[rows].to_numpy(dtype="float64", na_value=np.nan)) if numeric else np.nan,
+            "_row": rows,
+        })
+        for name in identity:
+            if name in current.columns:
+                frame[name] = current[name].iloc[current_positions[rows]].astype(object).to_numpy()
+        frames.append(frame)
+
+    if frames:
+        changes = pd.concat(frames, ignore_index=True).sort_values("_row", kind="stable").drop(columns="_row")
+        changes = changes.reset_index(drop=True)
+    else:
+        changes = pd.DataFrame(columns=["key", "field", "previous", "current", "delta"] + identity)
+
+    unkeyed = len(current) - len(current_keyed)
+    report = ChangeReport(added, removed, changes, len(previous), len(current), unkeyed)
+    logging.info(f"Change report: {report.summary()}")
+    return report
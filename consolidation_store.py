@@ -0,0 +1,110 @@
+import os
+import json
+import uuid
+import logging
+import pandas as pd
+from survey_cache import CACHE_VERSION, file_hash
+
+DEFAULT_STORE_DIR = "store"
+MANIFEST_VERSION = 1
+SOURCE_COLUMN = "_source_file"
+
+
+class ConsolidationStore:
+    """
+    Intermediate store for incremental consolidation.
+
+    Keeps a manifest of merged inputs (path, size, mtime, hash, columns) and
+    the consolidated dataset, with each row tagged by its source file so the
+    rows of a changed or removed survey can be replaced without re-reading
+    the rest of the archive.
+    """
+
+    def __init__(self, store_dir=DEFAULT_STORE_DIR):
+        self.store_dir = store_dir
+        self.manifest_path = os.path.join(store_dir, "manifest.json")
+        self.parquet_path = os.path.join(store_dir, "consolidated.parquet")
+        self.pickle_path = os.path.join(store_dir, "consolidated.pkl")
+        os.makedirs(store_dir, exist_ok=True)
+
+    def load(self):
+        """
+        Returns (manifest, dataset). Both are empty if nothing has been stored
+        yet or the stored copy cannot be read.
+        """
+        empty = ({}, pd.DataFrame())
+        if not os.path.exists(self.manifest_path):
+            return empty
+        try:
+            with open(self.manifest_path, "r") as f:
+                manifest = json.load(f)
+            if manifest.get("version") != MANIFEST_VERSION or manifest.get("parser_version") != CACHE_VERSION:
+                logging.warning("Consolidation manifest or parser version changed, rebuilding.")
+                return empty
+            if os.path.exists(self.parquet_path):
+                dataset = pd.read_parquet(self.parquet_path)
+            elif os.path.exists(self.pickle_path):
+                dataset = pd.read_pickle(self.pickle_path)
+            else:
+                return empty
+            return manifest.get("files", {}), dataset
+        except Exception as e:
+            logging.warning(f"Failed to load consolidation store, rebuilding: {e}")
+            return empty
+
+    def save(self, manifest, dataset):
+        """
+        Persists the manifest and dataset. The dataset is written first so a
+        crash never leaves a manifest pointing at rows that were not saved.
+        Temporary files have unique names, so a concurrent writer never
+        replaces or removes another's.
+        """
+        tmp_parquet = self._tmp_path(self.parquet_path)
+        try:
+            dataset.to_parquet(tmp_parquet, index=False)
+            os.replace(tmp_parquet, self.parquet_path)
+            self._remove(self.pickle_path)
+        except Exception as e:
+            self._remove(tmp_parquet)
+            logging.info(f"Parquet store write failed ({e}), using pickle")
+            tmp_pickle = self._tmp_path(self.pickle_path)
+            try:
+                dataset.to_pickle(tmp_pickle)
+                os.replace(tmp_pickle, self.pickle_path)
+            finally:
+                self._remove(tmp_pickle)
+            self._remove(self.parquet_path)
+
+        tmp_manifest = self._tmp_path(self.manifest_path)
+        try:
+            with open(tmp_manifest, "w") as f:
+                json.dump({"version": MANIFEST_VERSION, "parser_version": CACHE_VERSION, "files": manifest},
+                          f, indent=2)
+            os.replace(tmp_manifest, self.manifest_path)
+        finally:
+            self._remove(tmp_manifest)
+
+    @staticmethod
+    def file_entry(file_path, known=None):
+        """
+        Builds a manifest entry for file_path. The content hash is only
+        recomputed when size or mtime differ from the known entry.
+        """
+        stat = os.stat(file_path)
+        entry = {"size": stat.st_size, "mtime": stat.st_mtime}
+        if known and known.get("size") == stat.st_size and known.get("mtime") == stat.st_mtime:
+            entry["hash"] = known["hash"]
+        else:
+            entry["hash"] = file_hash(file_path)
+        return entry
+
+    @staticmethod
+    def _tmp_path(path):
+        return f"{path}.{uuid.uuid4().hex}.tmp"
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
@@ -0,0 +1,183 @@
+import logging
+from difflib import SequenceMatcher
+import numpy as np
+import pandas as pd
+from survey_fields import STRING_DTYPE
+
+DEFAULT_SIMILARITY = 0.85
+
+# Fields whose value is taken from the freshest listing that has one
+RENT_FIELDS = [
+    "sf_available",
+    "monthly_asking_rent",
+    "monthly_operating_expenses",
+    "monthly_asking_gross",
+    "annual_asking_gross",
+    "asking_monthly_rent",
+    "asking_annual_rent",
+    "rent_type",
+    "tia",
+]
+
+STREET_ABBREVIATIONS = {
+    "street": "st", "avenue": "ave", "av": "ave", "road": "rd", "boulevard": "blvd", "drive": "dr",
+    "lane": "ln", "court": "ct", "place": "pl", "parkway": "pkwy", "highway": "hwy", "circle": "cir",
+    "terrace": "ter", "trail": "trl", "square": "sq", "suite": "ste", "north": "n", "south": "s",
+    "east": "e", "west": "w", "northeast": "ne", "northwest": "nw", "southeast": "se", "southwest": "sw",
+}
+_UNIT_PATTERN = r"\s*(?:\b(?:ste|suite|unit|apt|floor|bldg|room)\b|#)\s*#?\s*[\w-]+.*$"
+# Direction and ordinal tokens of a normalized street ("n", "nw", "4th")
+_QUALIFIER_PATTERN = r"\b(?:[nsew]|ne|nw|se|sw|\d+(?:st|nd|rd|th))\b"
+
+
+class MergeRules:
+    """
+    How duplicate listings are merged into one row.
+
+    :param freshness_column: Column ordering listings from oldest to newest
+                             (e.g. a survey date). Without it, later rows are
+                             treated as fresher, matching file order.
+    :param freshest_fields: Fields taken from the freshest listing that has a
+                            value. Every other field keeps the first non-empty
+                            value in original order.
+    """
+
+    def __init__(self, freshness_column=None, freshest_fields=None):
+        self.freshness_column = freshness_column
+        self.freshest_fields = list(RENT_FIELDS if freshest_fields is None else freshest_fields)
+
+
+def normalize_addresses(addresses):
+    """
+    Normalizes street addresses with vectorized string operations.
+
+    Returns a DataFrame with the normalized "street" (number plus street name,
+    suffixes and directions abbreviated, unit removed), its leading "number",
+    and the "unit" designator that was stripped, e.g.
+    "123 Main Street, Ste 200" -> ("123 main st", "123", "ste 200").
+    Each distinct address is only normalized once.
+    """
+    codes, uniques = pd.factorize(addresses)
+    # Arrow-backed strings keep every step in native code; regex extracts and
+    # callable replacements would fall back to Python for each address
+    text = pd.Series(uniques, dtype=STRING_DTYPE).str.lower()
+    text = text.str.replace(r"[.,;]", " ", regex=True).str.replace(r"\s+", " ", regex=True).str.strip()
+    # The unit pattern is anchored at the end, so the unit is the suffix it matches
+    unit = text.str.replace(f"^.*?({_UNIT_PATTERN})", r"\1", regex=True).str.strip()
+    unit = unit.where(text.str.contains(_UNIT_PATTERN, regex=True))
+    text = text.str.replace(_UNIT_PATTERN, "", regex=True)
+    for word, abbreviation in STREET_ABBREVIATIONS.items():
+        text = text.str.replace(rf"\b{word}\b", abbreviation, regex=True)
+    text = text.str.replace(r"\s+", " ", regex=True).str.strip()
+    number = text.str.replace(r"^(\d+).*$", r"\1", regex=True).where(text.str.contains(r"^\d", regex=True))
+    normalized = pd.DataFrame({"street": text.replace("", pd.NA), "number": number, "unit": unit})
+    # Missing addresses have code -1 and pick up the appended all-NA row
+    normalized = pd.concat([normalized, normalized.iloc[:0].reindex([len(normalized)])], ignore_index=True)
+    normalized = normalized.iloc[codes].set_axis(addresses.index)
+    return normalized
+
+
+def _block_keys(data, normalized):
+    # Block on ZIP (or city when ZIP is missing) plus street number; rows
+    # without a street number only match on the exact normalized street
+    area = pd.Series(pd.NA, index=data.index, dtype="string")
+    if "zip_code" in data.columns:
+        area = data["zip_code"].astype("string").str.extract(r"(\d{5})", expand=False)
+    if "city" in data.columns:
+        area = area.fillna(data["city"].astype("string").str.lower().str.strip())
+    area = area.fillna("")
+    # Direction and ordinal tokens must match exactly: "100 N Main St" and
+    # "100 S Main St", or "4101 Indian School Rd NE" and "... NW", are
+    # different buildings even though their streets score as near-identical
+    codes, uniques = pd.factorize(normalized["street"])
+    qualifiers = pd.Series(uniques, dtype=object).str.findall(_QUALIFIER_PATTERN).str.join(" ")
+    qualifiers = pd.Series(np.append(qualifiers.to_numpy(dtype=object), ""), dtype="string").iloc[codes]
+    qualifiers = qualifiers.set_axis(data.index)
+    return area + "|" + normalized["number"].fillna("=" + normalized["street"]) + "|" + qualifiers
+
+
+def _find(parent, i):
+    while parent[i] != i:
+        parent[i] = parent[parent[i]]
+        i = parent[i]
+    return i
+
+
+def find_duplicates(data, threshold=DEFAULT_SIMILARITY, address_column="address"):
+    """
+    Assigns a cluster id to every row; rows with the same id are the same building.
+
+    Rows are grouped into blocks by ZIP, street number and the street's
+    direction and ordinal tokens, and fuzzy similarity is only scored between rows of the same block, so the cost
+    grows with block size rather than with the square of the row count.
+    """
+    clusters = np.arange(len(data))
+    normalized = normalize_addresses(data[address_column])
+    has_address = normalized["street"].notna().to_numpy()
+    if not has_address.any():
+        return clusters
+
+    keys = _block_keys(data, normalized)[has_address]
+    streets = normalized["street"].to_numpy(dtype=object)[has_address]
+    positions = np.flatnonzero(has_address)
+    parent = list(range(len(data)))
+
+    codes, _ = pd.factorize(keys)
+    order = np.argsort(codes, kind="stable")
+    boundaries = np.flatnonzero(np.diff(codes[order])) + 1
+    for block in np.split(order, boundaries):
+        if len(block) < 2:
+            continue
+        members = positions[block]
+        values = streets[block].tolist()
+        for a in range(len(members)):
+            for b in range(a + 1, len(members)):
+                if _find(parent, members[a]) == _find(parent, members[b]):
+                    continue
+                if values[a] == values[b] or SequenceMatcher(None, values[a], values[b]).ratio() >= threshold:
+                    parent[_find(parent, members[b])] = _find(parent, members[a])
+
+    return np.array([_find(parent, i) for i in range(len(data))])
+
+
+def deduplicate_properties(data, threshold=DEFAULT_SIMILARITY, rules=None, address_column="address"):
+    """
+    Merges listings of the same building into one row per building.
+
+    Duplicates are found with find_duplicates, then merged per MergeRules:
+    rent fields come from the freshest listing that has them and other
+    fields keep the first non-empty value. Each building stays at the
+    position of its first listing.
+
+    :param data: The pandas DataFrame to deduplicate.
+    :param threshold: Minimum street-name similarity (0-1) to treat two
+                      listings in the same block as one building.
+    :param rules: MergeRules (default: freshest rent values by row order).
+    :return: A deduplicated pandas DataFrame.
+    """
+    if address_column not in data.columns:
+        logging.warning(f"'{address_column}' column not found, skipping deduplication.")
+        return data
+    rules = rules or MergeRules()
+
+    clusters = find_duplicates(data, threshold, address_column)
+    if len(np.unique(clusters)) == len(data):
+        return data
+
+    work = data.reset_index(drop=True)
+    work["_cluster"] = clusters
+    work["_row"] = np.arange(len(work))
+
+    fresh_fields = [field for field in rules.freshest_fields if field in work.columns]
+    other_fields = [column for column in data.columns if column not in fresh_fields]
+
+    merged = work.groupby("_cluster", sort=False)[other_fields + ["_row"]].first()
+    if fresh_fields:
+        by_freshness = [rules.freshness_column, "_row"] if rules.freshness_column in work.columns else ["_row"]
+        freshest = work.sort_values(by_freshness, ascending=False, kind="stable")
+        merged = merged.join(freshest.groupby("_cluster", sort=False)[fresh_fields].first())
+
+    merged = merged.sort_values("_row", kind="stable").reset_index(drop=True)
+    result = merged[list(data.columns)]
+    logging.info(f"Deduplicated {len(data)} listings into {len(result)} buildings")
+    return result
@@ -0,0 +1,154 @@
+import os
+import uuid
+import logging
+import pandas as pd
+import xlsxwriter
+
+# Excel's hard limit, including the header row
+EXCEL_MAX_ROWS = 1048576
+
+# Numeric fields summarized on the Summary sheet when present
+SUMMARY_FIELDS = ["total_building_sf", "sf_available", "monthly_asking_rent", "asking_monthly_rent",
+                  "asking_annual_rent"]
+
+
+class ExportSummary:
+    """
+    Accumulates summary statistics chunk by chunk while rows are written,
+    so the data is only passed over once.
+    """
+
+    def __init__(self, columns):
+        self.rows = 0
+        self.missing_address = 0
+        self.fields = [field for field in SUMMARY_FIELDS if field in columns]
+        self.count = dict.fromkeys(self.fields, 0)
+        self.total = dict.fromkeys(self.fields, 0.0)
+        self.minimum = dict.fromkeys(self.fields, None)
+        self.maximum = dict.fromkeys(self.fields, None)
+
+    def update(self, chunk):
+        self.rows += len(chunk)
+        if "address" in chunk.columns:
+            address = chunk["address"]
+            self.missing_address += int((address.isna() | (address.astype(str) == "Unknown")).sum())
+        for field in self.fields:
+            values = pd.to_numeric(chunk[field], errors="coerce").dropna()
+            if values.empty:
+                continue
+            self.count[field] += len(values)
+            self.total[field] += float(values.sum())
+            low, high = float(values.min()), float(values.max())
+            self.minimum[field] = low if self.minimum[field] is None else min(self.minimum[field], low)
+            self.maximum[field] = high if self.maximum[field] is None else max(self.maximum[field], high)
+
+    def as_rows(self):
+        rows = [
+            ("Total Rows Processed", self.rows),
+            ("Rows Missing Address", self.missing_address),
+        ]
+        for field in self.fields:
+            count = self.count[field]
+            rows.append((f"{field} (count)", count))
+            if count:
+                rows.append((f"{field} (mean)", round(self.total[field] / count, 4)))
+                rows.append((f"{field} (min)", self.minimum[field]))
+                rows.append((f"{field} (max)", self.maximum[field]))
+        return rows
+
+    def as_dict(self):
+        return {label: value for label, value in self.as_rows()}
+
+
+def _iter_chunks(data, chunk_size):
+    if isinstance(data, pd.DataFrame):
+        for start in range(0, len(data), chunk_size):
+            yield data.iloc[start:start + chunk_size]
+    else:
+        yield from data
+
+
+def _cell_values(chunk):
+    # xlsxwriter cannot write NaN/NA, so blanks become None
+    values = chunk.astype(object).to_numpy()
+    values[pd.isna(values)] = None
+    return values
+
+
+def export_excel(data, output_path, columns=None, sheet_name="Properties", max_rows_per_sheet=None,
+                 chunk_size=10000, summary=True):
+    """
+    Writes properties to Excel with xlsxwriter's constant_memory mode, row by
+    row, so memory stays flat regardless of the number of rows.
+
+    Rows beyond max_rows_per_sheet (default: Excel's row limit) continue on
+    new sheets named "<sheet_name> 2", "<sheet_name> 3", ... Summary
+    statistics are gathered while rows are written and saved to a
+    "Summary" sheet. The workbook is written to a temporary file and moved
+    into place, so readers and concurrent exports never see a partial file.
+
+    :param data: A DataFrame, or an iterable of DataFrame chunks.
+    :param output_path: The path to save the Excel file.
+    :param columns: Output columns. Required when data is an iterable of
+                    chunks; chunks are reindexed to these columns.
+    :param sheet_name: Base name of the data sheets.
+    :param max_rows_per_sheet: Data rows per sheet, excluding the header.
+    :param chunk_size: Rows converted at a time when data is a DataFrame.
+    :param summary: Whether to add the Summary sheet.
+    :return: dict of summary statistics.
+    """
+    if columns is None:
+        if not isinstance(data, pd.DataFrame):
+            raise ValueError("columns is required when exporting an iterable of chunks")
+        columns = list(data.columns)
+    columns = [str(column) for column in columns]
+    max_rows_per_sheet = min(max_rows_per_sheet or EXCEL_MAX_ROWS - 1, EXCEL_MAX_ROWS - 1)
+
+    tmp_path = os.path.join(os.path.dirname(output_path), f".{uuid.uuid4().hex}.xlsx.tmp")
+    workbook = xlsxwriter.Workbook(tmp_path, {
+        "constant_memory": True,
+        "default_date_format": "yyyy-mm-dd",
+        "nan_inf_to_errors": True,
+    })
+    header_format = workbook.add_format({"bold": True, "text_wrap": True, "valign": "vcenter"})
+    stats = ExportSummary(columns)
+    sheets = 0
+    worksheet = None
+    row_in_sheet = max_rows_per_sheet  # Forces a new sheet on the first row
+
+    try:
+        for chunk in _iter_chunks(data, chunk_size):
+            if list(chunk.columns) != columns:
+                chunk = chunk.reindex(columns=columns)
+            stats.update(chunk)
+            for values in _cell_values(chunk):
+                if row_in_sheet >= max_rows_per_sheet:
+                    sheets += 1
+                    worksheet = workbook.add_worksheet(sheet_name if sheets == 1 else f"{sheet_name} {sheets}")
+                    worksheet.set_column(0, len(columns) - 1, 20)
+                    worksheet.write_row(0, 0, columns, header_format)
+                    row_in_sheet = 0
+                row_in_sheet += 1
+                worksheet.write_row(row_in_sheet, 0, values)
+
+        if worksheet is None:
+            worksheet = workbook.add_worksheet(sheet_name)
+            worksheet.write_row(0, 0, columns, header_format)
+
+        if summary:
+            summary_sheet = workbook.add_worksheet("Summary")
+            summary_sheet.set_column(0, 0, 30)
+            summary_sheet.set_column(1, 1, 20)
+            summary_sheet.write_row(0, 0, ["Statistic", "Value"], header_format)
+            for i, row in enumerate(stats.as_rows(), start=1):
+                summary_sheet.write_row(i, 0, row)
+    except BaseException:
+        workbook.close()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    workbook.close()
+    os.replace(tmp_path, output_path)
+
+    logging.info(f"Excel file saved successfully: {output_path} ({stats.rows} rows, {max(sheets, 1)} sheets)")
+    return stats.as_dict()
@@ -0,0 +1,240 @@
+import logging
+from itertools import chain, groupby, islice
+import numpy as np
+import pandas as pd
+from openpyxl import load_workbook
+from openpyxl.cell.cell import ERROR_CODES
+from header_detection import header_detector, MIN_HEADER_MATCHES
+from survey_fields import FIELD_TYPES
+
+DEFAULT_CHUNK_SIZE = 5000
+
+
+def _convert_cell(value):
+    # Match pd.read_excel, which reads whole-number floats back as ints
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if isinstance(value, str) and (value == "" or value in ERROR_CODES):
+        return None
+    return value
+
+
+def infer_column_types(frame):
+    """
+    Converts blanks to NaN and infers dtypes, parsing numeric text columns
+    to numbers the same way pd.read_excel does.
+    """
+    frame = frame.where(frame.notna(), np.nan).infer_objects()
+    for column in frame.columns[frame.dtypes == object]:
+        try:
+            frame[column] = pd.to_numeric(frame[column])
+        except (ValueError, TypeError):
+            pass
+    return frame
+
+
+def _to_frame(records, columns, infer_types):
+    frame = pd.DataFrame(records, columns=columns, dtype=object)
+    return infer_column_types(frame) if infer_types else frame
+
+
+def header_names(header_row, width):
+    """
+    Builds column names the way pd.read_excel does: blank headers become
+    "Unnamed: <i>" and repeated names get a ".<n>" suffix.
+    """
+    names = []
+    seen = {}
+    for i in range(width):
+        value = header_row[i] if i < len(header_row) else None
+        blank = value is None or (isinstance(value, float) and value != value) or str(value).strip() == ""
+        name = f"Unnamed: {i}" if blank else str(value)
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        else:
+            seen[name] = 0
+        names.append(name)
+    return names
+
+
+def drop_empty_unnamed(data):
+    """
+    Drops columns that have no header and no values.
+    """
+    empty_unnamed = [column for column in data.columns
+                     if str(column).startswith("Unnamed: ") and data[column].isna().all()]
+    return data.drop(columns=empty_unnamed)
+
+
+def split_header(raw, header):
+    """
+    Turns a sheet read with header=None into a DataFrame whose columns come
+    from the given row, discarding the rows above it.
+    """
+    columns = header_names(raw.iloc[header].tolist(), raw.shape[1]) if header < len(raw) else []
+    data = raw.iloc[header + 1:].reset_index(drop=True)
+    data.columns = columns if columns else data.columns
+    return drop_empty_unnamed(infer_column_types(data.astype(object)))
+
+
+class WorkbookTable:
+    """
+    One table region found in a workbook: the sheet it is on, its 1-based
+    position among the tables of that sheet, its 0-indexed header row, the
+    detected HeaderLayout and the raw column names.
+    """
+
+    def __init__(self, sheet, index, header_row, layout, columns):
+        self.sheet = sheet
+        self.index = index
+        self.header_row = header_row
+        self.layout = layout
+        self.columns = columns
+
+    def __repr__(self):
+        return f"WorkbookTable(sheet={self.sheet!r}, index={self.index}, header_row={self.header_row})"
+
+
+def _is_blank_row(item):
+    return all(value is None or (isinstance(value, str) and not value.strip()) for value in item[1])
+
+
+def _filled_cells(row):
+    return sum(value is not None and not (isinstance(value, str) and not value.strip()) for value in row)
+
+
+def _fits_field(value, field):
+    kind = FIELD_TYPES.get(field)
+    if kind in ("int", "float"):
+        return not isinstance(value, str) or any(c.isdigit() for c in value)
+    # ZIP codes are text fields that are usually stored as numbers
+    return isinstance(value, str) or field == "zip_code"
+
+
+def _continues_table(table, rows):
+    """
+    Returns True if most rows fill at least half of the table's mapped
+    columns with values that fit those columns' field types, so a totals
+    or summary block below a table ("Total SF Available | 4600") is not
+    read as more listings.
+    """
+    fields = [(i, table.layout.column_map.get(name)) for i, name in enumerate(table.columns)]
+    fields = [(i, field) for i, field in fields if field]
+    if not fields:
+        return False
+    min_filled = max(MIN_HEADER_MATCHES, (len(fields) + 1) // 2)
+    fitting = 0
+    for row in rows:
+        cells = [(row[i], field) for i, field in fields if i < len(row) and _filled_cells([row[i]])]
+        if len(cells) >= min_filled and all(_fits_field(value, field) for value, field in cells):
+            fitting += 1
+    return fitting * 2 > len(rows)
+
+
+def _iter_table_chunks(rows, width, columns, chunk_size, infer_types):
+    chunk = []
+    for _, row in rows:
+        values = [_convert_cell(value) for value in row[:width]]
+        values.extend([None] * (width - len(values)))
+        chunk.append(values)
+        if len(chunk) >= chunk_size:
+            yield _to_frame(chunk, columns, infer_types)
+            chunk = []
+    if chunk:
+        yield _to_frame(chunk, columns, infer_types)
+
+
+def iter_workbook_tables(file_path, chunk_size=DEFAULT_CHUNK_SIZE, infer_types=True):
+    """
+    Streams every table of every sheet from one read-only open of a workbook.
+
+    Tables are regions of rows separated by blank rows. Each region's header
+    is found with the shared header detector; regions without a recognized
+    header (titles, notes, summary blocks) are skipped, except that a region
+    directly below a table continues that table when its rows match the
+    table's mapped columns in width and value types, and the first
+    multi-cell region of the workbook falls back to its first row as header,
+    like reading a single sheet does.
+
+    Yields (WorkbookTable, chunks) pairs, where chunks lazily yields
+    DataFrames of at most chunk_size rows. A table that continues after a
+    blank row is yielded again with the same WorkbookTable. Chunks must be
+    consumed before advancing to the next pair.
+
+    :param file_path: Path to the .xlsx file.
+    :param chunk_size: Maximum number of rows per DataFrame chunk.
+    :param infer_types: Infer column dtypes per chunk; otherwise columns stay object.
+    """
+    # A file object skips openpyxl's extension check, so workbooks uploaded under another name still open
+    handle = open(file_path, "rb")
+    try:
+        workbook = load_workbook(handle, read_only=True, data_only=True)
+    except Exception:
+        handle.close()
+        raise
+    try:
+        first_region = True
+        for worksheet in workbook.worksheets:
+            table = None
+            tables = 0
+            regions = groupby(enumerate(worksheet.iter_rows(values_only=True)), key=_is_blank_row)
+            for blank, region in regions:
+                if blank:
+                    continue
+                head = list(islice(region, header_detector.scan_rows))
+                layout = header_detector.detect([row for _, row in head])
+                if layout.score:
+                    header_row = head[layout.header_row][0]
+                    data_rows = chain(head[layout.header_row + 1:], region)
+                elif table is not None and _continues_table(table, [row for _, row in head]):
+                    data_rows = chain(head, region)
+                    yield table, _iter_table_chunks(data_rows, len(table.columns), table.columns, chunk_size,
+                                                    infer_types)
+                    first_region = False
+                    continue
+                elif first_region and _filled_cells(head[0][1]) >= MIN_HEADER_MATCHES:
+                    header_row = head[0][0]
+                    data_rows = chain(head[1:], region)
+                else:
+                    logging.info(f"Skipping rows {head[0][0] + 1}-{head[-1][0] + 1} of sheet "
+                                 f"'{worksheet.title}' in {file_path}: no header found")
+                    continue
+
+                first_region = False
+                header_values = [_convert_cell(value) for value in head[layout.header_row if layout.score else 0][1]]
+                while header_values and header_values[-1] is None:
+                    header_values.pop()
+                width = max(len(header_values), worksheet.max_column or 0)
+                tables += 1
+                table = WorkbookTable(worksheet.title, tables, header_row, layout, header_names(header_values, width))
+                logging.info(f"Found table {tables} on sheet '{worksheet.title}' of {file_path} "
+                             f"with header on row {header_row + 1}")
+                yield table, _iter_table_chunks(data_rows, width, table.columns, chunk_size, infer_types)
+    finally:
+        workbook.close()
+        handle.close()
+
+
+def read_workbook_tables(file_path, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Reads every table of a workbook through iter_workbook_tables.
+    Returns a list of (WorkbookTable, DataFrame) pairs, one per table, with
+    columns that have no header and no values dropped.
+    """
+    frames = {}
+    tables = []
+    for table, chunks in iter_workbook_tables(file_path, chunk_size=chunk_size, infer_types=False):
+        if table not in frames:
+            frames[table] = []
+            tables.append(table)
+        frames[table].extend(chunks)
+
+    results = []
+    for table in tables:
+        if not frames[table]:
+            continue
+        # Types are inferred once over the whole table so chunk boundaries don't change dtypes
+        data = pd.concat(frames[table], ignore_index=True) if len(frames[table]) > 1 else frames[table][0]
+        results.append((table, drop_empty_unnamed(infer_column_types(data))))
+    return results
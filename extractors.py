@@ -0,0 +1,441 @@
+import os
+import csv
+import struct
+import zipfile
+import logging
+import xml.etree.ElementTree as ET
+
+# Only the standard library is imported here, so the API can sniff uploads
+# without loading the pipeline; each reader imports its parser on first use.
+
+# Bytes read from the start of a file to recognize its format
+SNIFF_BYTES = 4096
+# Files whose estimated parse time reaches this many seconds are routed to
+# the expensive pool whatever their format
+EXPENSIVE_SECONDS = 5.0
+
+ZIP_MAGIC = b"PK\x03\x04"
+OLE_MAGIC = b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1"
+PDF_MAGIC = b"%PDF-"
+PNG_MAGIC = b"\x89PNG\r\n\x1a\n"
+JPEG_MAGIC = b"\xff\xd8\xff"
+# OLE2 sector ids at or above this mark the end of a chain (or free and reserved sectors)
+OLE_MAX_SECTOR = 0xFFFFFFFA
+# Directory sectors read at most when looking for an OLE2 stream name
+OLE_MAX_DIRECTORY_SECTORS = 64
+CSV_DELIMITERS = ",;\t|"
+# Control characters that never appear in text files
+CONTROL_BYTES = bytes(range(9)) + bytes(range(14, 32))
+CSV_SNIFF_LINES = 20
+
+W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+
+class Extractor:
+    """
+    Reads one file format into survey tables.
+
+    The format is recognized from the file's content, never from its name.
+    The cost hints are rough parse times used by the scheduler to keep
+    slow files (OCR, PDF layout analysis, very large files) in a pool of
+    their own and to start the longest files first.
+    """
+
+    def __init__(self, name, label, kind, extensions, sniff, read, stream=None, expensive=False,
+                 seconds_per_file=0.0, seconds_per_mb=0.0):
+        """
+        :param name: Format name, e.g. "xlsx".
+        :param label: Name shown to users, e.g. "Excel".
+        :param kind: Label of the file and row counters, e.g. "excel".
+        :param extensions: File extensions the format is uploaded with.
+        :param sniff: Callable(head bytes, container member names) -> True if the content is this format.
+        :param read: Callable(file_path, chunk_size) -> list of (WorkbookTable, DataFrame) pairs.
+        :param stream: Optional callable(file_path, chunk_size) yielding (WorkbookTable, chunks) pairs
+                       like excel_stream.iter_workbook_tables; formats without one are read whole.
+        :param expensive: Always parse in the expensive pool.
+        :param seconds_per_file: Estimated fixed parse time per file.
+        :param seconds_per_mb: Estimated parse time per megabyte.
+        """
+        self.name = name
+        self.label = label
+        self.kind = kind
+        self.extensions = tuple(extensions)
+        self.sniff = sniff
+        self.read = read
+        self.stream = stream
+        self.expensive = expensive
+        self.seconds_per_file = seconds_per_file
+        self.seconds_per_mb = seconds_per_mb
+
+    def __repr__(self):
+        return f"Extractor({self.name!r})"
+
+    def estimate(self, file_path):
+        """
+        Returns the estimated parse time of a file in seconds.
+        """
+        return self.seconds_per_file + self.seconds_per_mb * os.path.getsize(file_path) / 2 ** 20
+
+    def is_expensive(self, file_path):
+        return self.expensive or self.estimate(file_path) >= EXPENSIVE_SECONDS
+
+    def iter_tables(self, file_path, chunk_size):
+        """
+        Yields (WorkbookTable, chunks) pairs, streaming when the format has a
+        streaming reader and otherwise yielding each table as one chunk.
+        """
+        if self.stream is not None:
+            yield from self.stream(file_path, chunk_size)
+            return
+        for table, data in self.read(file_path, chunk_size):
+            yield table, iter([data])
+
+
+_registry = []
+
+
+def register(extractor):
+    """
+    Adds an extractor. Formats are sniffed in registration order and the
+    first match wins, so content-based text formats such as CSV go last.
+    """
+    _registry.append(extractor)
+    return extractor
+
+
+def extractors():
+    return list(_registry)
+
+
+def get_extractor(name):
+    return next((extractor for extractor in _registry if extractor.name == name), None)
+
+
+def accepted_extensions():
+    """
+    Returns the file extensions of every registered format.
+    """
+    return {extension for extractor in _registry for extension in extractor.extensions}
+
+
+def _zip_names(f):
+    try:
+        with zipfile.ZipFile(f) as archive:
+            return archive.namelist()
+    except (zipfile.BadZipFile, OSError, EOFError):
+        return []
+
+
+def _ole_names(f):
+    # Stream names from the directory of an OLE2 compound file (legacy Office formats)
+    try:
+        f.seek(0)
+        header = f.read(512)
+        sector_size = 1 << struct.unpack_from("<H", header, 0x1E)[0]
+        fat_sectors, directory = struct.unpack_from("<II", header, 0x2C)
+        fat = []
+        for sector in struct.unpack_from("<109I", header, 0x4C)[:min(fat_sectors, 109)]:
+            f.seek((sector + 1) * sector_size)
+            data = f.read(sector_size)
+            fat.extend(struct.unpack(f"<{len(data) // 4}I", data[:len(data) // 4 * 4]))
+
+        names = []
+        sector = directory
+        for _ in range(OLE_MAX_DIRECTORY_SECTORS):
+            if sector >= OLE_MAX_SECTOR:
+                break
+            f.seek((sector + 1) * sector_size)
+            data = f.read(sector_size)
+            for offset in range(0, len(data) - 127, 128):
+                length = struct.unpack_from("<H", data, offset + 0x40)[0]
+                if 2 <= length <= 64:
+                    names.append(data[offset:offset + length - 2].decode("utf-16-le", "ignore"))
+            sector = fat[sector] if sector < len(fat) else OLE_MAX_SECTOR
+        return names
+    except (struct.error, OSError):
+        return []
+
+
+def _sniff(f):
+    start = f.tell()
+    try:
+        head = f.read(SNIFF_BYTES)
+        names = []
+        if head.startswith(ZIP_MAGIC):
+            f.seek(start)
+            names = _zip_names(f)
+        elif head.startswith(OLE_MAGIC):
+            names = _ole_names(f)
+        for extractor in _registry:
+            if extractor.sniff(head, names):
+                return extractor
+        return None
+    finally:
+        f.seek(start)
+
+
+def detect(source):
+    """
+    Returns the extractor for a file's content, or None if no registered
+    format recognizes it.
+
+    :param source: Path, or a seekable binary file (e.g. an upload stream),
+                   which is left at its current position.
+    :raise OSError: If the file cannot be read.
+    """
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as f:
+            return _sniff(f)
+    return _sniff(source)
+
+
+def _decode(data):
+    # UTF-8 (with or without BOM), else Windows-1252 as written by Excel's CSV export;
+    # a multi-byte character cut off at the end of a sample is dropped
+    try:
+        return data.decode("utf-8-sig")
+    except UnicodeDecodeError as e:
+        if e.start >= len(data) - 3 and e.reason == "unexpected end of data":
+            return data[:e.start].decode("utf-8-sig")
+    return data.decode("cp1252", errors="replace")
+
+
+def _text_sample(head, limit):
+    # A sample read up to the limit may end mid-line, so its last line is left out
+    sample = _decode(head)
+    if len(head) == limit:
+        sample = sample[:max(sample.rfind("\n"), 0)]
+    return sample
+
+
+def _csv_dialect(sample):
+    lines = [line for line in sample.splitlines() if line.strip()][:CSV_SNIFF_LINES]
+    if not lines:
+        return None
+    try:
+        dialect = csv.Sniffer().sniff("\n".join(lines), delimiters=CSV_DELIMITERS)
+    except csv.Error:
+        return None
+    if not any(len(row) >= 2 for row in csv.reader(lines, dialect)):
+        return None
+    return dialect
+
+
+def _is_text(head):
+    return bool(head) and len(head.translate(None, CONTROL_BYTES)) == len(head)
+
+
+def _sniff_xlsx(head, names):
+    return "xl/workbook.xml" in names
+
+
+def _sniff_docx(head, names):
+    return "word/document.xml" in names
+
+
+def _sniff_xls(head, names):
+    return head.startswith(OLE_MAGIC) and ("Workbook" in names or "Book" in names)
+
+
+def _sniff_pdf(head, names):
+    # Some writers put a few bytes of junk before the header, which readers tolerate
+    return PDF_MAGIC in head[:1024]
+
+
+def _sniff_image(head, names):
+    return head.startswith(PNG_MAGIC) or head.startswith(JPEG_MAGIC)
+
+
+def _sniff_csv(head, names):
+    return _is_text(head) and _csv_dialect(_text_sample(head, SNIFF_BYTES)) is not None
+
+
+def _single_table(data):
+    # Formats without sheets or header rows are one table already keyed by canonical field
+    from excel_stream import WorkbookTable
+    from header_detection import HeaderLayout
+    return WorkbookTable(None, 1, None, HeaderLayout(None, [], {}, 0), list(data.columns)), data
+
+
+def table_from_rows(rows, sheet=None, index=1):
+    """
+    Builds a table from rows of cell values, detecting its header row the
+    same way workbook tables are. Blank rows are dropped.
+
+    :return: (WorkbookTable, DataFrame), or None if every row is blank.
+    """
+    import pandas as pd
+    from excel_stream import WorkbookTable, split_header
+    from header_detection import header_detector
+
+    rows = [[None if value is None or (isinstance(value, str) and not value.strip()) else value for value in row]
+            for row in rows]
+    rows = [row for row in rows if any(value is not None for value in row)]
+    if not rows:
+        return None
+    layout = header_detector.detect(rows)
+    width = max(len(row) for row in rows)
+    raw = pd.DataFrame([row + [None] * (width - len(row)) for row in rows], dtype=object)
+    data = split_header(raw, layout.header_row)
+    return WorkbookTable(sheet, index, layout.header_row, layout, list(data.columns)), data
+
+
+def read_xlsx(file_path, chunk_size):
+    from excel_stream import read_workbook_tables
+    return read_workbook_tables(file_path, chunk_size=chunk_size)
+
+
+def stream_xlsx(file_path, chunk_size):
+    from excel_stream import iter_workbook_tables
+    return iter_workbook_tables(file_path, chunk_size=chunk_size)
+
+
+def read_xls(file_path, chunk_size):
+    """
+    Reads every sheet of a legacy .xls workbook (needs xlrd). Each sheet is
+    one table.
+    """
+    import pandas as pd
+    sheets = pd.read_excel(file_path, sheet_name=None, header=None, engine="xlrd", dtype=object)
+    tables = []
+    for sheet, raw in sheets.items():
+        rows = raw.astype(object).where(raw.notna(), None).values.tolist()
+        table = table_from_rows(rows, sheet=sheet)
+        if table is not None:
+            tables.append(table)
+    return tables
+
+
+def read_csv(file_path, chunk_size):
+    """
+    Reads a delimited text file as one table; the delimiter and quoting are
+    sniffed and the encoding is UTF-8 or Windows-1252.
+    """
+    with open(file_path, "rb") as f:
+        head = f.read(SNIFF_BYTES * 4)
+    dialect = _csv_dialect(_text_sample(head, SNIFF_BYTES * 4)) or csv.excel
+    try:
+        with open(file_path, "r", encoding="utf-8-sig", newline="") as f:
+            rows = list(csv.reader(f, dialect))
+    except UnicodeDecodeError:
+        with open(file_path, "r", encoding="cp1252", errors="replace", newline="") as f:
+            rows = list(csv.reader(f, dialect))
+    table = table_from_rows(rows)
+    return [table] if table is not None else []
+
+
+def _docx_cell_text(cell):
+    paragraphs = []
+    for paragraph in cell.iter(f"{W}p"):
+        parts = []
+        for node in paragraph.iter():
+            if node.tag == f"{W}t":
+                parts.append(node.text or "")
+            elif node.tag == f"{W}tab":
+                parts.append("\t")
+            elif node.tag in (f"{W}br", f"{W}cr"):
+                parts.append("\n")
+        paragraphs.append("".join(parts))
+    return "\n".join(paragraphs).strip()
+
+
+def iter_docx_tables(file_path):
+    """
+    Yields the rows of every top-level table of a .docx document, as lists
+    of cell text, reading the document XML incrementally. Cells spanning
+    several columns or continuing a vertical merge are followed by or read
+    as empty cells, the way merged workbook cells are. Nested tables are
+    read as the text of the cell that holds them.
+    """
+    with zipfile.ZipFile(file_path) as archive, archive.open("word/document.xml") as f:
+        depth = 0
+        rows = row = None
+        for event, node in ET.iterparse(f, events=("start", "end")):
+            if node.tag == f"{W}tbl":
+                if event == "start":
+                    depth += 1
+                    if depth == 1:
+                        rows = []
+                else:
+                    depth -= 1
+                    if depth == 0:
+                        yield rows
+                        node.clear()
+            elif depth != 1:
+                continue
+            elif node.tag == f"{W}tr":
+                if event == "start":
+                    row = []
+                else:
+                    rows.append(row)
+            elif node.tag == f"{W}tc" and event == "end":
+                properties = node.find(f"{W}tcPr")
+                span, merged = 1, False
+                if properties is not None:
+                    grid_span = properties.find(f"{W}gridSpan")
+                    if grid_span is not None:
+                        span = int(grid_span.get(f"{W}val", "1"))
+                    vertical_merge = properties.find(f"{W}vMerge")
+                    merged = vertical_merge is not None and vertical_merge.get(f"{W}val", "continue") != "restart"
+                row.append(None if merged else _docx_cell_text(node))
+                row.extend([None] * (span - 1))
+                node.clear()
+
+
+def read_docx(file_path, chunk_size):
+    """
+    Reads every table of a Word document; each table's header row is
+    detected like a workbook table's.
+    """
+    tables = []
+    for rows in iter_docx_tables(file_path):
+        table = table_from_rows(rows, index=len(tables) + 1)
+        if table is not None:
+            tables.append(table)
+    if not tables:
+        logging.warning(f"No tables found in {file_path}")
+    return tables
+
+
+def read_pdf(file_path, chunk_size):
+    """
+    Extracts a PDF's labelled fields, one row per page. Pages are split
+    across processes only when the file is read in-process; a file read in
+    a pool worker already has a process of its own.
+    """
+    import multiprocessing
+    from pdf_extraction import extract_pdf
+    workers = 1 if multiprocessing.parent_process() is not None else None
+    data, _ = extract_pdf(file_path, workers)
+    return [_single_table(data)]
+
+
+def read_image(file_path, chunk_size):
+    """
+    OCRs an image and parses its labelled fields into one row.
+    """
+    import pandas as pd
+    from ocr_extraction import ocr_image
+    from pdf_extraction import PDF_SKIP_FIELDS, parse_fields
+    from survey_fields import CANONICAL_FIELDS
+    row = parse_fields(ocr_image(file_path))
+    if not row:
+        logging.warning(f"No fields recognized in image: {file_path}")
+        return []
+    columns = [field for field in CANONICAL_FIELDS if field not in PDF_SKIP_FIELDS]
+    return [_single_table(pd.DataFrame([row], columns=columns))]
+
+
+# Cost hints are rough single-core parse times on synthetic surveys; the xls
+# and OCR figures are estimates. Compressed formats cost more per stored MB.
+XLSX = register(Extractor("xlsx", "Excel", "excel", ["xlsx"], _sniff_xlsx, read_xlsx, stream=stream_xlsx,
+                          seconds_per_file=0.01, seconds_per_mb=3.0))
+XLS = register(Extractor("xls", "Excel", "excel", ["xls"], _sniff_xls, read_xls,
+                         seconds_per_file=0.01, seconds_per_mb=1.0))
+DOCX = register(Extractor("docx", "Word", "word", ["docx"], _sniff_docx, read_docx,
+                          seconds_per_file=0.01, seconds_per_mb=5.0))
+PDF = register(Extractor("pdf", "PDF", "pdf", ["pdf"], _sniff_pdf, read_pdf, expensive=True,
+                         seconds_per_file=0.05, seconds_per_mb=20.0))
+IMAGE = register(Extractor("image", "Image", "image", ["jpeg", "jpg", "png"], _sniff_image, read_image,
+                           expensive=True, seconds_per_file=2.0, seconds_per_mb=0.5))
+CSV = register(Extractor("csv", "CSV", "csv", ["csv"], _sniff_csv, read_csv, seconds_per_mb=0.3))
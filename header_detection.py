@@ -0,0 +1,165 @@
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from survey_fields import ALIAS_MAP, normalize_label
+
+DEFAULT_SCAN_ROWS = 20
+MIN_HEADER_MATCHES = 2
+MAX_LAYOUTS = 256
+
+
+class HeaderLayout:
+    """
+    Result of header detection for one sheet layout: the 0-indexed header
+    row, the raw header values of that row, and the raw -> canonical column map.
+    """
+
+    def __init__(self, header_row, raw_headers, column_map, score):
+        self.header_row = header_row
+        self.raw_headers = raw_headers
+        self.column_map = column_map
+        self.score = score
+
+    def __repr__(self):
+        return f"HeaderLayout(header_row={self.header_row}, mapped={len(self.column_map)}, score={self.score})"
+
+
+def _cell_kind(value):
+    if value is None or (isinstance(value, float) and value != value):
+        return "_"
+    if isinstance(value, str):
+        return "s" if value.strip() else "_"
+    return "n"
+
+
+def _shape(row):
+    return "".join(_cell_kind(value) for value in row).rstrip("_").encode() + b"|"
+
+
+def _header_text(row):
+    return "\x1f".join(normalize_label(value) if _cell_kind(value) == "s" else "" for value in row).encode()
+
+
+def iter_fingerprints(rows):
+    """
+    Yields (row index, fingerprint) for every row of a sheet taken as its
+    header: the shape of the rows above it (which cells are blank, text or
+    numeric) plus the row's normalized header text. Data rows below the
+    header are left out, so surveys exported from the same broker template
+    share a fingerprint even when their listings differ.
+    """
+    above = hashlib.sha1()
+    for i, row in enumerate(rows):
+        digest = above.copy()
+        digest.update(b"#" + _header_text(row))
+        yield i, digest.hexdigest()
+        above.update(_shape(row))
+
+
+def layout_fingerprint(rows, header_row):
+    """
+    Returns the fingerprint of rows with header_row as the header (see iter_fingerprints).
+    """
+    for i, fingerprint in iter_fingerprints(rows[:header_row + 1]):
+        if i == header_row:
+            return fingerprint
+    return None
+
+
+def score_row(row, alias_map=ALIAS_MAP):
+    """
+    Returns (score, column_map) for a candidate header row, where score is the
+    number of distinct canonical fields the row's cells map to.
+    """
+    column_map = {}
+    for value in row:
+        if _cell_kind(value) != "s":
+            continue
+        field = alias_map.get(normalize_label(value))
+        if field and field not in column_map.values():
+            column_map[str(value)] = field
+    return len(column_map), column_map
+
+
+def detect_header(rows, alias_map=ALIAS_MAP, min_matches=MIN_HEADER_MATCHES):
+    """
+    Picks the header row among rows by scoring each one against the canonical
+    field vocabulary. Falls back to row 0 with no mapping when no row matches
+    at least min_matches fields.
+    """
+    best = HeaderLayout(0, list(rows[0]) if rows else [], {}, 0)
+    for i, row in enumerate(rows):
+        score, column_map = score_row(row, alias_map)
+        if score > best.score:
+            best = HeaderLayout(i, list(row), column_map, score)
+    if best.score < min_matches:
+        return HeaderLayout(0, list(rows[0]) if rows else [], {}, 0)
+    return best
+
+
+class HeaderDetector:
+    """
+    Memoizes header detection per layout fingerprint, so repeat uploads that
+    use the same template skip scoring even when their listings differ. A
+    memoized layout is only reused if the cached header row still holds the
+    same raw headers.
+    """
+
+    def __init__(self, scan_rows=DEFAULT_SCAN_ROWS, max_layouts=MAX_LAYOUTS):
+        self.scan_rows = scan_rows
+        self.max_layouts = max_layouts
+        self._layouts = OrderedDict()
+        self._lock = threading.Lock()
+
+    def detect(self, rows):
+        """
+        Returns the HeaderLayout for the first scan_rows rows of a sheet.
+        """
+        rows = [self._normalize_row(row) for row in list(rows)[:self.scan_rows]]
+        # Rows without a recognized header (titles, notes) are remembered by
+        # their exact content: their row 0 says nothing about where another
+        # sheet's header is
+        content_key = "content:" + hashlib.sha1(repr(rows).encode()).hexdigest()
+        with self._lock:
+            for i, fingerprint in iter_fingerprints(rows):
+                layout = self._layouts.get(fingerprint)
+                if layout is not None and layout.header_row == i and rows[i] == layout.raw_headers:
+                    self._layouts.move_to_end(fingerprint)
+                    return layout
+            layout = self._layouts.get(content_key)
+            if layout is not None:
+                self._layouts.move_to_end(content_key)
+                return layout
+
+        layout = detect_header(rows)
+        if layout.header_row:
+            logging.info(f"Detected header on row {layout.header_row} ({layout.score} known fields)")
+        key = layout_fingerprint(rows, layout.header_row) if layout.column_map else content_key
+        with self._lock:
+            self._layouts[key] = layout
+            while len(self._layouts) > self.max_layouts:
+                self._layouts.popitem(last=False)
+        return layout
+
+    @staticmethod
+    def _normalize_row(row):
+        # Blank cells become None and trailing blanks are dropped, so rows read
+        # through pandas and through openpyxl compare equal
+        row = [None if _cell_kind(value) == "_" else value for value in row]
+        while row and row[-1] is None:
+            row.pop()
+        return row
+
+
+def apply_layout(data, layout):
+    """
+    Renames a DataFrame's raw header columns to their canonical field names.
+    """
+    if not layout.column_map:
+        return data
+    return data.rename(columns=layout.column_map)
+
+
+# Shared detector so layouts are remembered across calls in this process
+header_detector = HeaderDetector()
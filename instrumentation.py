@@ -0,0 +1,384 @@
+import os
+import json
+import time
+import uuid
+import atexit
+import cProfile
+import logging
+import threading
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+
+# Histogram buckets in seconds, from quick cache hits to long OCR jobs
+DEFAULT_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+METRIC_PREFIX = "cre_"
+# How often a shared registry writes its values for the other processes
+FLUSH_SECONDS = 1.0
+
+METRIC_HELP = {
+    "stage_seconds": "Time spent in each pipeline stage.",
+    "job_seconds": "Time taken by processing jobs.",
+    "jobs": "Processing jobs finished, by status.",
+    "http_request_seconds": "Time taken to handle HTTP requests.",
+    "http_requests": "HTTP requests handled, by endpoint and status.",
+    "files": "Survey files read, by kind.",
+    "bytes": "Bytes of survey files read, by kind.",
+    "rows": "Property rows parsed, by source.",
+    "pdf_pages": "PDF pages extracted.",
+    "cache_hits": "Cache lookups that found a result, by cache.",
+    "cache_misses": "Cache lookups that did not find a result, by cache.",
+    "rows_exported": "Property rows written to the consolidated output.",
+    "rows_changed": "Properties whose fields changed since the previous consolidation.",
+}
+
+PROFILE_MODES = ("cprofile", "tracemalloc")
+
+
+def _label_text(labels):
+    if not labels:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for value in labels.values())
+    return "{" + ",".join(f'{key}="{value}"' for key, value in zip(labels, escaped)) + "}"
+
+
+class MetricsRegistry:
+    """
+    Counters and histograms rendered in the Prometheus text format.
+
+    By default each process keeps its own registry. After share(), every
+    process also writes its values to a file in a shared directory and
+    render() sums the files of all processes, so several server processes
+    (e.g. gunicorn workers) expose one consistent set of metrics.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+        self.directory = None
+        self.flush_seconds = FLUSH_SECONDS
+        self._path = None
+        self._dirty = False
+        self._flusher_pid = None
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        # A forked child (e.g. a pool worker) starts empty: its parent already
+        # reports what was counted before the fork
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+        self._path = None
+        self._dirty = False
+
+    def share(self, directory, flush_seconds=FLUSH_SECONDS):
+        """
+        Shares this registry's values with the other processes using `directory`.
+
+        Values reach the other processes within flush_seconds. The files of
+        exited processes are kept so counters never go backwards; clear the
+        directory only together with the Prometheus history.
+        """
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.flush_seconds = flush_seconds
+        self._start_flusher()
+
+    def _start_flusher(self):
+        # A forked child has no flusher thread and writes a file of its own
+        if self.directory is None or self._flusher_pid == os.getpid():
+            return
+        with self._lock:
+            if self._flusher_pid == os.getpid():
+                return
+            self._flusher_pid = os.getpid()
+            self._path = os.path.join(self.directory, f"metrics_{os.getpid()}_{uuid.uuid4().hex}.json")
+            self._dirty = True
+        threading.Thread(target=self._flush_loop, name="metrics-flush", daemon=True).start()
+        atexit.register(self.flush)
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_seconds)
+            try:
+                self.flush()
+            except Exception as e:
+                logging.error(f"Failed to write shared metrics: {e}", exc_info=True)
+
+    def flush(self):
+        """
+        Writes this process's values to its file in the shared directory.
+        """
+        with self._lock:
+            if self._path is None or not self._dirty:
+                return
+            state = {
+                "counters": {name: [[dict(key), value] for key, value in series.items()]
+                             for name, series in self._counters.items()},
+                "histograms": {name: [[dict(key), *entry] for key, entry in series.items()]
+                               for name, series in self._histograms.items()},
+            }
+            path, self._dirty = self._path, False
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def _key(labels):
+        return tuple(sorted((labels or {}).items()))
+
+    def inc(self, name, value=1, labels=None):
+        key = self._key(labels)
+        self._start_flusher()
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+            self._dirty = True
+
+    def observe(self, name, value, labels=None):
+        key = self._key(labels)
+        self._start_flusher()
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            counts, total, count = series.get(key, ([0] * len(self.buckets), 0.0, 0))
+            counts = [c + (value <= bound) for c, bound in zip(counts, self.buckets)]
+            series[key] = (counts, total + value, count + 1)
+            self._dirty = True
+
+    def value(self, name, labels=None):
+        """
+        Returns a counter's current value in this process (0 if it was never incremented).
+        """
+        with self._lock:
+            return self._counters.get(name, {}).get(self._key(labels), 0)
+
+    def _collect(self):
+        # This process's values plus, when shared, those the other processes wrote
+        with self._lock:
+            counters = {name: dict(series) for name, series in self._counters.items()}
+            histograms = {name: dict(series) for name, series in self._histograms.items()}
+            own_path = self._path
+        if self.directory is None:
+            return counters, histograms
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith(".json") or entry.path == own_path:
+                continue
+            try:
+                with open(entry.path, encoding="utf-8") as f:
+                    state = json.load(f)
+            except (OSError, ValueError) as e:
+                logging.warning(f"Skipping unreadable metrics file {entry.path}: {e}")
+                continue
+            for name, series in state.get("counters", {}).items():
+                merged = counters.setdefault(name, {})
+                for labels, value in series:
+                    key = self._key(labels)
+                    merged[key] = merged.get(key, 0) + value
+            for name, series in state.get("histograms", {}).items():
+                merged = histograms.setdefault(name, {})
+                for labels, counts, total, count in series:
+                    key = self._key(labels)
+                    if key in merged:
+                        previous_counts, previous_total, previous_count = merged[key]
+                        counts = [a + b for a, b in zip(previous_counts, counts)]
+                        total, count = previous_total + total, previous_count + count
+                    merged[key] = (counts, total, count)
+        return counters, histograms
+
+    def render(self):
+        """
+        Returns all metrics in the Prometheus text exposition format.
+        """
+        counters, histograms = self._collect()
+        lines = []
+        for name, series in sorted(counters.items()):
+            full_name = f"{METRIC_PREFIX}{name}_total"
+            lines.append(f"# HELP {full_name} {METRIC_HELP.get(name, name)}")
+            lines.append(f"# TYPE {full_name} counter")
+            for key, value in sorted(series.items()):
+                lines.append(f"{full_name}{_label_text(dict(key))} {value}")
+        for name, series in sorted(histograms.items()):
+            full_name = f"{METRIC_PREFIX}{name}"
+            lines.append(f"# HELP {full_name} {METRIC_HELP.get(name, name)}")
+            lines.append(f"# TYPE {full_name} histogram")
+            for key, (counts, total, count) in sorted(series.items()):
+                labels = dict(key)
+                # Bucket counts are cumulative by construction: every bound a value fits under counts it
+                for bound, bucket_count in zip(self.buckets, counts):
+                    lines.append(f"{full_name}_bucket{_label_text({**labels, 'le': bound})} {bucket_count}")
+                lines.append(f"{full_name}_bucket{_label_text({**labels, 'le': '+Inf'})} {count}")
+                lines.append(f"{full_name}_sum{_label_text(labels)} {round(total, 6)}")
+                lines.append(f"{full_name}_count{_label_text(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+
+# Shared registry for this process
+metrics = MetricsRegistry()
+
+_local = threading.local()
+
+
+class JobMetrics:
+    """
+    Stage timings and counters of one job, collected from every stage and
+    count call made on the job's thread while it runs.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.seconds = None
+        self.stages = {}
+        self.counters = {}
+        self.profile_path = None
+
+    def add_stage(self, stage, seconds):
+        self.stages[stage] = round(self.stages.get(stage, 0) + seconds, 4)
+
+    def add(self, name, value=1):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def as_dict(self):
+        result = {"seconds": self.seconds, "stages": self.stages, "counters": self.counters}
+        if self.profile_path:
+            result["profile"] = self.profile_path
+        return result
+
+
+def current_job():
+    """
+    Returns the JobMetrics of the job running on this thread, or None.
+    """
+    return getattr(_local, "job", None)
+
+
+def count(name, value=1, **labels):
+    """
+    Increments counter `name` in the shared registry and in the current job.
+    In the job record, labels are folded into the name, e.g.
+    count("files", kind="pdf") is recorded as "files_pdf".
+    Inside capture_counts() the call is only collected.
+    """
+    captured = getattr(_local, "captured", None)
+    if captured is not None:
+        captured.append((name, value, labels))
+        return
+    metrics.inc(name, value, labels)
+    job = current_job()
+    if job is not None:
+        job.add("_".join([name, *map(str, labels.values())]), value)
+
+
+@contextmanager
+def capture_counts():
+    """
+    Collects the count() calls made on this thread instead of recording
+    them, and yields the list of (name, value, labels) they made. Pool
+    workers return it so the parent records their counts with
+    record_counts(), in its registry and in the job that scheduled them.
+    """
+    previous, _local.captured = getattr(_local, "captured", None), []
+    try:
+        yield _local.captured
+    finally:
+        _local.captured = previous
+
+
+def record_counts(counts):
+    """
+    Records counts collected by capture_counts().
+    """
+    for name, value, labels in counts:
+        count(name, value, **labels)
+
+
+@contextmanager
+def stage(name):
+    """
+    Times a pipeline stage into the stage_seconds histogram and the current job.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        metrics.observe("stage_seconds", elapsed, {"stage": name})
+        job = current_job()
+        if job is not None:
+            job.add_stage(name, elapsed)
+
+
+def _write_profile(profiler, snapshot, job, profile_dir):
+    os.makedirs(profile_dir, exist_ok=True)
+    base = os.path.join(profile_dir, f"{job.name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{threading.get_ident()}")
+    if profiler is not None:
+        path = base + ".prof"
+        profiler.dump_stats(path)
+    else:
+        path = base + ".txt"
+        with open(path, "w", encoding="utf-8") as f:
+            for stat in snapshot.statistics("lineno")[:50]:
+                f.write(f"{stat}\n")
+    return path
+
+
+@contextmanager
+def track_job(name, profile=None, slow_seconds=None, profile_dir="profiles"):
+    """
+    Collects the metrics of one job run on this thread and yields its
+    JobMetrics.
+
+    :param name: Job kind, used for metric labels and profile file names.
+    :param profile: "cprofile" or "tracemalloc" to profile the job; None disables profiling.
+    :param slow_seconds: Only keep profiles of jobs at least this slow (default: keep all).
+    :param profile_dir: Directory the profiles are written to. cProfile
+                        dumps open with pstats or snakeviz; tracemalloc
+                        dumps list the top allocation sites.
+    """
+    if profile and profile not in PROFILE_MODES:
+        raise ValueError(f"Unknown profile mode: {profile}")
+    job = JobMetrics(name)
+    previous, _local.job = current_job(), job
+    profiler = None
+    # tracemalloc is process-wide, so only the job that started it stops it
+    owns_tracemalloc = profile == "tracemalloc" and not tracemalloc.is_tracing()
+    if profile == "cprofile":
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError as e:
+            # Newer Pythons allow one active profiler per process
+            logging.warning(f"Not profiling {name} job: {e}")
+            profiler = None
+    elif owns_tracemalloc:
+        tracemalloc.start()
+
+    status = "done"
+    started = time.perf_counter()
+    try:
+        yield job
+    except Exception:
+        status = "failed"
+        raise
+    finally:
+        job.seconds = round(time.perf_counter() - started, 4)
+        snapshot = None
+        if profiler is not None:
+            profiler.disable()
+        elif owns_tracemalloc:
+            snapshot = tracemalloc.take_snapshot()
+            tracemalloc.stop()
+        _local.job = previous
+
+        metrics.observe("job_seconds", job.seconds, {"job": name})
+        metrics.inc("jobs", 1, {"job": name, "status": status})
+        if (profiler is not None or snapshot is not None) and job.seconds >= (slow_seconds or 0):
+            try:
+                job.profile_path = _write_profile(profiler, snapshot, job, profile_dir)
+                logging.info(f"Saved {profile} profile of {job.seconds}s {name} job to {job.profile_path}")
+            except Exception as e:
+                logging.error(f"Failed to save profile: {e}", exc_info=True)
+        logging.info(f"{name} job metrics: {job.as_dict()}")
@@ -0,0 +1,242 @@
+import os
+import json
+import time
+import uuid
+import socket
+import sqlite3
+import logging
+import threading
+from contextlib import closing
+
+DEFAULT_DB_PATH = os.path.join("jobs", "jobs.db")
+DEFAULT_WORKERS = 2
+POLL_INTERVAL = 1.0
+# A running job's lease is renewed every HEARTBEAT_INTERVAL seconds while its
+# worker is alive; a job whose lease has expired is requeued
+LEASE_SECONDS = 60
+HEARTBEAT_INTERVAL = 15
+# Workers look for expired leases this often
+REQUEUE_INTERVAL = 30
+# Running jobs without a lease (claimed before leases existed) are requeued after this long
+STALE_AFTER = 60 * 60
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class JobQueue:
+    """
+    Persistent job queue backed by SQLite, with a local pool of worker threads.
+
+    Jobs survive restarts, and several processes (e.g. gunicorn workers) can
+    share one database: a job is claimed inside an IMMEDIATE transaction so
+    only one worker ever runs it. A claimed job records its owner and a
+    lease that a heartbeat thread renews while the job runs; workers requeue
+    jobs whose lease expired, so a job survives the death of its process
+    without ever running twice at once.
+    """
+
+    def __init__(self, handler, db_path=DEFAULT_DB_PATH, workers=DEFAULT_WORKERS):
+        """
+        :param handler: Callable taking a job payload dict and returning a JSON-serializable result.
+        :param db_path: Path to the SQLite database file.
+        :param workers: Number of worker threads to start in this process.
+        """
+        self.handler = handler
+        self.db_path = db_path
+        self.workers = workers
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._running = set()
+        self._running_lock = threading.Lock()
+        self._last_requeue = 0
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._threads = []
+        if os.path.dirname(db_path):
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    result TEXT,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    started_at REAL,
+                    finished_at REAL
+                )
+            """)
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+            for column, column_type in (("owner", "TEXT"), ("lease_until", "REAL")):
+                if column not in columns:
+                    conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {column_type}")
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at)")
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def enqueue(self, payload):
+        """
+        Adds a job and returns its id.
+        """
+        job_id = uuid.uuid4().hex
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, status, payload, created_at) VALUES (?, ?, ?, ?)",
+                (job_id, QUEUED, json.dumps(payload), time.time()),
+            )
+        self._wakeup.set()
+        logging.info(f"Enqueued job {job_id}")
+        return job_id
+
+    def get(self, job_id):
+        """
+        Returns the job as a dict, or None if it does not exist.
+        """
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def _claim(self):
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT id, payload FROM jobs WHERE status = ? ORDER BY created_at LIMIT 1", (QUEUED,)
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            now = time.time()
+            conn.execute("UPDATE jobs SET status = ?, started_at = ?, owner = ?, lease_until = ? WHERE id = ?",
+                         (RUNNING, now, self.owner, now + LEASE_SECONDS, row["id"]))
+            conn.execute("COMMIT")
+            with self._running_lock:
+                self._running.add(row["id"])
+            return row["id"], json.loads(row["payload"])
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def _finish(self, job_id, status, result=None, error=None):
+        with self._running_lock:
+            self._running.discard(job_id)
+        with closing(self._connect()) as conn:
+            updated = conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ?, lease_until = NULL "
+                "WHERE id = ? AND status = ? AND owner = ?",
+                (status, json.dumps(result) if result is not None else None, error, time.time(), job_id,
+                 RUNNING, self.owner),
+            ).rowcount
+        if not updated:
+            logging.warning(f"Job {job_id} lost its lease before finishing; its result was discarded")
+
+    def heartbeat(self):
+        """
+        Renews the leases of the jobs this queue is running.
+        Returns the number of leases renewed.
+        """
+        with self._running_lock:
+            running = list(self._running)
+        if not running:
+            return 0
+        with closing(self._connect()) as conn:
+            return conn.execute(
+                f"UPDATE jobs SET lease_until = ? WHERE status = ? AND owner = ? "
+                f"AND id IN ({', '.join('?' * len(running))})",
+                (time.time() + LEASE_SECONDS, RUNNING, self.owner, *running),
+            ).rowcount
+
+    def _heartbeat_loop(self):
+        while not self._stop.wait(HEARTBEAT_INTERVAL):
+            try:
+                self.heartbeat()
+            except Exception as e:
+                logging.error(f"Job heartbeat failed: {e}", exc_info=True)
+
+    def requeue_stale(self, stale_after=STALE_AFTER):
+        """
+        Puts running jobs whose lease has expired back in the queue, as well
+        as jobs claimed without a lease more than stale_after seconds ago.
+        """
+        now = time.time()
+        with closing(self._connect()) as conn:
+            count = conn.execute(
+                "UPDATE jobs SET status = ?, started_at = NULL, owner = NULL, lease_until = NULL "
+                "WHERE status = ? AND (lease_until < ? OR (lease_until IS NULL AND started_at < ?))",
+                (QUEUED, RUNNING, now, now - stale_after),
+            ).rowcount
+        self._last_requeue = now
+        if count:
+            logging.warning(f"Requeued {count} jobs whose worker stopped responding")
+        return count
+
+    def run_next(self):
+        """
+        Claims and runs one queued job. Returns False if the queue was empty.
+        """
+        claimed = self._claim()
+        if claimed is None:
+            return False
+        job_id, payload = claimed
+        logging.info(f"Running job {job_id}")
+        started = time.time()
+        try:
+            result = self.handler(payload)
+            self._finish(job_id, DONE, result=result)
+            logging.info(f"Job {job_id} finished in {time.time() - started:.2f}s")
+        except Exception as e:
+            logging.error(f"Job {job_id} failed: {e}", exc_info=True)
+            self._finish(job_id, FAILED, error=str(e))
+        return True
+
+    def _work(self):
+        while not self._stop.is_set():
+            try:
+                if time.time() - self._last_requeue >= REQUEUE_INTERVAL:
+                    self.requeue_stale()
+                if self.run_next():
+                    continue
+            except Exception as e:
+                logging.error(f"Job worker error: {e}", exc_info=True)
+            self._wakeup.wait(POLL_INTERVAL)
+            self._wakeup.clear()
+
+    def start(self):
+        """
+        Starts the worker threads.
+        """
+        if self._threads:
+            return
+        self.requeue_stale()
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        thread = threading.Thread(target=self._heartbeat_loop, name="job-heartbeat", daemon=True)
+        thread.start()
+        self._threads.append(thread)
+        logging.info(f"Started {self.workers} job workers")
+
+    def stop(self, timeout=None):
+        """
+        Signals the worker threads to exit and waits for them.
+        """
+        self._stop.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
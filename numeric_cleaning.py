@@ -0,0 +1,191 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+# Period each money field is stored in. Values marked with the other period
+# (e.g. "$24.00/SF/yr" in a monthly field) are converted.
+FIELD_PERIODS = {
+    "monthly_asking_rent": "month",
+    "monthly_operating_expenses": "month",
+    "monthly_asking_gross": "month",
+    "annual_asking_gross": "year",
+    "asking_monthly_rent": "month",
+    "asking_annual_rent": "year",
+    "tia": "year",
+}
+
+MONTHLY_PATTERN = r"/\s*(?:mo|mth|month)|\bmonthly\b|\bper\s+month\b"
+ANNUAL_PATTERN = r"/\s*(?:yr|year|annum)|\bannual(?:ly)?\b|\bper\s+(?:year|annum)\b"
+
+# Lease type abbreviations found next to rents, e.g. "24.00 NNN"
+RENT_TYPE_LABELS = {
+    "nnn": "NNN",
+    "nn": "NN",
+    "fsg": "Full Service",
+    "fs": "Full Service",
+    "full service": "Full Service",
+    "mg": "Modified Gross",
+    "modified gross": "Modified Gross",
+    "ig": "Industrial Gross",
+    "industrial gross": "Industrial Gross",
+    "gross": "Gross",
+}
+RENT_TYPE_PATTERN = r"\b(?P<rent_type>" + "|".join(sorted(RENT_TYPE_LABELS, key=len, reverse=True)) + r")\b"
+# Rent types whose asking rent already includes operating expenses
+GROSS_RENT_TYPES = {"full service", "gross", "fsg", "fs"}
+
+# Fields whose text may carry the lease type
+RENT_TEXT_FIELDS = ["monthly_asking_rent", "monthly_asking_gross", "annual_asking_gross", "asking_monthly_rent",
+                    "asking_annual_rent"]
+
+
+def _lowered_text(column):
+    # Arrow string array of the column's text, lowercased
+    return pc.ascii_lower(pa.array(column.astype("string[pyarrow]")))
+
+
+def _where(array, mask, function):
+    # Applies an Arrow kernel to the elements selected by mask only, so
+    # costly regex passes skip the rows that can't need them
+    mask = pc.fill_null(mask, False)
+    if not pc.any(mask).as_py():
+        return array
+    return pc.replace_with_mask(array, mask, function(pc.filter(array, mask)))
+
+
+def _parse_text(text):
+    """
+    Parses the leading number of each string in an Arrow string array using
+    only Arrow compute kernels: "$1,200.50/SF/mo" -> 1200.5, "N/A" -> null.
+    The number ends at the first whitespace or "/"; anything unparsable, or
+    followed by another number, is null. Ratios per 1,000 SF ("4.0/1,000 SF")
+    parse to their numerator.
+    """
+    text = pc.utf8_trim_whitespace(text)
+    # Tabs and line breaks inside a cell separate like spaces
+    text = _where(text, pc.invert(pc.ascii_is_printable(text)),
+                  lambda masked: pc.replace_substring_regex(masked, r"\s+", " "))
+    separated = pc.replace_substring(pc.utf8_ltrim(text, characters="$ "), " ", "/")
+    # The denominator of a per-1,000 SF ratio is not a second number
+    separated = _where(separated, pc.match_substring(separated, "000"),
+                       lambda masked: pc.replace_substring_regex(masked, r"/+(?:per/+)?1,?000(?:/|$)", "/"))
+    text = pc.replace_substring(pc.list_element(pc.split_pattern(separated, "/", max_splits=1), 0), ",", "")
+    negative = pc.starts_with(text, "-")
+    unsigned = pc.if_else(negative, pc.utf8_slice_codeunits(text, 1), text)
+    # A second number ("1,200 - 3,500 SF", "88 Covered/225 Surface") makes the value ambiguous
+    valid = pc.and_(pc.and_(pc.utf8_is_digit(pc.replace_substring(unsigned, ".", "", max_replacements=1)),
+                            pc.invert(pc.match_substring(unsigned, "-"))),
+                    pc.invert(pc.match_substring_regex(separated, r"^[^/]*/.*\d")))
+    values = pc.cast(pc.if_else(valid, unsigned, pa.scalar(None, unsigned.type)), pa.float64())
+    return pc.if_else(negative, pc.negate(values), values)
+
+
+def parse_numbers(column, period=None):
+    """
+    Parses numbers out of text such as "$2.15/SF/mo", "1,200 SF", "24.00 NNN"
+    or "N/A" with vectorized Arrow string kernels; there is no per-row Python.
+
+    :param column: A pandas Series; numeric columns are returned as float64 unchanged.
+    :param period: "month" or "year" for money fields. Values explicitly marked
+                   with the other period ("/yr", "annual", "/mo", "monthly")
+                   are converted to this one.
+    :return: float64 Series with NaN for missing or unparsable values.
+    """
+    if pd.api.types.is_numeric_dtype(column.dtype) and not isinstance(column.dtype, pd.CategoricalDtype):
+        return column.astype("float64")
+
+    text = _lowered_text(column)
+    values = _parse_text(text).to_numpy(zero_copy_only=False)
+    if period is not None:
+        other = ANNUAL_PATTERN if period == "month" else MONTHLY_PATTERN
+        marked = pc.fill_null(pc.match_substring_regex(text, other), False).to_numpy(zero_copy_only=False)
+        values = np.where(marked, values / 12 if period == "month" else values * 12, values)
+    return pd.Series(values, index=column.index, dtype="float64")
+
+
+def extract_rent_type(column):
+    """
+    Returns the lease type written next to a rent ("24.00 NNN" -> "NNN"), or
+    NA where there is none.
+    """
+    result = pd.Series(pd.NA, index=column.index, dtype="string[pyarrow]")
+    if pd.api.types.is_numeric_dtype(column.dtype) and not isinstance(column.dtype, pd.CategoricalDtype):
+        return result
+    text = _lowered_text(column)
+    # Only run the extraction on the few cells that carry a lease type
+    matched = pc.fill_null(pc.match_substring_regex(text, RENT_TYPE_PATTERN), False).to_numpy(zero_copy_only=False)
+    if matched.any():
+        found = pc.extract_regex(pc.filter(text, pa.array(matched)), RENT_TYPE_PATTERN).field("rent_type")
+        labels = pd.Series(found.to_numpy(zero_copy_only=False)).map(RENT_TYPE_LABELS)
+        result.iloc[np.flatnonzero(matched)] = labels.to_numpy()
+    return result
+
+
+def fill_rent_type(data):
+    """
+    Fills missing rent types from lease types written in the rent fields.
+    Must run before the rent fields are parsed to numbers.
+    """
+    found = None
+    for field in RENT_TEXT_FIELDS:
+        if field in data.columns:
+            rent_type = extract_rent_type(data[field])
+            found = rent_type if found is None else found.fillna(rent_type)
+    if found is None or not found.notna().any():
+        return data
+    if "rent_type" in data.columns:
+        current = data["rent_type"].astype("string[pyarrow]")
+        data["rent_type"] = current.mask(current.isna() | (current.str.strip() == ""), found)
+    else:
+        data["rent_type"] = found
+    return data
+
+
+def _values(data, field):
+    return data[field].to_numpy(dtype="float64", na_value=np.nan)
+
+
+def derive_rent_fields(data):
+    """
+    Fills missing rent fields from the ones present, in place:
+    monthly/annual gross $/SF from each other or from rent plus operating
+    expenses (rent alone for gross lease types), and monthly/annual total
+    rent from each other or from rent $/SF times SF available. A derived
+    field is added as a column when the fields it derives from exist, and
+    known values are never overwritten.
+    """
+    columns = set(data.columns)
+
+    def fill(target, values):
+        if target in columns:
+            current = _values(data, target)
+            data[target] = np.where(np.isnan(current), values, current)
+        else:
+            data[target] = values
+            columns.add(target)
+
+    if "annual_asking_gross" in columns:
+        fill("monthly_asking_gross", _values(data, "annual_asking_gross") / 12)
+    if "asking_annual_rent" in columns:
+        fill("asking_monthly_rent", _values(data, "asking_annual_rent") / 12)
+    if {"asking_monthly_rent", "sf_available"} <= columns:
+        sf = _values(data, "sf_available")
+        with np.errstate(divide="ignore", invalid="ignore"):
+            fill("monthly_asking_rent", np.where(sf > 0, _values(data, "asking_monthly_rent") / sf, np.nan))
+    if "monthly_asking_rent" in columns and ("monthly_operating_expenses" in columns or "rent_type" in columns):
+        rent = _values(data, "monthly_asking_rent")
+        gross = np.full(len(data), np.nan)
+        if "monthly_operating_expenses" in columns:
+            gross = rent + _values(data, "monthly_operating_expenses")
+        if "rent_type" in columns:
+            is_gross = data["rent_type"].astype("string").str.strip().str.lower().isin(GROSS_RENT_TYPES)
+            gross = np.where(is_gross.fillna(False).to_numpy(dtype=bool), rent, gross)
+        fill("monthly_asking_gross", gross)
+    if "monthly_asking_gross" in columns:
+        fill("annual_asking_gross", _values(data, "monthly_asking_gross") * 12)
+    if {"monthly_asking_rent", "sf_available"} <= columns:
+        fill("asking_monthly_rent", _values(data, "monthly_asking_rent") * _values(data, "sf_available"))
+    if "asking_monthly_rent" in columns:
+        fill("asking_annual_rent", _values(data, "asking_monthly_rent") * 12)
+    return data
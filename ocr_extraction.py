@@ -0,0 +1,43 @@
+import os
+import cv2
+import pytesseract
+from PIL import Image
+
+# Tesseract is looked up on PATH unless TESSERACT_CMD points elsewhere
+if os.environ.get("TESSERACT_CMD"):
+    pytesseract.pytesseract.tesseract_cmd = os.environ["TESSERACT_CMD"]
+
+TARGET_DPI = 300
+# Used to cap resolution when an image carries no DPI metadata
+MAX_LONG_SIDE = 3500
+
+
+def preprocess_image(file_path, target_dpi=TARGET_DPI):
+    """
+    Prepares an image for OCR: grayscale, downscaled to target_dpi (or to
+    MAX_LONG_SIDE pixels if the DPI is unknown) and binarized with Otsu's
+    threshold.
+    """
+    image = cv2.imread(file_path, cv2.IMREAD_GRAYSCALE)
+    if image is None:
+        raise ValueError(f"Could not read image: {file_path}")
+
+    with Image.open(file_path) as img:
+        dpi = img.info.get("dpi")
+    height, width = image.shape
+    if dpi and dpi[0] and dpi[0] > target_dpi:
+        scale = target_dpi / float(dpi[0])
+    else:
+        scale = min(1.0, MAX_LONG_SIDE / float(max(height, width)))
+    if scale < 1.0:
+        image = cv2.resize(image, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_AREA)
+
+    _, image = cv2.threshold(image, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    return image
+
+
+def ocr_image(file_path):
+    """
+    Runs Tesseract on a preprocessed image and returns the recognized text.
+    """
+    return pytesseract.image_to_string(preprocess_image(file_path))
@@ -1,8 +1,22 @@
 import os
 import json
+import argparse
 import pandas as pd
 import logging
+from contextlib import ExitStack
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
+from survey_cache import SurveyCache
+from consolidation_store import ConsolidationStore, SOURCE_COLUMN
+from excel_stream import DEFAULT_CHUNK_SIZE
+from extractors import detect
+from header_detection import apply_layout
+from property_store import PropertyStore
+from survey_fields import STRING_DTYPE, apply_schema
+from excel_export import export_excel
+from deduplication import DEFAULT_SIMILARITY, deduplicate_properties
+from change_report import diff_properties
+from instrumentation import capture_counts, count, record_counts, stage
 
 # Configure logging
 logging.basicConfig(
@@ -11,64 +25,477 @@ logging.basicConfig(
     handlers=[logging.FileHandler("process_surveys.log", mode="a"), logging.StreamHandler()]
 )
 
-def process_surveys(file_paths, output_excel):
+def standardize_columns(df):
     """
-    Processes uploaded CRE surveys and generates consolidated outputs.
+    Normalizes column names to lowercase snake_case.
+    """
+    df.columns = df.columns.astype(str).str.strip().str.lower().str.replace(" ", "_")
+    return df
+
+def tag_table(data, file_path, table):
+    """
+    Renames a table's known headers to their canonical field names and tags
+    its rows with the file, sheet and table they came from.
+    """
+    data = apply_layout(data, table.layout)
+    data["source_file"] = os.path.basename(file_path)
+    data["source_sheet"] = table.sheet
+    data["source_table"] = table.index
+    return data
+
+def fill_building_class(data):
+    """
+    Sets building_class to "Unknown" on rows without one, adding the column
+    if no survey had it. Filling row by row keeps the value stable across
+    runs whose files differ in whether they carry a building class.
+    """
+    if "building_class" not in data.columns:
+        data["building_class"] = pd.Series("Unknown", index=data.index, dtype="category")
+        return data
+    classes = data["building_class"]
+    if classes.isna().any():
+        if isinstance(classes.dtype, pd.CategoricalDtype) and "Unknown" not in classes.cat.categories:
+            classes = classes.cat.add_categories("Unknown")
+        data["building_class"] = classes.fillna("Unknown")
+    return data
+
+def detect_format(file_path):
+    """
+    Returns the extractor for a file's content (see extractors), or None if
+    the format is unsupported or the file cannot be read.
+    """
+    try:
+        extractor = detect(file_path)
+    except OSError as e:
+        logging.error(f"Error processing {file_path}: {e}")
+        return None
+    if extractor is None:
+        logging.warning(f"Unsupported file type: {file_path}")
+    return extractor
+
+def read_survey(file_path, chunk_size=None, extractor=None):
+    """
+    Reads a single survey file into a DataFrame with standardized columns
+    and the typed property schema applied.
+    The format is recognized from the file's content, not its name, and the
+    file is read by that format's extractor: every table of every sheet of
+    a workbook (blocks of rows separated by blank rows), the tables of a
+    Word document, a CSV file, or the labelled fields of a PDF or image.
+    Each table's header row is detected automatically and known headers
+    are renamed to their canonical field names.
+    chunk_size sets how many workbook rows are converted at a time.
+    Returns None if the file is unsupported, empty or fails to parse.
     """
-    consolidated_data = []
+    logging.info(f"Processing file: {file_path}")
+    try:
+        extractor = extractor or detect_format(file_path)
+        if extractor is None:
+            return None
+        tables = [standardize_columns(tag_table(data, file_path, table)) for table, data
+                  in extractor.read(file_path, chunk_size or DEFAULT_CHUNK_SIZE) if not data.empty]
+        data = pd.concat(tables, ignore_index=True) if tables else None
+
+        if isinstance(data, pd.DataFrame) and not data.empty:
+            logging.info(f"Successfully processed {file_path}, rows: {len(data)}, tables: {len(tables)}")
+            return apply_schema(data)
+        else:
+            logging.warning(f"No valid data found in {file_path}")
 
-    # Extract data from uploaded files
+    except Exception as e:
+        logging.error(f"Error processing {file_path}: {e}", exc_info=True)
+    return None
+
+def iter_survey_chunks(file_paths, chunk_size):
+    """
+    Yields (file_path, chunk) pairs, streaming every table of each workbook
+    in chunks of at most chunk_size rows with standardized columns. Other
+    formats have no streaming reader and yield each table as one chunk.
+    Unsupported or unreadable files are logged and skipped.
+    """
     for file_path in file_paths:
-        logging.info(f"Processing file: {file_path}")
+        logging.info(f"Streaming file: {file_path}")
+        extractor = detect_format(file_path)
+        if extractor is None:
+            continue
+        rows = 0
         try:
-            if file_path.endswith('.xlsx'):
-                data = pd.read_excel(file_path)
-            else:
-                logging.warning(f"Unsupported file type: {file_path}")
-                continue
+            for table, chunks in extractor.iter_tables(file_path, chunk_size):
+                for chunk in chunks:
+                    rows += len(chunk)
+                    yield file_path, apply_schema(standardize_columns(tag_table(chunk, file_path, table)))
+        except Exception as e:
+            logging.error(f"Error processing {file_path}: {e}", exc_info=True)
+            continue
+        logging.info(f"Successfully streamed {file_path}, rows: {rows}")
 
-            if isinstance(data, pd.DataFrame) and not data.empty:
-                consolidated_data.append(data)
-                logging.info(f"Successfully processed {file_path}, rows: {len(data)}")
-            else:
-                logging.warning(f"No valid data found in {file_path}")
+def survey_columns(file_path):
+    """
+    Returns the standardized output columns of all tables in a survey.
+    Only the first data row of each workbook table is converted; the other
+    rows are skipped over. Formats without a streaming reader are read whole.
+    """
+    extractor = detect_format(file_path)
+    if extractor is None:
+        return []
+    columns = []
+    for table, chunks in extractor.iter_tables(file_path, 1):
+        first = next(chunks, None)
+        if first is not None:
+            tagged = standardize_columns(tag_table(first.iloc[:0], file_path, table))
+            columns.extend(column for column in tagged.columns if column not in columns)
+    return columns
 
+def stream_surveys(file_paths, output_excel, chunk_size):
+    """
+    Consolidates surveys into Excel without holding them in memory: the
+    output columns are collected from each file's header first, then rows
+    are streamed chunk by chunk straight into a constant-memory writer.
+    Returns the export summary, or None if no file had any columns.
+    """
+    columns = []
+    for file_path in file_paths:
+        try:
+            columns.extend(column for column in survey_columns(file_path) if column not in columns)
         except Exception as e:
-            logging.error(f"Error processing {file_path}: {e}", exc_info=True)
+            logging.error(f"Error reading header of {file_path}: {e}", exc_info=True)
+    if not columns:
+        logging.error("No valid data extracted.")
+        return None
+    if "building_class" not in columns:
+        logging.warning("'building_class' column not found in the file. Adding default values.")
+        columns.append("building_class")
+
+    def chunks():
+        for _, chunk in iter_survey_chunks(file_paths, chunk_size):
+            yield fill_building_class(chunk)
+
+    with stage("export"):
+        summary = export_excel(chunks(), output_excel, columns=columns)
+    count("rows_exported", summary["Total Rows Processed"])
+    logging.info(f"Output saved to {output_excel}")
+    return summary
+
+def _read_uncached(file_paths, workers, chunk_size=None, expensive_workers=None):
+    if not file_paths:
+        return []
+    formats = [detect_format(file_path) for file_path in file_paths]
+    with stage("parse"):
+        results = _parse_files(file_paths, formats, workers, chunk_size, expensive_workers)
+    for file_path, extractor, data in zip(file_paths, formats, results):
+        if extractor is None:
+            continue
+        count("files", kind=extractor.kind)
+        if os.path.exists(file_path):
+            count("bytes", os.path.getsize(file_path), kind=extractor.kind)
+        count("rows", len(data) if data is not None else 0, source=extractor.kind)
+    return results
+
+def _read_in_worker(file_path, chunk_size, extractor):
+    # Counts made in a pool process (e.g. PDF pages) are returned to the parent
+    with capture_counts() as counts:
+        data = read_survey(file_path, chunk_size, extractor)
+    return data, counts
+
+def _parse_files(file_paths, formats, workers, chunk_size=None, expensive_workers=None):
+    """
+    Parses files with their extractors, routed by the extractors' cost
+    hints: cheap files (workbooks, CSV, Word) run on `workers` processes and
+    expensive ones (PDFs, OCR, very large files) on a separate pool of
+    expensive_workers, so slow files never hold up fast ones. Each pool
+    starts its longest files first. A group that cannot use more than one
+    worker is parsed in-process, unless expensive_workers is set and there
+    are cheap files to overlap with. Results are in the order of file_paths.
+    """
+    groups = {False: [], True: []}
+    for i, (file_path, extractor) in enumerate(zip(file_paths, formats)):
+        if extractor is not None:
+            groups[extractor.is_expensive(file_path)].append(i)
+    pool_sizes = {False: workers or 1, True: expensive_workers or workers or 1}
+
+    results = [None] * len(file_paths)
+    futures = []
+    inline = []
+    with ExitStack() as pools:
+        for expensive, indices in groups.items():
+            # Longest first, so a large file does not start last and hold up the pool
+            indices.sort(key=lambda i: formats[i].estimate(file_paths[i]), reverse=True)
+            size = min(pool_sizes[expensive], len(indices))
+            if size > 1 or (size == 1 and expensive and expensive_workers and groups[False]):
+                logging.info(f"Reading {len(indices)} {'expensive' if expensive else 'cheap'} files "
+                             f"with {size} workers")
+                executor = pools.enter_context(ProcessPoolExecutor(max_workers=size))
+                futures.extend((i, executor.submit(_read_in_worker, file_paths[i], chunk_size, formats[i]))
+                               for i in indices)
+            else:
+                inline.extend(indices)
+
+        # In-process files are parsed while the pools work
+        for i in inline:
+            results[i] = read_survey(file_paths[i], chunk_size, formats[i])
+        for i, future in futures:
+            try:
+                results[i], counts = future.result()
+                record_counts(counts)
+            except Exception as e:
+                logging.error(f"Worker failed on {file_paths[i]}: {e}", exc_info=True)
+    return results
 
-    # Combine data
-    if consolidated_data:
-        df = pd.concat(consolidated_data, ignore_index=True)
-        logging.info("Data combined successfully.")
+def read_surveys(file_paths, workers=None, cache=None, chunk_size=None, expensive_workers=None):
+    """
+    Reads survey files, optionally in parallel across a process pool, with
+    PDFs and images in a pool of expensive_workers (see _parse_files).
+    When a SurveyCache is given, files whose content is unchanged are loaded
+    from the cache and only the misses are parsed.
+    chunk_size switches workbook parsing to the streaming reader.
+    Results are returned in the same order as file_paths, with None for
+    files that could not be read.
+    """
+    file_paths = list(file_paths)
+    if cache is None:
+        return _read_uncached(file_paths, workers, chunk_size, expensive_workers)
+
+    results = [None] * len(file_paths)
+    keys = {}
+    pending = []
+    for i, file_path in enumerate(file_paths):
+        try:
+            keys[i] = cache.key_for(file_path)
+        except OSError as e:
+            logging.error(f"Error processing {file_path}: {e}")
+            continue
+        data = cache.get(keys[i])
+        if data is not None:
+            # Entries are keyed on content, and identical files can have different names
+            data["source_file"] = pd.Series(os.path.basename(file_path), index=data.index, dtype=STRING_DTYPE)
+            logging.info(f"Loaded {file_path} from cache, rows: {len(data)}")
+            results[i] = data
+            count("cache_hits", cache="survey")
+        else:
+            pending.append(i)
+            count("cache_misses", cache="survey")
+
+    parsed = _read_uncached([file_paths[i] for i in pending], workers, chunk_size, expensive_workers)
+    for i, data in zip(pending, parsed):
+        results[i] = data
+        if data is not None:
+            cache.put(keys[i], data)
+
+    logging.info(f"Cache stats: {cache.stats()}")
+    return results
+
+def consolidate_incremental(file_paths, store, workers=None, cache=None, chunk_size=None, expensive_workers=None):
+    """
+    Merges only new or changed surveys into the stored consolidated dataset.
+    Rows from changed files are replaced, rows from files no longer in
+    file_paths are dropped, and unchanged files are not read at all.
+    Returns the consolidated DataFrame, or None if there is no data.
+    """
+    manifest, dataset = store.load()
+
+    paths = list(dict.fromkeys(os.path.abspath(file_path) for file_path in file_paths))
+    current = {}
+    changed = []
+    for path in paths:
+        known = manifest.get(path)
+        try:
+            entry = store.file_entry(path, known)
+        except OSError as e:
+            logging.error(f"Error processing {path}: {e}")
+            continue
+        if known and known["hash"] == entry["hash"]:
+            entry["rows"] = known["rows"]
+            entry["columns"] = known["columns"]
+            current[path] = entry
+        else:
+            changed.append((path, entry))
+
+    count("cache_hits", len(current), cache="consolidation")
+    count("cache_misses", len(changed), cache="consolidation")
+    stale = set(manifest) - set(current)
+    removed = stale - {path for path, _ in changed}
+    logging.info(f"Incremental consolidation: {len(changed)} new or changed, "
+                 f"{len(removed)} removed, {len(current)} unchanged")
+
+    if not changed and not stale and not dataset.empty:
+        return dataset.drop(columns=SOURCE_COLUMN)
+
+    frames = []
+    if stale and not dataset.empty:
+        dataset = dataset[~dataset[SOURCE_COLUMN].isin(stale)]
+    if not dataset.empty:
+        frames.append(dataset)
+
+    parsed = read_surveys([path for path, _ in changed], workers, cache, chunk_size, expensive_workers)
+    for (path, entry), data in zip(changed, parsed):
+        if data is None:
+            continue
+        data[SOURCE_COLUMN] = path
+        entry["rows"] = len(data)
+        entry["columns"] = [column for column in data.columns if column != SOURCE_COLUMN]
+        current[path] = entry
+        frames.append(data)
+
+    # Restore input order and column layout so the result matches a full rebuild
+    order = [path for path in paths if path in current]
+    manifest = {path: current[path] for path in order}
+    columns = list(dict.fromkeys(column for path in order for column in manifest[path]["columns"]))
+
+    if frames:
+        dataset = pd.concat(frames, ignore_index=True)
+        rank = dataset[SOURCE_COLUMN].map({path: i for i, path in enumerate(order)})
+        dataset = dataset.take(rank.argsort(kind="stable"))
+        dataset = dataset.reindex(columns=columns + [SOURCE_COLUMN]).reset_index(drop=True)
     else:
+        dataset = pd.DataFrame(columns=[SOURCE_COLUMN])
+
+    try:
+        store.save(manifest, dataset)
+    except Exception as e:
+        logging.error(f"Failed to save consolidation store: {e}", exc_info=True)
+
+    if dataset.empty:
+        return None
+    return dataset.drop(columns=SOURCE_COLUMN)
+
+def report_changes(previous, current, property_store, changes_excel=None):
+    """
+    Compares the consolidated properties with the ones they replace and
+    saves the change report next to the property store (and, optionally,
+    as a workbook). Returns the ChangeReport, or None if it failed.
+    """
+    try:
+        with stage("diff"):
+            report = diff_properties(previous, current)
+            report.save(property_store.changes_path)
+            if changes_excel:
+                report.to_excel(changes_excel)
+        count("rows_changed", report.summary()["changed"])
+        return report
+    except Exception as e:
+        logging.error(f"Failed to build change report: {e}", exc_info=True)
+        return None
+
+def process_surveys(file_paths, output_excel, workers=None, cache=None, store=None, chunk_size=None,
+                    property_store=None, dedupe=False, dedupe_threshold=DEFAULT_SIMILARITY, changes_excel=None,
+                    expensive_workers=None):
+    """
+    Processes uploaded CRE surveys and generates consolidated outputs.
+    Set workers > 1 to parse the files in a process pool and
+    expensive_workers to give PDFs and images a pool of their own, pass a
+    SurveyCache to skip re-parsing unchanged files, pass a
+    ConsolidationStore to merge only new or changed files, and set
+    chunk_size to stream workbooks instead of loading them whole.
+    With a PropertyStore, the typed result is saved to Parquet and the
+    Excel output is exported from it. Set dedupe to merge listings of the
+    same building (see deduplication.deduplicate_properties).
+    When the PropertyStore already holds an earlier run, the added, removed
+    and changed properties are saved to its changes_path (see
+    change_report.diff_properties), and to the changes_excel workbook if given.
+    Returns the consolidated DataFrame, or None if no data was extracted.
+    """
+    with stage("consolidate"):
+        if store is not None:
+            df = consolidate_incremental(file_paths, store, workers, cache, chunk_size, expensive_workers)
+        else:
+            # Extract data from uploaded files
+            consolidated_data = [data for data in read_surveys(file_paths, workers, cache, chunk_size,
+                                                               expensive_workers)
+                                 if data is not None]
+
+            # Combine data
+            df = pd.concat(consolidated_data, ignore_index=True) if consolidated_data else None
+            if df is not None:
+                logging.info("Data combined successfully.")
+    if df is None:
         logging.error("No valid data extracted.")
         return
 
-    # Standardize column names
-    df.columns = df.columns.str.strip().str.lower().str.replace(" ", "_")
+    # Column names are standardized per file in read_survey
     logging.info(f"Standardized columns: {df.columns.tolist()}")  # Log all column names
 
     # Debug missing columns
     if "building_class" not in df.columns:
         logging.warning("'building_class' column not found in the file. Adding default values.")
-        df["building_class"] = "Unknown"  # Default value
+
+    # Concatenating files can widen dtypes (e.g. categories), so re-apply the schema.
+    # Rows without a building class are filled after it, so placeholders such as "N/A" count as missing
+    df = fill_building_class(apply_schema(df))
+
+    if dedupe:
+        try:
+            with stage("dedup"):
+                df = deduplicate_properties(df, threshold=dedupe_threshold)
+        except Exception as e:
+            logging.error(f"Deduplication failed, keeping all listings: {e}", exc_info=True)
+
+    if property_store is not None:
+        previous = None
+        try:
+            if property_store.exists():
+                previous = property_store.read()
+        except Exception as e:
+            logging.error(f"Failed to read previous properties, skipping change report: {e}", exc_info=True)
+        try:
+            with stage("store"):
+                stored = property_store.write(df)
+        except Exception as e:
+            logging.error(f"Failed to save property store: {e}", exc_info=True)
+        else:
+            if previous is not None:
+                report_changes(previous, stored, property_store, changes_excel)
 
     # Save to Excel
     try:
-        df.to_excel(output_excel, index=False)
-        logging.info(f"Output saved to {output_excel}")
+        with stage("export"):
+            if property_store is not None:
+                property_store.export_excel(output_excel, df)
+            else:
+                export_excel(df, output_excel)
+                logging.info(f"Output saved to {output_excel}")
+        count("rows_exported", len(df))
     except Exception as e:
         logging.error(f"Failed to save output: {e}", exc_info=True)
 
+    return df
+
 # Example usage
 if __name__ == "__main__":
-    input_files = [
-        "example_survey1.xlsx",
-        "example_survey2.xlsx"
-    ]
+    parser = argparse.ArgumentParser(description="Consolidate CRE survey files into one Excel output.")
+    parser.add_argument("files", nargs="*", default=["example_survey1.xlsx", "example_survey2.xlsx"],
+                        help="Survey files to process")
+    parser.add_argument("-o", "--output", default=None, help="Output Excel path")
+    parser.add_argument("-w", "--workers", type=int, default=None,
+                        help="Number of worker processes used to parse files (default: sequential)")
+    parser.add_argument("--expensive-workers", type=int, default=None,
+                        help="Worker processes for PDFs, images and very large files (default: --workers)")
+    parser.add_argument("--cache-dir", default=None,
+                        help="Directory for the parsed-survey cache (default: no caching)")
+    parser.add_argument("--store-dir", default=None,
+                        help="Directory for the incremental consolidation store (default: full rebuild)")
+    parser.add_argument("--chunk-size", type=int, default=None,
+                        help="Rows converted at a time while reading workbooks (default: 5000)")
+    parser.add_argument("--stream", action="store_true",
+                        help="Stream rows straight to the output with bounded memory (uses --chunk-size)")
+    parser.add_argument("--property-store", default=None,
+                        help="Parquet file to save the typed consolidated properties to")
+    parser.add_argument("--dedupe", action="store_true",
+                        help="Merge listings of the same building into one row")
+    parser.add_argument("--dedupe-threshold", type=float, default=DEFAULT_SIMILARITY,
+                        help="Minimum address similarity (0-1) for --dedupe (default: %(default)s)")
+    parser.add_argument("--changes", default=None,
+                        help="Excel path for the changes since the previous run (requires --property-store)")
+    args = parser.parse_args()
 
-    output_file = os.path.join("output", f"consolidated_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx")
+    output_file = args.output or os.path.join("output", f"consolidated_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx")
 
-    os.makedirs("output", exist_ok=True)
+    os.makedirs(os.path.dirname(output_file) or ".", exist_ok=True)
 
-    process_surveys(input_files, output_file)
\ No newline at end of file
+    cache = SurveyCache(args.cache_dir) if args.cache_dir else None
+    store = ConsolidationStore(args.store_dir) if args.store_dir else None
+    property_store = PropertyStore(args.property_store) if args.property_store else None
+    if args.stream:
+        stream_surveys(args.files, output_file, args.chunk_size or 5000)
+    else:
+        process_surveys(args.files, output_file, workers=args.workers, expensive_workers=args.expensive_workers,
+                        cache=cache, store=store, chunk_size=args.chunk_size, property_store=property_store,
+                        dedupe=args.dedupe, dedupe_threshold=args.dedupe_threshold, changes_excel=args.changes)
@@ -0,0 +1,164 @@
+import os
+import logging
+import threading
+import numpy as np
+import pandas as pd
+
+# Exact-match filters: query parameter -> field, matched case-insensitively
+HASH_INDEX_FIELDS = {"city": "city", "zip": "zip_code", "building_class": "building_class"}
+# Range filters: query parameter prefix -> numeric field
+RANGE_INDEX_FIELDS = {"sf": "sf_available", "rent": "monthly_asking_rent"}
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+def _normalize_keys(values):
+    return values.astype("string").str.strip().str.lower()
+
+
+def _sort_keys(values):
+    # Float keys that order like the column; missing values sort after every known value
+    if pd.api.types.is_numeric_dtype(values.dtype) and not isinstance(values.dtype, pd.CategoricalDtype):
+        keys = values.to_numpy(dtype="float64", na_value=np.nan)
+        return np.where(np.isnan(keys), np.inf, keys)
+    codes, _ = pd.factorize(values.astype("string"), sort=True)
+    return np.where(codes < 0, np.inf, codes.astype("float64"))
+
+
+class PropertyIndex:
+    """
+    In-memory indexes over the consolidated properties, built once so that
+    filtered, sorted and paginated queries only touch the matching rows.
+
+    Exact-match fields get hash indexes (value -> sorted row positions),
+    range fields get a sorted value array searched with binary search, and
+    every column gets a numeric sort key array so matches are ordered
+    without comparing strings or sorting the whole dataset.
+    """
+
+    def __init__(self, data):
+        self.data = data.reset_index(drop=True)
+        self.hash_indexes = {}
+        self.range_indexes = {}
+        self.sort_keys = {}
+
+        for field in HASH_INDEX_FIELDS.values():
+            if field in self.data.columns:
+                keys = _normalize_keys(self.data[field])
+                self.hash_indexes[field] = {key: np.asarray(positions) for key, positions
+                                            in keys.groupby(keys, sort=False, observed=True).indices.items()}
+
+        for field in RANGE_INDEX_FIELDS.values():
+            if field in self.data.columns:
+                values = pd.to_numeric(self.data[field], errors="coerce").to_numpy(dtype="float64", na_value=np.nan)
+                known = np.flatnonzero(~np.isnan(values))
+                order = known[np.argsort(values[known], kind="stable")]
+                self.range_indexes[field] = (values[order], order)
+
+        for column in self.data.columns:
+            self.sort_keys[column] = _sort_keys(self.data[column])
+
+    def __len__(self):
+        return len(self.data)
+
+    def _match(self, field, values):
+        index = self.hash_indexes.get(field, {})
+        matches = [index[key] for key in {str(value).strip().lower() for value in values} if key in index]
+        if not matches:
+            return np.array([], dtype=np.intp)
+        return np.sort(np.concatenate(matches)) if len(matches) > 1 else matches[0]
+
+    def _range(self, field, low, high):
+        if field not in self.range_indexes:
+            return np.array([], dtype=np.intp)
+        values, order = self.range_indexes[field]
+        start = 0 if low is None else np.searchsorted(values, low, side="left")
+        stop = len(values) if high is None else np.searchsorted(values, high, side="right")
+        return np.sort(order[start:stop])
+
+    def query(self, filters=None, ranges=None, sort=None, descending=False, page=1, per_page=DEFAULT_PAGE_SIZE):
+        """
+        Returns one page of matching properties.
+
+        :param filters: dict of field -> list of accepted values (e.g. {"city": ["Albuquerque"]}).
+        :param ranges: dict of field -> (min, max); either bound may be None.
+        :param sort: Column to sort by (default: consolidation order).
+        :param descending: Sort in descending order; missing values stay last.
+        :param page: 1-based page number.
+        :param per_page: Page size, at most MAX_PAGE_SIZE.
+        :return: (total matches, DataFrame of the requested page)
+        """
+        if sort is not None and sort not in self.sort_keys:
+            raise ValueError(f"Cannot sort by unknown field: {sort}")
+        per_page = max(1, min(per_page, MAX_PAGE_SIZE))
+        page = max(1, page)
+
+        candidates = []
+        for field, values in (filters or {}).items():
+            candidates.append(self._match(field, values))
+        for field, (low, high) in (ranges or {}).items():
+            if low is not None or high is not None:
+                candidates.append(self._range(field, low, high))
+
+        if candidates:
+            # Intersect starting from the most selective index
+            candidates.sort(key=len)
+            positions = candidates[0]
+            for other in candidates[1:]:
+                if not len(positions):
+                    break
+                positions = np.intersect1d(positions, other, assume_unique=True)
+        else:
+            positions = np.arange(len(self.data))
+
+        if sort is not None:
+            keys = self.sort_keys[sort][positions]
+            if descending:
+                # Negate known keys so missing values (inf) still come last
+                keys = np.where(np.isinf(keys), keys, -keys)
+            positions = positions[np.argsort(keys, kind="stable")]
+
+        start = (page - 1) * per_page
+        return len(positions), self.data.iloc[positions[start:start + per_page]]
+
+
+def to_records(data):
+    """
+    Converts a DataFrame page into JSON-serializable dicts, with missing values as None.
+    """
+    values = data.astype(object).to_numpy()
+    values[pd.isna(values)] = None
+    columns = [str(column) for column in data.columns]
+    return [dict(zip(columns, row)) for row in values.tolist()]
+
+
+class PropertyIndexCache:
+    """
+    Holds the PropertyIndex of a PropertyStore and rebuilds it only when the
+    store file changes, i.e. once per consolidation.
+    """
+
+    def __init__(self, property_store):
+        self.property_store = property_store
+        self._lock = threading.Lock()
+        self._index = None
+        self._version = None
+
+    def _store_version(self):
+        stat = os.stat(self.property_store.path)
+        return stat.st_mtime_ns, stat.st_size
+
+    def get(self):
+        """
+        Returns the current PropertyIndex, or None if nothing has been consolidated yet.
+        """
+        if not self.property_store.exists():
+            return None
+        with self._lock:
+            version = self._store_version()
+            if version != self._version:
+                data = self.property_store.read()
+                self._index = PropertyIndex(data)
+                self._version = version
+                logging.info(f"Built property index over {len(data)} properties")
+            return self._index
@@ -0,0 +1,62 @@
+import os
+import uuid
+import logging
+import pandas as pd
+from survey_fields import STRING_DTYPE, apply_schema
+from excel_export import export_excel
+
+DEFAULT_PROPERTY_STORE = os.path.join("store", "properties.parquet")
+
+
+class PropertyStore:
+    """
+    Parquet file holding the consolidated properties with the typed schema
+    from survey_fields. It is the source of truth for consolidated data;
+    the Excel workbook is exported from it as a view.
+    """
+
+    def __init__(self, path=DEFAULT_PROPERTY_STORE):
+        self.path = path
+        # Change report of the last write against the properties it replaced
+        self.changes_path = os.path.splitext(path)[0] + "_changes.json"
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def write(self, data):
+        """
+        Applies the schema and atomically replaces the stored properties.
+        Returns the typed DataFrame that was written.
+        """
+        data = apply_schema(data)
+        # Unique, so a concurrent writer never replaces or removes this one
+        tmp_path = f"{self.path}.{uuid.uuid4().hex}.tmp"
+        try:
+            data.to_parquet(tmp_path, index=False)
+            os.replace(tmp_path, self.path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        logging.info(f"Property store updated: {self.path}, rows: {len(data)}")
+        return data
+
+    def read(self, columns=None):
+        """
+        Loads the stored properties, optionally only the given columns.
+        """
+        data = pd.read_parquet(self.path, columns=columns)
+        # Parquet metadata does not record the string storage, so restore it
+        for column in data.columns[data.dtypes == "string"]:
+            data[column] = data[column].astype(STRING_DTYPE)
+        return data
+
+    def export_excel(self, output_excel, data=None):
+        """
+        Writes the Excel view of the stored properties and returns its summary.
+        """
+        data = self.read() if data is None else data
+        summary = export_excel(data, output_excel)
+        logging.info(f"Output saved to {output_excel}")
+        return summary
@@ -0,0 +1,129 @@
+import os
+import hashlib
+import logging
+import pickle
+import threading
+import pandas as pd
+
+# Bump when the parse/standardize steps change so stale entries are ignored
+CACHE_VERSION = "5"
+
+DEFAULT_CACHE_DIR = "cache"
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024  # 512 MB
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def file_hash(file_path, chunk_size=HASH_CHUNK_SIZE):
+    """
+    Returns the SHA-256 hex digest of a file's content, read in chunks.
+    """
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class SurveyCache:
+    """
+    On-disk cache of parsed survey DataFrames keyed on file content hash.
+
+    Entries are stored as Parquet (falling back to pickle for frames that
+    Arrow cannot represent, e.g. mixed-type object columns) and evicted
+    least-recently-used first once the cache grows past max_bytes.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def key_for(self, file_path):
+        """
+        Returns the cache key for a file.
+        """
+        return f"{file_hash(file_path)}-v{CACHE_VERSION}"
+
+    def _entry_paths(self, key):
+        base = os.path.join(self.cache_dir, key)
+        return base + ".parquet", base + ".pkl"
+
+    def get(self, key):
+        """
+        Returns the cached DataFrame for key, or None on a miss.
+        """
+        for path in self._entry_paths(key):
+            if not os.path.exists(path):
+                continue
+            try:
+                if path.endswith(".parquet"):
+                    data = pd.read_parquet(path)
+                else:
+                    data = pd.read_pickle(path)
+                os.utime(path)  # Mark as recently used for LRU eviction
+                with self._lock:
+                    self.hits += 1
+                return data
+            except Exception as e:
+                logging.warning(f"Discarding unreadable cache entry {path}: {e}")
+                self._remove(path)
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, data):
+        """
+        Stores a DataFrame under key and evicts old entries if needed.
+        """
+        parquet_path, pickle_path = self._entry_paths(key)
+        try:
+            data.to_parquet(parquet_path, index=False)
+        except Exception as e:
+            self._remove(parquet_path)
+            logging.info(f"Parquet cache write failed for {key} ({e}), using pickle")
+            try:
+                data.to_pickle(pickle_path, protocol=pickle.HIGHEST_PROTOCOL)
+            except Exception as e:
+                self._remove(pickle_path)
+                logging.warning(f"Failed to cache {key}: {e}")
+                return
+        self.evict()
+
+    def evict(self):
+        """
+        Removes least-recently-used entries until the cache fits in max_bytes.
+        """
+        with self._lock:
+            entries = []
+            for name in os.listdir(self.cache_dir):
+                path = os.path.join(self.cache_dir, name)
+                if os.path.isfile(path):
+                    stat = os.stat(path)
+                    entries.append((stat.st_mtime, stat.st_size, path))
+
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                self._remove(path)
+                total -= size
+                self.evictions += 1
+                logging.info(f"Evicted cache entry: {path}")
+
+    def stats(self):
+        """
+        Returns hit/miss/eviction counters.
+        """
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
@@ -0,0 +1,163 @@
+import re
+import pandas as pd
+from numeric_cleaning import FIELD_PERIODS, parse_numbers, fill_rent_type, derive_rent_fields
+
+# Canonical property fields, in output order. These are the fields parsed by
+# ARCHIVE/app/data_extraction.extract_from_pdf.
+CANONICAL_FIELDS = [
+    "building_photo",
+    "address",
+    "property_name",
+    "city",
+    "zip_code",
+    "total_building_sf",
+    "sf_available",
+    "monthly_asking_rent",
+    "monthly_operating_expenses",
+    "monthly_asking_gross",
+    "annual_asking_gross",
+    "asking_monthly_rent",
+    "asking_annual_rent",
+    "rent_type",
+    "parking_ratio",
+    "tia",
+    "total_parking_spaces",
+    "building_class",
+    "year_built",
+    "notes",
+]
+
+# Header labels seen in broker surveys for each canonical field. The first
+# label is the one used in the PDF survey template.
+FIELD_ALIASES = {
+    "building_photo": ["Building Photo", "Photo", "Image"],
+    "address": ["Address", "Property Address", "Building Address", "Street Address"],
+    "property_name": ["Property Name", "Building Name"],
+    "city": ["City"],
+    "zip_code": ["ZIP Code", "Zip", "Zipcode", "Postal Code"],
+    "total_building_sf": ["Total Building SF", "RBA", "Building SF", "Building Size", "Total SF"],
+    "sf_available": ["SF Available", "Total Available Space (SF)", "Available SF", "Available Space",
+                     "SF Avail"],
+    "monthly_asking_rent": ["Monthly Asking Rent $/SF", "Asking Rent $/SF/Mo", "Monthly Rent $/SF"],
+    "monthly_operating_expenses": ["Monthly Operating Expenses", "Operating Expenses", "OpEx"],
+    "monthly_asking_gross": ["Monthly Asking Gross $/SF"],
+    "annual_asking_gross": ["Annual Asking Gross $/SF"],
+    "asking_monthly_rent": ["Asking Monthly Rent", "Monthly Rent"],
+    "asking_annual_rent": ["Asking Annual Rent", "Annual Rent"],
+    "rent_type": ["Rent Type", "Lease Type", "Service Type"],
+    "parking_ratio": ["Parking Ratio / 1,000 SF", "Parking Ratio"],
+    "tia": ["TIA ($/SF/Yr)", "TIA", "TI Allowance", "Tenant Improvement Allowance"],
+    "total_parking_spaces": ["Total # of Parking Spaces", "Total Parking Spaces", "Parking Spaces",
+                             "Number of Parking Spaces"],
+    "building_class": ["Building Class", "Class"],
+    "year_built": ["Year Built"],
+    "notes": ["Notes", "Comments", "Remarks"],
+}
+
+# Value type of each canonical field: "int" and "float" fields are numeric,
+# "category" fields are low-cardinality text and "str" is free text.
+# ZIP codes stay text to keep leading zeros.
+FIELD_TYPES = {
+    "building_photo": "str",
+    "address": "str",
+    "property_name": "str",
+    "city": "category",
+    "zip_code": "str",
+    "total_building_sf": "int",
+    "sf_available": "int",
+    "monthly_asking_rent": "float",
+    "monthly_operating_expenses": "float",
+    "monthly_asking_gross": "float",
+    "annual_asking_gross": "float",
+    "asking_monthly_rent": "float",
+    "asking_annual_rent": "float",
+    "rent_type": "category",
+    "parking_ratio": "float",
+    "tia": "float",
+    "total_parking_spaces": "int",
+    "building_class": "category",
+    "year_built": "int",
+    "notes": "str",
+}
+
+
+def normalize_label(label):
+    """
+    Normalizes a header label for matching: lowercase, with punctuation and
+    whitespace runs collapsed to single spaces. "$" and "#" are kept because
+    they distinguish labels such as "Monthly Asking Rent $/SF".
+    """
+    return re.sub(r"[^a-z0-9$#]+", " ", str(label).lower()).strip()
+
+
+def build_alias_map(aliases=None):
+    """
+    Compiles the alias table into a dict of normalized label -> canonical field.
+    Canonical names themselves are accepted as labels too.
+    """
+    aliases = FIELD_ALIASES if aliases is None else aliases
+    alias_map = {}
+    for field, labels in aliases.items():
+        for label in [field] + list(labels):
+            alias_map.setdefault(normalize_label(label), field)
+    return alias_map
+
+
+ALIAS_MAP = build_alias_map()
+
+
+# Arrow-backed strings take a fraction of the memory of Python str objects
+STRING_DTYPE = "string[pyarrow]"
+
+# Placeholder values that mean "no data" in text fields
+MISSING_TEXT = ["", "N/A", "n/a", "NA", "-", "--"]
+
+
+def _to_text(column):
+    # Whole-number floats (e.g. ZIP codes in a column with gaps) are written
+    # without a trailing ".0"
+    if pd.api.types.is_float_dtype(column):
+        values = column.dropna()
+        if (values == values.round()).all():
+            column = column.astype("Int64")
+    column = column.astype(STRING_DTYPE).str.strip()
+    return column.mask(column.isin(MISSING_TEXT))
+
+
+def apply_field_types(data):
+    """
+    Casts the canonical columns present in data to their FIELD_TYPES: nullable
+    Int64 for "int", float64 for "float", category for "category" and
+    Arrow-backed string otherwise.
+    Numeric text such as "$2.15/SF/mo" or "1,200 SF" is parsed, with money
+    fields converted to their FIELD_PERIODS period; anything else becomes
+    NA. Lease types written next to rents ("24.00 NNN") fill a missing
+    rent_type.
+    """
+    data = fill_rent_type(data)
+    for field, kind in FIELD_TYPES.items():
+        if field not in data.columns:
+            continue
+        column = data[field]
+        if kind in ("int", "float"):
+            column = parse_numbers(column, FIELD_PERIODS.get(field))
+            data[field] = column.round().astype("Int64") if kind == "int" else column
+        elif kind == "category":
+            data[field] = _to_text(column).astype("category")
+        else:
+            data[field] = _to_text(column)
+    return data
+
+
+def apply_schema(data):
+    """
+    Applies the typed property schema: canonical columns get their
+    FIELD_TYPES, missing rent fields are derived from the ones present, and
+    any other column left as a mixed-type object column is stored as string
+    so the frame can be written to Parquet.
+    """
+    data = derive_rent_fields(apply_field_types(data))
+    for column in data.columns:
+        if column not in FIELD_TYPES and data[column].dtype == object:
+            data[column] = data[column].astype(STRING_DTYPE)
+    return data
@@ -0,0 +1,202 @@
+import os
+import random
+import logging
+import xlsxwriter
+from PIL import Image, ImageDraw, ImageFont
+from survey_fields import CANONICAL_FIELDS, FIELD_ALIASES
+
+CITIES = {
+    "Albuquerque": ["87102", "87104", "87106", "87108", "87109", "87110", "87112", "87113"],
+    "Phoenix": ["85003", "85004", "85012", "85016", "85018", "85020"],
+    "Denver": ["80202", "80203", "80205", "80206", "80209", "80211"],
+    "Tucson": ["85701", "85705", "85710", "85711", "85719"],
+}
+STREET_NAMES = ["Main", "Central", "Indian School", "Montgomery", "Jefferson", "Lomas", "San Mateo",
+                "Menaul", "Osuna", "Academy", "Paseo del Norte", "Wyoming", "Louisiana", "Carlisle"]
+STREET_SUFFIXES = [("Street", "St"), ("Avenue", "Ave"), ("Road", "Rd"), ("Boulevard", "Blvd"),
+                   ("Drive", "Dr"), ("Parkway", "Pkwy")]
+DIRECTIONS = [("", ""), ("Northeast", "NE"), ("Northwest", "NW"), ("Southeast", "SE")]
+RENT_TYPES = ["NNN", "Full Service", "Modified Gross", "Industrial Gross"]
+BUILDING_CLASSES = ["A", "B", "C"]
+NOTES = ["Move-in ready", "Renovated lobby", "Signage available", "Close to I-25", "Sublease", None]
+
+# Fields written to the generated files: every canonical field but the photo
+SURVEY_FIELDS = [field for field in CANONICAL_FIELDS if field != "building_photo"]
+
+
+def _street_address(rng, number, name, suffix, direction):
+    # Spell suffix/direction out or abbreviate them, and sometimes add a
+    # unit, so the same building appears under several address variants
+    suffix = suffix[rng.random() < 0.5]
+    direction = direction[rng.random() < 0.5]
+    address = " ".join(part for part in (str(number), name, suffix, direction) if part)
+    if rng.random() < 0.2:
+        address += f", Ste {rng.randint(1, 40) * 10}"
+    return address
+
+
+def synthetic_properties(count, seed=0, duplicate_ratio=0.1):
+    """
+    Generates property listings with realistic value ranges.
+
+    A duplicate_ratio share of the listings repeat an earlier building under
+    a different spelling of its address, with fresh rent values, the way one
+    building shows up in several broker surveys.
+
+    :param count: Number of listings.
+    :param seed: Random seed; the same seed always gives the same listings.
+    :param duplicate_ratio: Share of listings (0-1) that repeat a building.
+    :return: list of dicts keyed by canonical field name.
+    """
+    rng = random.Random(seed)
+    buildings = []
+    listings = []
+    for _ in range(count):
+        if buildings and rng.random() < duplicate_ratio:
+            building = rng.choice(buildings)
+        else:
+            city = rng.choice(list(CITIES))
+            building = {
+                "number": rng.randint(100, 9999),
+                "name": rng.choice(STREET_NAMES),
+                "suffix": rng.choice(STREET_SUFFIXES),
+                "direction": rng.choice(DIRECTIONS),
+                "property_name": f"{rng.choice(STREET_NAMES)} {rng.choice(['Plaza', 'Center', 'Tower', 'Park'])}",
+                "city": city,
+                "zip_code": rng.choice(CITIES[city]),
+                "total_building_sf": rng.randrange(5000, 400000, 500),
+                "building_class": rng.choice(BUILDING_CLASSES),
+                "year_built": rng.randint(1955, 2024),
+                "total_parking_spaces": rng.randint(10, 1200),
+            }
+            buildings.append(building)
+
+        total_sf = building["total_building_sf"]
+        monthly_rent = round(rng.uniform(0.8, 3.5), 2)
+        operating_expenses = round(rng.uniform(0.2, 1.2), 2)
+        sf_available = rng.randrange(500, max(1000, total_sf // 2), 100)
+        listings.append({
+            "address": _street_address(rng, building["number"], building["name"], building["suffix"],
+                                       building["direction"]),
+            "property_name": building["property_name"],
+            "city": building["city"],
+            "zip_code": building["zip_code"],
+            "total_building_sf": total_sf,
+            "sf_available": sf_available,
+            "monthly_asking_rent": monthly_rent,
+            "monthly_operating_expenses": operating_expenses,
+            "monthly_asking_gross": round(monthly_rent + operating_expenses, 2),
+            "annual_asking_gross": round((monthly_rent + operating_expenses) * 12, 2),
+            "asking_monthly_rent": round(monthly_rent * sf_available, 2),
+            "asking_annual_rent": round(monthly_rent * sf_available * 12, 2),
+            "rent_type": rng.choice(RENT_TYPES),
+            "parking_ratio": round(building["total_parking_spaces"] * 1000 / total_sf, 2),
+            "tia": round(rng.uniform(0, 60), 2),
+            "total_parking_spaces": building["total_parking_spaces"],
+            "building_class": building["building_class"],
+            "year_built": building["year_built"],
+            "notes": rng.choice(NOTES),
+        })
+    return listings
+
+
+def write_survey_xlsx(file_path, properties, header_offset=2, seed=0):
+    """
+    Writes listings as a broker-style workbook: title rows above the header
+    (header_offset rows), header labels picked at random from each field's
+    aliases, and columns in a shuffled order.
+    """
+    rng = random.Random(seed)
+    fields = SURVEY_FIELDS[:]
+    rng.shuffle(fields)
+    headers = [rng.choice(FIELD_ALIASES[field]) for field in fields]
+
+    workbook = xlsxwriter.Workbook(file_path, {"constant_memory": True})
+    try:
+        worksheet = workbook.add_worksheet("Availabilities")
+        if header_offset:
+            worksheet.write(0, 0, f"Synthetic Office Availability Survey #{seed}")
+        worksheet.write_row(header_offset, 0, headers)
+        for i, listing in enumerate(properties, start=header_offset + 1):
+            worksheet.write_row(i, 0, [listing.get(field) for field in fields])
+    finally:
+        workbook.close()
+    return file_path
+
+
+def _pdf_string(text):
+    return "(" + text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)") + ")"
+
+
+def write_survey_pdf(file_path, properties):
+    """
+    Writes a text PDF with one listing per page as "<Label>: <value>" lines,
+    using the PDF template labels that pdf_extraction parses.
+    The PDF is assembled directly, so no PDF library is needed.
+    """
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None,
+               "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    page_ids = []
+    for listing in properties:
+        lines = [f"{FIELD_ALIASES[field][0]}: {listing[field]}" for field in SURVEY_FIELDS
+                 if listing.get(field) is not None]
+        content = "BT /F1 11 Tf 14 TL 50 760 Td " + " ".join(f"{_pdf_string(line)} Tj T*" for line in lines) + " ET"
+        objects.append(f"<< /Length {len(content.encode('latin-1'))} >>\nstream\n{content}\nendstream")
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                       f"/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>")
+        page_ids.append(len(objects))
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(f'{i} 0 R' for i in page_ids)}] /Count {len(page_ids)} >>"
+
+    with open(file_path, "wb") as f:
+        f.write(b"%PDF-1.4\n")
+        offsets = []
+        for number, body in enumerate(objects, start=1):
+            offsets.append(f.tell())
+            f.write(f"{number} 0 obj\n{body}\nendobj\n".encode("latin-1"))
+        xref = f.tell()
+        f.write(f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("latin-1"))
+        for offset in offsets:
+            f.write(f"{offset:010d} 00000 n \n".encode("latin-1"))
+        f.write(f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode("latin-1"))
+    return file_path
+
+
+def write_survey_image(file_path, listing, dpi=300):
+    """
+    Renders one listing as a scanned-flyer style PNG of "<Label>: <value>" lines.
+    """
+    try:
+        font = ImageFont.load_default(size=36)
+    except TypeError:
+        font = ImageFont.load_default()
+    lines = [f"{FIELD_ALIASES[field][0]}: {listing[field]}" for field in SURVEY_FIELDS
+             if listing.get(field) is not None]
+    image = Image.new("L", (2550, 160 + 60 * len(lines)), 255)
+    draw = ImageDraw.Draw(image)
+    for i, line in enumerate(lines):
+        draw.text((120, 100 + 60 * i), line, fill=0, font=font)
+    image.save(file_path, dpi=(dpi, dpi))
+    return file_path
+
+
+def generate_corpus(output_dir, workbooks=3, rows_per_workbook=1000, pdfs=1, pages_per_pdf=20, images=2,
+                    header_offset=2, duplicate_ratio=0.1, seed=0):
+    """
+    Generates a set of synthetic surveys for benchmarking.
+
+    :return: dict of "xlsx", "pdf" and "image" -> list of generated paths.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    corpus = {"xlsx": [], "pdf": [], "image": []}
+    for i in range(workbooks):
+        listings = synthetic_properties(rows_per_workbook, seed=seed + i, duplicate_ratio=duplicate_ratio)
+        path = os.path.join(output_dir, f"survey_{i + 1}.xlsx")
+        corpus["xlsx"].append(write_survey_xlsx(path, listings, header_offset=header_offset, seed=seed + i))
+    for i in range(pdfs):
+        listings = synthetic_properties(pages_per_pdf, seed=seed + 1000 + i, duplicate_ratio=duplicate_ratio)
+        corpus["pdf"].append(write_survey_pdf(os.path.join(output_dir, f"survey_{i + 1}.pdf"), listings))
+    for i, listing in enumerate(synthetic_properties(images, seed=seed + 2000, duplicate_ratio=0)):
+        corpus["image"].append(write_survey_image(os.path.join(output_dir, f"flyer_{i + 1}.png"), listing))
+    logging.info(f"Generated synthetic surveys in {output_dir}: "
+                 f"{ {kind: len(paths) for kind, paths in corpus.items()} }")
+    return corpus
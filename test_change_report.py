@@ -0,0 +1,20 @@
+import warnings
+import pandas as pd
+from change_report import diff_properties
+from survey_fields import apply_schema
+
+
+def _properties(**columns):
+    return apply_schema(pd.DataFrame(columns))
+
+
+def test_key_field_missing_on_one_side_matches_without_warning():
+    previous = _properties(address=["1 Main St", "2 Oak Ave"], city=["Austin", "Austin"], sf_available=[100, 200])
+    current = _properties(address=["1 Main St", "2 Oak Ave"], city=["Austin", "Austin"], sf_available=[150, 200],
+                          property_name=["Main Plaza", None])
+    with warnings.catch_warnings():
+        warnings.simplefilter("error", FutureWarning)
+        report = diff_properties(previous, current)
+    summary = report.summary()
+    assert (summary["added"], summary["removed"], summary["changed"], summary["unchanged"]) == (0, 0, 1, 1)
+    assert summary["changed_fields"] == {"sf_available": 1}
@@ -0,0 +1,51 @@
+import pandas as pd
+from deduplication import deduplicate_properties, find_duplicates, normalize_addresses
+
+
+def _listings(addresses, **columns):
+    return pd.DataFrame({"address": addresses, **columns})
+
+
+def test_normalize_addresses_strips_unit_and_abbreviates():
+    normalized = normalize_addresses(pd.Series(["123 Main Street, Ste 200", None]))
+    assert normalized["street"].iloc[0] == "123 main st"
+    assert normalized["number"].iloc[0] == "123"
+    assert normalized["unit"].iloc[0] == "ste 200"
+    assert normalized["street"].isna().iloc[1]
+
+
+def test_suite_and_suffix_variants_are_one_building():
+    data = _listings(["123 Main St", "123 Main Street, Ste 200"], zip_code=["87102", "87102"])
+    clusters = find_duplicates(data)
+    assert clusters[0] == clusters[1]
+
+
+def test_quadrants_are_different_buildings():
+    data = _listings(["4101 Indian School Rd NE", "4101 Indian School Rd NW"],
+                     city=["Albuquerque", "Albuquerque"], sf_available=[1000.0, 2500.0])
+    result = deduplicate_properties(data)
+    assert list(result["address"]) == ["4101 Indian School Rd NE", "4101 Indian School Rd NW"]
+    assert list(result["sf_available"]) == [1000.0, 2500.0]
+
+
+def test_leading_directions_are_different_buildings():
+    data = _listings(["100 N Main St", "100 S Main St", "100 North Main Street"],
+                     zip_code=["87102", "87102", "87102"])
+    clusters = find_duplicates(data)
+    assert clusters[0] != clusters[1]
+    assert clusters[0] == clusters[2]
+
+
+def test_ordinal_streets_are_different_buildings():
+    data = _listings(["200 4th St", "200 5th St"], zip_code=["87102", "87102"])
+    clusters = find_duplicates(data)
+    assert clusters[0] != clusters[1]
+
+
+def test_freshest_rent_wins_when_merging():
+    data = _listings(["500 Central Ave", "500 Central Avenue"], zip_code=["87102", "87102"],
+                     building_name=["Plaza", None], monthly_asking_rent=[1.5, 1.75])
+    result = deduplicate_properties(data)
+    assert len(result) == 1
+    assert result["building_name"].iloc[0] == "Plaza"
+    assert result["monthly_asking_rent"].iloc[0] == 1.75
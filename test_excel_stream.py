@@ -0,0 +1,26 @@
+from openpyxl import Workbook
+from excel_stream import read_workbook_tables
+
+
+def _write_workbook(path, rows):
+    workbook = Workbook()
+    for row in rows:
+        workbook.active.append(row)
+    workbook.save(path)
+    return path
+
+
+def test_totals_block_below_listings_is_not_a_listing(tmp_path):
+    path = _write_workbook(str(tmp_path / "survey.xlsx"), [
+        ["Property Address", "City", "SF Available", "Asking Rent"],
+        ["1 Main St", "Austin", 1000, "$2.00"],
+        ["9 Oak Ave", "Dallas", 3600, 2.5],
+        [],
+        ["5 Elm St", "Austin", 800, "$2.40"],
+        [],
+        ["Total SF Available", 5400],
+        ["Average Rent", 2.3],
+    ])
+    ((table, data),) = read_workbook_tables(path)
+    assert data["Property Address"].tolist() == ["1 Main St", "9 Oak Ave", "5 Elm St"]
+    assert data["SF Available"].tolist() == [1000, 3600, 800]
@@ -0,0 +1,73 @@
+import io
+import shutil
+import pytest
+from extractors import accepted_extensions, detect
+from process_surveys import read_survey
+from synthetic_surveys import synthetic_properties, write_survey_xlsx
+
+
+def test_detects_format_from_content_not_name(tmp_path):
+    workbook = write_survey_xlsx(str(tmp_path / "survey.xlsx"), synthetic_properties(5))
+    misnamed = shutil.copy(workbook, tmp_path / "survey.xls")
+    assert detect(workbook).name == "xlsx"
+    assert detect(str(misnamed)).name == "xlsx"
+
+
+def test_rejects_unrecognized_content():
+    stream = io.BytesIO(b"\x00\x01not a survey")
+    stream.seek(2)
+    assert detect(stream) is None
+    assert stream.tell() == 2
+
+
+def test_reads_csv_survey(tmp_path):
+    path = tmp_path / "survey.csv"
+    path.write_text("Property Address;City;SF Available\n1 Main St;Austin;1,200\n", encoding="utf-8")
+    assert detect(str(path)).name == "csv"
+    data = read_survey(str(path))
+    assert data["address"].tolist() == ["1 Main St"]
+    assert data["sf_available"].tolist() == [1200]
+
+
+def test_reads_legacy_xls(tmp_path):
+    xlwt = pytest.importorskip("xlwt")
+    assert "xls" in accepted_extensions()
+    workbook = xlwt.Workbook()
+    sheet = workbook.add_sheet("Availabilities")
+    sheet.write(0, 0, "Office Survey")
+    for column, header in enumerate(["Property Address", "City", "SF Available"]):
+        sheet.write(2, column, header)
+    for column, value in enumerate(["1 Main St", "Austin", 1000]):
+        sheet.write(3, column, value)
+    path = str(tmp_path / "survey.xls")
+    workbook.save(path)
+
+    assert detect(path).name == "xls"
+    data = read_survey(path)
+    assert data["address"].tolist() == ["1 Main St"]
+    assert data["sf_available"].tolist() == [1000]
+
+
+def test_reads_docx_listing_table(tmp_path):
+    docx = pytest.importorskip("docx")
+    document = docx.Document()
+    document.add_paragraph("Q3 Office Survey")
+    notes = document.add_table(rows=1, cols=1)
+    notes.cell(0, 0).text = "Prepared for internal use"
+    listings = [["Property Address", "City", "SF Available", "Monthly Asking Rent $/SF"],
+                ["1 Main St", "Austin", "1,200", "$2.15/SF/mo"],
+                ["9 Oak Ave\nSuite 200", "Dallas", "3,500", "N/A"]]
+    table = document.add_table(rows=len(listings), cols=len(listings[0]))
+    for i, values in enumerate(listings):
+        for j, value in enumerate(values):
+            table.cell(i, j).text = value
+    path = str(tmp_path / "survey.docx")
+    document.save(path)
+
+    assert detect(path).name == "docx"
+    data = read_survey(path)
+    assert data["address"].tolist() == ["1 Main St", "9 Oak Ave\nSuite 200"]
+    assert data["city"].tolist() == ["Austin", "Dallas"]
+    assert data["sf_available"].tolist() == [1200, 3500]
+    assert data["monthly_asking_rent"].iloc[0] == 2.15
+    assert data["monthly_asking_rent"].isna().iloc[1]
@@ -0,0 +1,61 @@
+import header_detection
+from header_detection import HeaderDetector, detect_header
+
+
+def _survey(title, listings):
+    return [[title], [], ["Property Address", "City", "SF Available", "Asking Rent"], *listings]
+
+
+def test_detects_header_below_title_rows():
+    layout = detect_header(_survey("Q3 Office Survey", [["1 Main St", "Austin", 1000, "$2.00"]]))
+    assert layout.header_row == 2
+    assert layout.column_map["Property Address"] == "address"
+
+
+def test_same_template_with_different_listings_hits_the_memo(monkeypatch):
+    calls = []
+
+    def counting_detect(rows, *args, **kwargs):
+        calls.append(len(rows))
+        return detect_header(rows, *args, **kwargs)
+
+    monkeypatch.setattr(header_detection, "detect_header", counting_detect)
+    detector = HeaderDetector()
+    first = detector.detect(_survey("Q3 Office Survey", [["1 Main St", "Austin", 1000, "$2.00"]]))
+    second = detector.detect(_survey("Q4 Office Survey", [["9 Oak Ave", None, "n/a", 2.5],
+                                                          ["5 Elm St", "Dallas", 800, None]]))
+    assert len(calls) == 1
+    assert second is first
+
+
+def test_different_header_is_detected_again(monkeypatch):
+    calls = []
+
+    def counting_detect(rows, *args, **kwargs):
+        calls.append(len(rows))
+        return detect_header(rows, *args, **kwargs)
+
+    monkeypatch.setattr(header_detection, "detect_header", counting_detect)
+    detector = HeaderDetector()
+    detector.detect(_survey("Survey", [["1 Main St", "Austin", 1000, "$2.00"]]))
+    layout = detector.detect([["Survey"], [], ["Address", "Zip Code", "City"], ["1 Main St", "78701", "Austin"]])
+    assert len(calls) == 2
+    assert layout.column_map == {"Address": "address", "Zip Code": "zip_code", "City": "city"}
+
+
+def test_title_block_without_header_is_remembered_by_content(monkeypatch):
+    calls = []
+
+    def counting_detect(rows, *args, **kwargs):
+        calls.append(len(rows))
+        return detect_header(rows, *args, **kwargs)
+
+    monkeypatch.setattr(header_detection, "detect_header", counting_detect)
+    detector = HeaderDetector()
+    assert detector.detect([["Office Availability Survey"]]).column_map == {}
+    assert detector.detect([["Office Availability Survey"]]).column_map == {}
+    assert len(calls) == 1
+    # Same first row, but a header below it this time
+    layout = detector.detect([["Office Availability Survey"], ["Address", "City", "Zip Code"]])
+    assert len(calls) == 2
+    assert layout.header_row == 1
@@ -0,0 +1,78 @@
+import time
+from contextlib import closing
+import job_queue
+from job_queue import DONE, QUEUED, RUNNING, JobQueue
+
+
+def _expire_lease(queue, job_id):
+    with closing(queue._connect()) as conn:
+        conn.execute("UPDATE jobs SET lease_until = ? WHERE id = ?", (time.time() - 1, job_id))
+
+
+def test_expired_lease_of_dead_worker_is_requeued(tmp_path):
+    db_path = str(tmp_path / "jobs.db")
+    dead = JobQueue(lambda payload: None, db_path=db_path)
+    job_id = dead.enqueue({"n": 1})
+    assert dead._claim()[0] == job_id
+    assert dead.get(job_id)["owner"] == dead.owner
+
+    alive = JobQueue(lambda payload: payload["n"], db_path=db_path)
+    assert alive.requeue_stale() == 0
+    _expire_lease(dead, job_id)
+    assert alive.requeue_stale() == 1
+    assert alive.get(job_id)["status"] == QUEUED
+
+    assert alive.run_next()
+    job = alive.get(job_id)
+    assert job["status"] == DONE
+    assert job["result"] == 1
+
+
+def test_heartbeat_keeps_long_job_running(tmp_path):
+    queue = JobQueue(lambda payload: None, db_path=str(tmp_path / "jobs.db"))
+    job_id = queue.enqueue({})
+    queue._claim()
+    _expire_lease(queue, job_id)
+
+    assert queue.heartbeat() == 1
+    assert queue.requeue_stale() == 0
+    job = queue.get(job_id)
+    assert job["status"] == RUNNING
+    assert job["lease_until"] > time.time() + job_queue.LEASE_SECONDS - 5
+
+
+def test_job_that_lost_its_lease_is_not_finished_by_old_owner(tmp_path):
+    db_path = str(tmp_path / "jobs.db")
+    first = JobQueue(lambda payload: None, db_path=db_path)
+    job_id = first.enqueue({})
+    first._claim()
+    _expire_lease(first, job_id)
+
+    second = JobQueue(lambda payload: "second", db_path=db_path)
+    second.requeue_stale()
+    second._claim()
+    first._finish(job_id, DONE, result="first")
+    assert second.get(job_id)["status"] == RUNNING
+
+    second._finish(job_id, DONE, result="second")
+    assert second.get(job_id)["result"] == "second"
+
+
+def test_worker_loop_requeues_expired_leases(tmp_path, monkeypatch):
+    monkeypatch.setattr(job_queue, "POLL_INTERVAL", 0.05)
+    monkeypatch.setattr(job_queue, "REQUEUE_INTERVAL", 0)
+    db_path = str(tmp_path / "jobs.db")
+    dead = JobQueue(lambda payload: None, db_path=db_path)
+    job_id = dead.enqueue({})
+    dead._claim()
+
+    alive = JobQueue(lambda payload: "done", db_path=db_path, workers=1)
+    alive.start()
+    try:
+        _expire_lease(dead, job_id)
+        deadline = time.time() + 5
+        while alive.get(job_id)["status"] != DONE and time.time() < deadline:
+            time.sleep(0.05)
+    finally:
+        alive.stop(timeout=5)
+    assert alive.get(job_id)["result"] == "done"
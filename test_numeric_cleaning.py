@@ -0,0 +1,96 @@
+import numpy as np
+import pandas as pd
+import pytest
+from numeric_cleaning import derive_rent_fields, extract_rent_type, fill_rent_type, parse_numbers
+
+
+def _parsed(values, period=None):
+    return parse_numbers(pd.Series(values, dtype=object), period).tolist()
+
+
+def test_parses_leading_number_of_survey_text():
+    values = _parsed(["$2.15/SF/mo", "1,200 SF", "24.00 NNN", " $3", "-5"])
+    assert values == [2.15, 1200.0, 24.0, 3.0, -5.0]
+
+
+@pytest.mark.parametrize("text", ["N/A", "", "abc", "TBD", None])
+def test_missing_and_unparsable_values_are_nan(text):
+    assert np.isnan(_parsed([text])[0])
+
+
+@pytest.mark.parametrize("text", ["1,200 - 3,500 SF", "1,200-3,500", "88 Covered/225 Surface"])
+def test_ranges_and_second_numbers_are_nan(text):
+    assert np.isnan(_parsed([text])[0])
+
+
+@pytest.mark.parametrize("text", ["4.0/1,000 SF", "4/1000", "4.0 / 1,000", "4 per 1,000 SF", "4.0\nper 1,000 SF"])
+def test_parking_ratios_parse_to_their_numerator(text):
+    assert _parsed([text]) == [4.0]
+
+
+@pytest.mark.parametrize("text", ["\t12", "12\n", "\r\n 12 SF", "$\t12", "\xa012"])
+def test_tabs_and_line_breaks_are_whitespace(text):
+    assert _parsed([text]) == [12.0]
+
+
+def test_annual_values_in_monthly_fields_are_converted():
+    assert _parsed(["$24.00/SF/yr", "$30 annual", "$2.15/SF/mo", "1.50"], "month") == \
+        pytest.approx([2.0, 2.5, 2.15, 1.5])
+
+
+def test_monthly_values_in_annual_fields_are_converted():
+    assert _parsed(["$2.00/SF/mo", "$24.00/SF/yr", "18"], "year") == pytest.approx([24.0, 24.0, 18.0])
+
+
+def test_numeric_columns_are_returned_as_float():
+    result = parse_numbers(pd.Series([1, 2, None], dtype="Int64"))
+    assert result.dtype == "float64"
+    assert result.tolist()[:2] == [1.0, 2.0]
+
+
+def test_lease_type_is_read_from_rent_text():
+    found = extract_rent_type(pd.Series(["24.00 NNN", "$2 FSG", "1.5 mg", "2.0", None]))
+    assert found.tolist() == ["NNN", "Full Service", "Modified Gross", pd.NA, pd.NA]
+
+
+def test_known_rent_type_is_kept():
+    data = pd.DataFrame({"monthly_asking_rent": ["2.00 NNN", "1.50 FS"], "rent_type": ["Gross", None]})
+    assert fill_rent_type(data)["rent_type"].tolist() == ["Gross", "Full Service"]
+
+
+def test_derives_missing_rent_fields():
+    data = pd.DataFrame({
+        "monthly_asking_rent": [2.0, 1.5],
+        "monthly_operating_expenses": [0.5, 0.5],
+        "sf_available": [1000.0, 2000.0],
+        "rent_type": ["NNN", "Full Service"],
+    })
+    result = derive_rent_fields(data)
+    assert result["monthly_asking_gross"].tolist() == [2.5, 1.5]
+    assert result["annual_asking_gross"].tolist() == [30.0, 18.0]
+    assert result["asking_monthly_rent"].tolist() == [2000.0, 3000.0]
+    assert result["asking_annual_rent"].tolist() == [24000.0, 36000.0]
+
+
+def test_derived_fields_never_overwrite_known_values():
+    data = pd.DataFrame({
+        "monthly_asking_rent": [2.0, np.nan],
+        "monthly_operating_expenses": [0.5, 0.5],
+        "monthly_asking_gross": [9.0, np.nan],
+        "annual_asking_gross": [np.nan, 36.0],
+        "asking_monthly_rent": [np.nan, 4000.0],
+        "asking_annual_rent": [7.0, np.nan],
+        "sf_available": [1000.0, 2000.0],
+    })
+    result = derive_rent_fields(data)
+    assert result["monthly_asking_gross"].tolist() == [9.0, 3.0]
+    assert result["annual_asking_gross"].tolist() == [108.0, 36.0]
+    assert result["monthly_asking_rent"].tolist() == [2.0, 2.0]
+    # The known annual total wins over rent $/SF times SF
+    assert result["asking_monthly_rent"].tolist() == pytest.approx([7.0 / 12, 4000.0])
+    assert result["asking_annual_rent"].tolist() == [7.0, 48000.0]
+
+
+def test_zero_sf_does_not_derive_rent_per_sf():
+    data = pd.DataFrame({"asking_monthly_rent": [1000.0], "sf_available": [0.0]})
+    assert np.isnan(derive_rent_fields(data)["monthly_asking_rent"].iloc[0])
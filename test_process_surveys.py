@@ -0,0 +1,58 @@
+import json
+import shutil
+from instrumentation import metrics, track_job
+from process_surveys import process_surveys, read_surveys
+from property_store import PropertyStore
+from survey_cache import SurveyCache
+from synthetic_surveys import synthetic_properties, write_survey_pdf, write_survey_xlsx
+
+
+def test_cached_survey_keeps_its_own_file_name(tmp_path):
+    original = write_survey_xlsx(str(tmp_path / "a.xlsx"), synthetic_properties(20))
+    copy = shutil.copy(original, tmp_path / "b.xlsx")
+    cache = SurveyCache(str(tmp_path / "cache"))
+
+    first, second = read_surveys([original, str(copy)], cache=cache)
+    assert set(first["source_file"]) == {"a.xlsx"}
+    assert set(second["source_file"]) == {"b.xlsx"}
+
+    (again,) = read_surveys([original], cache=cache)
+    assert cache.stats()["hits"] >= 1
+    assert set(again["source_file"]) == {"a.xlsx"}
+    assert list(again.columns) == list(first.columns)
+
+
+def test_counts_made_in_pool_workers_are_recorded(tmp_path):
+    listings = synthetic_properties(10)
+    pdfs = [write_survey_pdf(str(tmp_path / f"{name}.pdf"), listings) for name in ("a", "b")]
+    workbook = write_survey_xlsx(str(tmp_path / "c.xlsx"), listings)
+    pages_before = metrics.value("pdf_pages")
+
+    with track_job("test") as job:
+        results = read_surveys(pdfs + [workbook], workers=1, expensive_workers=2)
+
+    assert [len(data) for data in results] == [10, 10, 10]
+    assert metrics.value("pdf_pages") - pages_before == 20
+    assert job.counters["pdf_pages"] == 20
+    assert job.counters["rows_pdf"] == 20
+
+
+def test_building_class_default_is_stable_across_runs(tmp_path):
+    without_class = tmp_path / "a.csv"
+    without_class.write_text("Property Address,City,SF Available\n1 Main St,Austin,1000\n9 Oak Ave,Austin,2000\n",
+                             encoding="utf-8")
+    with_class = tmp_path / "b.csv"
+    with_class.write_text("Property Address,City,SF Available,Building Class\n5 Elm St,Dallas,800,A\n",
+                          encoding="utf-8")
+    property_store = PropertyStore(str(tmp_path / "properties.parquet"))
+
+    first = process_surveys([str(without_class)], str(tmp_path / "first.xlsx"), property_store=property_store)
+    assert first["building_class"].tolist() == ["Unknown", "Unknown"]
+    second = process_surveys([str(without_class), str(with_class)], str(tmp_path / "second.xlsx"),
+                             property_store=property_store)
+    assert second["building_class"].tolist() == ["Unknown", "Unknown", "A"]
+
+    with open(property_store.changes_path, encoding="utf-8") as handle:
+        report = json.load(handle)
+    assert report["summary"]["added"] == 1
+    assert report["summary"]["changed"] == 0
@@ -0,0 +1,26 @@
+import time
+from workspaces import WorkspaceManager
+
+
+def test_services_of_least_recently_used_workspaces_are_released(tmp_path):
+    manager = WorkspaceManager(str(tmp_path), max_cached=2)
+    for name in ("a", "b", "c"):
+        manager.get(name).upload_store()
+    manager.get("b")
+    assert [manager.get(name).has_services() for name in ("b", "c")] == [True, True]
+    assert not manager._workspaces["a"].has_services()
+
+    store = manager.get("a").upload_store()
+    assert manager.get("a").upload_store() is store
+    assert not manager._workspaces["b"].has_services()
+
+
+def test_services_of_idle_workspaces_are_released(tmp_path):
+    manager = WorkspaceManager(str(tmp_path), service_idle_seconds=60)
+    idle = manager.get("idle")
+    idle.property_store()
+    idle.last_access = time.time() - 120
+    manager.get("other")
+    assert not idle.has_services()
+    # The workspace itself, and its lock, are kept
+    assert manager.get("idle") is idle
@@ -0,0 +1,136 @@
+import os
+import time
+import uuid
+import hashlib
+import sqlite3
+import logging
+from contextlib import closing
+
+DEFAULT_INDEX_PATH = os.path.join("jobs", "uploads.db")
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+
+class UploadStore:
+    """
+    Saves uploads into a directory while hashing them, and remembers the
+    content hash of every stored file so identical re-uploads are skipped.
+    The hash index lives in SQLite so it is shared by all server processes.
+    """
+
+    def __init__(self, upload_dir, index_path=DEFAULT_INDEX_PATH, chunk_size=UPLOAD_CHUNK_SIZE):
+        self.upload_dir = upload_dir
+        self.index_path = index_path
+        self.chunk_size = chunk_size
+        os.makedirs(upload_dir, exist_ok=True)
+        if os.path.dirname(index_path):
+            os.makedirs(os.path.dirname(index_path), exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS uploads (
+                    hash TEXT PRIMARY KEY,
+                    filename TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS uploads_filename ON uploads (filename)")
+
+    def _connect(self):
+        conn = sqlite3.connect(self.index_path, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def _receive(self, stream, directory):
+        # Streams to a hidden temp file in directory; returns (path, content hash, size)
+        digest = hashlib.sha256()
+        size = 0
+        tmp_path = os.path.join(directory, f".{uuid.uuid4().hex}.upload")
+        try:
+            with open(tmp_path, "wb") as f:
+                for chunk in iter(lambda: stream.read(self.chunk_size), b""):
+                    digest.update(chunk)
+                    f.write(chunk)
+                    size += len(chunk)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return tmp_path, digest.hexdigest(), size
+
+    def _ingested(self, conn, content_hash):
+        # Name the content is stored under in upload_dir, or None
+        row = conn.execute("SELECT filename FROM uploads WHERE hash = ?", (content_hash,)).fetchone()
+        return row[0] if row and os.path.exists(os.path.join(self.upload_dir, row[0])) else None
+
+    def _ingest(self, path, filename, content_hash, size):
+        # Moves a received file into upload_dir unless its content was already ingested
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                existing = self._ingested(conn, content_hash)
+                if existing:
+                    conn.execute("COMMIT")
+                    logging.info(f"Skipping {filename}: identical to already ingested {existing}")
+                    return None
+
+                os.replace(path, os.path.join(self.upload_dir, filename))
+                # The name now holds new content, so any hash recorded for it is stale
+                conn.execute("DELETE FROM uploads WHERE filename = ? OR hash = ?", (filename, content_hash))
+                conn.execute("INSERT INTO uploads (hash, filename, size, created_at) VALUES (?, ?, ?, ?)",
+                             (content_hash, filename, size, time.time()))
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        logging.info(f"Saved file: {filename} ({size} bytes, sha256 {content_hash[:12]})")
+        return filename
+
+    def save(self, stream, filename):
+        """
+        Streams an upload to disk in fixed-size chunks, hashing it on the fly.
+
+        :param stream: Readable binary stream (e.g. FileStorage.stream).
+        :param filename: Sanitized name to store the file under.
+        :return: (content hash, stored filename or None if the content was already ingested)
+        """
+        tmp_path, content_hash, size = self._receive(stream, self.upload_dir)
+        try:
+            return content_hash, self._ingest(tmp_path, filename, content_hash, size)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def stage(self, stream, staging_dir):
+        """
+        Streams an upload into staging_dir, named by its content hash, without
+        making it visible in upload_dir; ingest() moves it there later.
+
+        :param stream: Readable binary stream (e.g. FileStorage.stream).
+        :param staging_dir: Directory holding the staged files of one submission.
+        :return: (content hash, True if the content is not ingested yet)
+        """
+        os.makedirs(staging_dir, exist_ok=True)
+        tmp_path, content_hash, _ = self._receive(stream, staging_dir)
+        try:
+            with closing(self._connect()) as conn:
+                if self._ingested(conn, content_hash):
+                    return content_hash, False
+            os.replace(tmp_path, os.path.join(staging_dir, content_hash))
+            return content_hash, True
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def ingest(self, staging_dir, content_hash, filename):
+        """
+        Moves a file staged with stage() into upload_dir under filename.
+        Ingesting again after a retried commit returns the same name.
+
+        :return: The stored filename, or None if the content was already ingested under another name.
+        """
+        path = os.path.join(staging_dir, content_hash)
+        if not os.path.exists(path):
+            with closing(self._connect()) as conn:
+                existing = self._ingested(conn, content_hash)
+            return filename if existing == filename else None
+        return self._ingest(path, filename, content_hash, os.path.getsize(path))
@@ -0,0 +1,285 @@
+import os
+import re
+import time
+import shutil
+import logging
+import threading
+from collections import OrderedDict
+from extractors import accepted_extensions
+
+try:
+    import fcntl
+except ImportError:  # Windows: locks only cover the threads of one process
+    fcntl = None
+
+DEFAULT_ROOT = "workspaces"
+DEFAULT_WORKSPACE = "default"
+DEFAULT_RETENTION_DAYS = 30
+# Expired workspaces are looked for at most this often
+CLEANUP_INTERVAL = 60 * 60
+# Caches and stores (notably the in-memory property index) are kept for at
+# most this many recently used workspaces, and dropped after this long unused
+DEFAULT_MAX_CACHED_WORKSPACES = 16
+DEFAULT_SERVICE_IDLE_SECONDS = 15 * 60
+OUTPUT_FILENAME = "consolidated_properties.xlsx"
+WORKSPACE_NAME_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+LAST_USED_FILE = ".last_used"
+LOCK_FILE = ".lock"
+
+
+class WorkspaceLock:
+    """
+    Exclusive lock on a workspace directory, held across threads and
+    processes: a thread lock, then an flock on the directory's lock file,
+    so jobs for one workspace never run at once in different server
+    processes (e.g. gunicorn workers).
+    """
+
+    def __init__(self, path):
+        self.path = os.path.join(path, LOCK_FILE)
+        self._thread_lock = threading.Lock()
+        self._file = None
+
+    def acquire(self, blocking=True):
+        """
+        Takes the lock; returns False if blocking is off and it is held elsewhere.
+        """
+        if not self._thread_lock.acquire(blocking):
+            return False
+        if fcntl is None:
+            return True
+        try:
+            f = open(self.path, "a")
+        except OSError:
+            self._thread_lock.release()
+            raise
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            f.close()
+            self._thread_lock.release()
+            if blocking:
+                raise
+            return False
+        self._file = f
+        return True
+
+    def release(self):
+        if self._file is not None:
+            # Closing the file releases the flock
+            self._file.close()
+            self._file = None
+        self._thread_lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class Workspace:
+    """
+    One client's isolated directory tree:
+
+    - uploads/: the client's input surveys, the only files consolidated
+    - batches/: files of open batches, staged until the batch is committed
+    - output/: generated files such as consolidated_properties.xlsx
+    - cache/ and store/: parse caches, the consolidation store and the
+      property store, so no state is shared between workspaces
+
+    The caches and stores are built on first use, which keeps the pipeline
+    modules out of processes that never run a job, and are released by the
+    WorkspaceManager when the workspace goes unused. Consolidations of one
+    workspace are serialized with `lock`, across threads and processes.
+    """
+
+    def __init__(self, root, name):
+        self.name = name
+        self.path = os.path.join(root, name)
+        self.upload_dir = os.path.join(self.path, "uploads")
+        self.output_dir = os.path.join(self.path, "output")
+        self.cache_dir = os.path.join(self.path, "cache")
+        self.store_dir = os.path.join(self.path, "store")
+        self.output_excel = os.path.join(self.output_dir, OUTPUT_FILENAME)
+        self.lock = WorkspaceLock(self.path)
+        # Reentrant: building the property index builds the property store it reads
+        self._build_lock = threading.RLock()
+        self._services = {}
+        for directory in (self.upload_dir, self.output_dir):
+            os.makedirs(directory, exist_ok=True)
+        self.touch()
+
+    def touch(self):
+        """
+        Marks the workspace as used now; retention counts from the last use.
+        """
+        self.last_access = time.time()
+        with open(os.path.join(self.path, LAST_USED_FILE), "w") as f:
+            f.write(str(time.time()))
+
+    def _service(self, name, factory):
+        with self._build_lock:
+            if name not in self._services:
+                self._services[name] = factory()
+            return self._services[name]
+
+    def has_services(self):
+        return bool(self._services)
+
+    def release_services(self):
+        """
+        Drops the cached caches, stores and property index; they are rebuilt
+        on next use. Callers still holding one keep a working object.
+        """
+        with self._build_lock:
+            self._services = {}
+
+    def upload_store(self):
+        """Uploads are streamed to disk and hashed; identical re-uploads are skipped."""
+        from upload_store import UploadStore
+        return self._service("uploads", lambda: UploadStore(self.upload_dir,
+                                                            index_path=os.path.join(self.path, "uploads.db")))
+
+    def survey_cache(self):
+        """Parsed surveys are cached by content hash so unchanged uploads are not re-parsed."""
+        from survey_cache import SurveyCache
+        return self._service("survey_cache", lambda: SurveyCache(self.cache_dir))
+
+    def consolidation_store(self):
+        """Consolidation only merges surveys that are new or changed since the last run."""
+        from consolidation_store import ConsolidationStore
+        return self._service("consolidation_store", lambda: ConsolidationStore(self.store_dir))
+
+    def property_store(self):
+        """Typed consolidated properties; the Excel output is exported from this."""
+        from property_store import PropertyStore
+        return self._service("property_store",
+                             lambda: PropertyStore(os.path.join(self.store_dir, "properties.parquet")))
+
+    def property_index(self):
+        """Query indexes over the property store, rebuilt once per consolidation."""
+        from property_index import PropertyIndexCache
+        return self._service("property_index", lambda: PropertyIndexCache(self.property_store()))
+
+    def batch_dir(self, batch_id):
+        """
+        Returns the directory staging the files of an open batch.
+        """
+        return os.path.join(self.path, "batches", batch_id)
+
+    def survey_files(self):
+        """
+        Returns the paths of the uploads/ files of every supported format, sorted.
+        """
+        extensions = accepted_extensions()
+        return sorted(os.path.join(self.upload_dir, f) for f in os.listdir(self.upload_dir)
+                      if f.rsplit('.', 1)[-1].lower() in extensions and not f.startswith('.'))
+
+
+class WorkspaceManager:
+    """
+    Hands out workspaces by name and deletes the ones not used for
+    retention_days. The services of a workspace are released once it is
+    not among the max_cached most recently used ones, or has not been used
+    for service_idle_seconds, so a process does not keep every workspace's
+    property index in memory.
+    """
+
+    def __init__(self, root=DEFAULT_ROOT, retention_days=DEFAULT_RETENTION_DAYS,
+                 max_cached=DEFAULT_MAX_CACHED_WORKSPACES, service_idle_seconds=DEFAULT_SERVICE_IDLE_SECONDS):
+        # Absolute, since Flask resolves relative download directories against the app, not the cwd
+        self.root = os.path.abspath(root)
+        self.retention_days = retention_days
+        self.max_cached = max_cached
+        self.service_idle_seconds = service_idle_seconds
+        self._lock = threading.Lock()
+        # Least recently used first
+        self._workspaces = OrderedDict()
+        self._last_cleanup = 0
+        os.makedirs(root, exist_ok=True)
+
+    @staticmethod
+    def validate_name(name):
+        """
+        Returns name if it is a valid workspace name, else raises ValueError.
+        Names are used as directory names, so only letters, digits, "-" and "_" are allowed.
+        """
+        if not name or not WORKSPACE_NAME_PATTERN.match(name):
+            raise ValueError("Workspace names are 1-64 letters, digits, '-' or '_'")
+        return name
+
+    def get(self, name=DEFAULT_WORKSPACE):
+        """
+        Returns the named workspace, creating it if needed, and marks it used.
+        """
+        self.validate_name(name)
+        with self._lock:
+            workspace = self._workspaces.get(name)
+            if workspace is None or not os.path.isdir(workspace.path):
+                workspace = self._workspaces[name] = Workspace(self.root, name)
+            else:
+                workspace.touch()
+            self._workspaces.move_to_end(name)
+            self._release_services()
+            return workspace
+
+    def _release_services(self):
+        # Called with self._lock held
+        loaded = [workspace for workspace in self._workspaces.values() if workspace.has_services()]
+        excess = len(loaded) - self.max_cached
+        cutoff = time.time() - self.service_idle_seconds
+        for i, workspace in enumerate(loaded):
+            if i < excess or workspace.last_access < cutoff:
+                workspace.release_services()
+                logging.info(f"Released cached services of workspace {workspace.name}")
+
+    def last_used(self, name):
+        try:
+            return os.path.getmtime(os.path.join(self.root, name, LAST_USED_FILE))
+        except OSError:
+            return os.path.getmtime(os.path.join(self.root, name))
+
+    def cleanup(self, force=False):
+        """
+        Deletes workspaces unused for longer than retention_days, skipping
+        any with a consolidation in progress in any process. Runs at most
+        once per CLEANUP_INTERVAL unless force is set.
+
+        :return: Names of the deleted workspaces.
+        """
+        if not self.retention_days:
+            return []
+        now = time.time()
+        with self._lock:
+            if not force and now - self._last_cleanup < CLEANUP_INTERVAL:
+                return []
+            self._last_cleanup = now
+
+            deleted = []
+            cutoff = now - self.retention_days * 24 * 60 * 60
+            for name in os.listdir(self.root):
+                if not os.path.isdir(os.path.join(self.root, name)) or self.last_used(name) >= cutoff:
+                    continue
+                workspace = self._workspaces.get(name)
+                lock = workspace.lock if workspace is not None else WorkspaceLock(os.path.join(self.root, name))
+                try:
+                    if not lock.acquire(blocking=False):
+                        continue
+                except OSError as e:
+                    logging.error(f"Failed to lock workspace {name}: {e}")
+                    continue
+                try:
+                    # Another process may have used it since it was listed
+                    if self.last_used(name) < cutoff:
+                        shutil.rmtree(os.path.join(self.root, name))
+                        self._workspaces.pop(name, None)
+                        deleted.append(name)
+                except OSError as e:
+                    logging.error(f"Failed to delete workspace {name}: {e}")
+                finally:
+                    lock.release()
+        if deleted:
+            logging.info(f"Deleted {len(deleted)} workspaces unused for {self.retention_days} days: {deleted}")
+        return deleted